@@ -1,8 +1,11 @@
 from datetime import date
 from typing import cast
 
+from discord import AllowedMentions
 from discord import Guild
 from discord import Intents
+from discord import Interaction
+from discord.app_commands import Choice
 from discord.ext.commands import Bot
 from discord.ext.commands import Context
 from discord.ext.commands import guild_only
@@ -10,23 +13,50 @@ from discord.ext.commands import has_permissions
 from discord.ext.commands import is_owner
 from discord.ext.commands.errors import MissingRequiredArgument
 
+from src.bot.constants import LEADERBOARD_SIZE
 from src.bot.controllers import add_quest_to_user
 from src.bot.controllers import check_and_register_user
 from src.bot.controllers import complete_quest_for_user
-from src.bot.controllers import get_quest_list_text
+from src.bot.controllers import find_bard_tales
+from src.bot.controllers import get_leaderboard_text
+from src.bot.controllers import get_profile_text
+from src.bot.controllers import get_quest_board_pages
 from src.bot.controllers import get_tavern_menu
+from src.bot.controllers import load_themes
+from src.bot.controllers import rebuild_experience_totals
 from src.bot.controllers import remove_from_tavern_menu
 from src.bot.controllers import request_story_by_theme
+from src.bot.controllers import search_quest_names
 from src.bot.controllers import select_from_tavern_menu
+from src.bot.controllers import start_background_writes
+from src.bot.controllers import stop_background_writes
 from src.bot.controllers import tell_bard_tale
 from src.bot.controllers import upsert_tavern_menu
 from src.bot.typeshed import RandomChoiceFlag
+from src.bot.views import PaginatedView
 from src.config import DISCORD_OWNER_ID
 from src.constants import DayOfWeek
 
+
+class QuestBot(Bot):
+    """
+    The bot, which loads the themes and runs the background writes for as long as it is connected.
+
+    The background writes are drained when it closes.
+    """
+
+    async def setup_hook(self) -> None:
+        await load_themes()
+        await start_background_writes()
+
+    async def close(self) -> None:
+        await super().close()
+        await stop_background_writes()
+
+
 default_intent = Intents.default()
 default_intent.message_content = True
-bot = Bot(command_prefix="~", intents=default_intent, owner_id=DISCORD_OWNER_ID)
+bot = QuestBot(command_prefix="~", intents=default_intent, owner_id=DISCORD_OWNER_ID)
 
 
 @bot.command(name="ping", help="Check that server is live")
@@ -46,8 +76,11 @@ async def register_user(ctx: Context) -> None:
     name="quests", fallback="board", aliases=["board"], help="Return a list of all currently available quests"
 )
 async def quest_group(ctx: Context) -> None:
-    res = await get_quest_list_text()
-    await ctx.send(res)
+    pages = await get_quest_board_pages()
+    if len(pages) == 1:
+        await ctx.send(pages[0])
+    else:
+        await ctx.send(pages[0], view=PaginatedView(pages))
 
 
 @quest_group.command(name="accept", help="Accept a quest by name")
@@ -68,6 +101,33 @@ async def completed_quest(ctx: Context, *, quest_name: str) -> None:
     await ctx.send(res)
 
 
+@accept_quest.autocomplete("quest_name")
+@completed_quest.autocomplete("quest_name")
+async def quest_name_autocomplete(_: Interaction, current: str) -> list[Choice[str]]:
+    return [Choice(name=quest_name, value=quest_name) for quest_name in await search_quest_names(current)]
+
+
+@quest_group.command(name="leaderboard", help="Show the adventurers with the most experience in this server")
+@guild_only()
+async def quest_leaderboard(ctx: Context, *, count: int = LEADERBOARD_SIZE) -> None:
+    res = await get_leaderboard_text(ctx, count)
+    await ctx.send(res, allowed_mentions=AllowedMentions.none())
+
+
+@bot.hybrid_command(name="profile", help="Show the experience you have earned in this server")
+@guild_only()
+async def profile(ctx: Context) -> None:
+    res = await get_profile_text(ctx)
+    await ctx.send(res)
+
+
+@bot.command(name="rebuild_xp", help="Recompute every user's experience totals from their experience history")
+@is_owner()
+async def rebuild_xp(ctx: Context) -> None:
+    res = await rebuild_experience_totals()
+    await ctx.send(res)
+
+
 @bot.command(name="sync", help="Sync bot with discord server in order to update available slash commands")
 @is_owner()
 async def sync_bot_commands(_: Context) -> None:
@@ -116,12 +176,12 @@ async def tavern_menu_choose(ctx: Context, *, flags: RandomChoiceFlag) -> None:
 
 @tavern_group.group(name="bard", fallback="help")
 async def tavern_bard(ctx: Context) -> None:
-    await ctx.send("Available Requests: \n - story\n - retell")
+    await ctx.send("Available Requests: \n - story\n - retell\n - find")
 
 
 @tavern_bard.command(name="story")
-async def tavern_bard_story(ctx: Context, *, theme_name: str, story: str) -> None:
-    res = await tell_bard_tale(story, theme_name)
+async def tavern_bard_story(ctx: Context, *, theme_name: str, name: str, story: str) -> None:
+    res = await tell_bard_tale(name, story, theme_name)
     await ctx.send(res)
 
 
@@ -129,3 +189,12 @@ async def tavern_bard_story(ctx: Context, *, theme_name: str, story: str) -> Non
 async def tavern_bard_retell_story(ctx: Context, *, theme_name: str) -> None:
     story_text = await request_story_by_theme(theme_name)
     await ctx.send(story_text)
+
+
+@tavern_bard.command(name="find", help="Search the names and stories of every tale the bard has been told")
+async def tavern_bard_find(ctx: Context, *, search_terms: str) -> None:
+    pages = await find_bard_tales(search_terms)
+    if len(pages) == 1:
+        await ctx.send(pages[0])
+    else:
+        await ctx.send(pages[0], view=PaginatedView(pages))
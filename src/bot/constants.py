@@ -2,9 +2,15 @@ from typing import Final
 
 NEW_USER_MESSAGE: Final[str] = "You have been registered, prepare for adventure!"
 ALREADY_REGISTERED_MESSAGE: Final[str] = "You have already registered"
-REGISTER_FIRST_MESSAGE: Final[str] = "Please register first"
 NO_MENU_THIS_WEEK_MESSAGE: Final[str] = "No menu has been created for this week."
 SERVER_ONLY_BAD_REQUEST_MESSAGE: Final[str] = "Bad request, this feature is only available in servers."
 NO_MENU_ITEMS_FOR_CHOSEN_DAY_MESSAGE: Final[str] = "No items to select for the day you asked."
 NO_SUCH_THEME_EXISTS: Final[str] = "Unable to fulfill request, no such theme exists"
 STORY_HAS_BEEN_RECORDED: Final[str] = "Tale has been added to the book of stories"
+PROFILE_MESSAGE: Final[str] = "{name} has earned {experience} experience in {server}"
+LEADERBOARD_SIZE: Final[int] = 10
+MAX_LEADERBOARD_SIZE: Final[int] = 25
+PAGINATION_TIMEOUT_SECONDS: Final[float] = 300.0
+# Discord shows at most 25 autocomplete choices
+MAX_AUTOCOMPLETE_CHOICES: Final[int] = 25
+MAX_TALE_SEARCH_RESULTS: Final[int] = 25
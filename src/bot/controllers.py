@@ -1,5 +1,7 @@
 import random
 
+from collections.abc import Sequence
+
 from dependency_injector.wiring import Provide
 from dependency_injector.wiring import inject
 from discord import Guild
@@ -8,23 +10,30 @@ from sqlalchemy.exc import MultipleResultsFound
 from sqlalchemy.exc import NoResultFound
 
 from src.bot.constants import ALREADY_REGISTERED_MESSAGE
+from src.bot.constants import LEADERBOARD_SIZE
+from src.bot.constants import MAX_AUTOCOMPLETE_CHOICES
+from src.bot.constants import MAX_LEADERBOARD_SIZE
+from src.bot.constants import MAX_TALE_SEARCH_RESULTS
 from src.bot.constants import NEW_USER_MESSAGE
 from src.bot.constants import NO_MENU_ITEMS_FOR_CHOSEN_DAY_MESSAGE
 from src.bot.constants import NO_MENU_THIS_WEEK_MESSAGE
 from src.bot.constants import NO_SUCH_THEME_EXISTS
-from src.bot.constants import REGISTER_FIRST_MESSAGE
+from src.bot.constants import PROFILE_MESSAGE
 from src.bot.constants import SERVER_ONLY_BAD_REQUEST_MESSAGE
 from src.bot.constants import STORY_HAS_BEEN_RECORDED
 from src.constants import ChooseStyle
 from src.constants import DayOfWeek
 from src.containers import Container
 from src.exceptions import NoIDProvided
-from src.helpers.message_helpers import format_quest_board
+from src.helpers.message_helpers import format_leaderboard
+from src.helpers.message_helpers import paginate_tales
+from src.helpers.write_behind import WriteBehindQueue
 from src.quests import ExperienceTransactionService
 from src.quests import QuestService
 from src.quests.exceptions import BaseQuestException
 from src.quests.exceptions import QuestAlreadyAccepted
 from src.quests.exceptions import QuestDNE
+from src.repositories import UnitOfWork
 from src.services import ThemeService
 from src.services import UserService
 from src.tavern import TavernService
@@ -32,14 +41,17 @@ from src.tavern.exceptions import NoMenuItemFoundError
 
 
 @inject
-async def check_and_register_user(ctx: Context, user_service: UserService = Provide[Container.user_service]) -> str:
+async def check_and_register_user(
+    ctx: Context,
+    user_service: UserService = Provide[Container.user_service],
+    unit_of_work: UnitOfWork = Provide[Container.unit_of_work],
+) -> str:
     discord_id = ctx.author.id
     if not discord_id:
         raise NoIDProvided
-    if await user_service.get_user_by_discord_id(discord_id):
-        return ALREADY_REGISTERED_MESSAGE
-    await user_service.create_user(discord_id=discord_id)
-    return NEW_USER_MESSAGE
+    async with unit_of_work:
+        _, created = await user_service.get_or_create_by_discord_id(discord_id)
+    return NEW_USER_MESSAGE if created else ALREADY_REGISTERED_MESSAGE
 
 
 @inject
@@ -48,21 +60,25 @@ async def add_quest_to_user(
     quest_name: str,
     quest_service: QuestService = Provide[Container.quest_service],
     user_service: UserService = Provide[Container.user_service],
+    unit_of_work: UnitOfWork = Provide[Container.unit_of_work],
 ) -> str:
-    user = await user_service.get_user_by_discord_id(ctx.author.id)
-    if not user:
-        return REGISTER_FIRST_MESSAGE
-    try:
-        res = await quest_service.accept_quest_if_available(user, quest_name)
-    except (QuestDNE, QuestAlreadyAccepted) as quest_error:
-        res = quest_error.message
+    async with unit_of_work:
+        user, _ = await user_service.get_or_create_by_discord_id(ctx.author.id)
+        try:
+            res = await quest_service.accept_quest_if_available(user, quest_name)
+        except (QuestDNE, QuestAlreadyAccepted) as quest_error:
+            res = quest_error.message
     return res
 
 
 @inject
-async def get_quest_list_text(quest_service: QuestService = Provide[Container.quest_service]) -> str:
-    quests = await quest_service.get_all_quests()
-    return format_quest_board(quests)
+async def search_quest_names(current: str, quest_service: QuestService = Provide[Container.quest_service]) -> list[str]:
+    return await quest_service.search_quest_names(current, MAX_AUTOCOMPLETE_CHOICES)
+
+
+@inject
+async def get_quest_board_pages(quest_service: QuestService = Provide[Container.quest_service]) -> Sequence[str]:
+    return await quest_service.get_quest_board_pages()
 
 
 @inject
@@ -72,34 +88,84 @@ async def complete_quest_for_user(
     user_service: UserService = Provide[Container.user_service],
     quest_service: QuestService = Provide[Container.quest_service],
     xp_service: ExperienceTransactionService = Provide[Container.xp_service],
+    unit_of_work: UnitOfWork = Provide[Container.unit_of_work],
 ) -> str:
+    async with unit_of_work:
+        user, _ = await user_service.get_or_create_by_discord_id(ctx.author.id)
+        try:
+            quest = await quest_service.complete_quest_if_available(user, quest_name)
+        except (BaseQuestException, QuestDNE) as quest_error:
+            return quest_error.message
+        # Marking the quest complete and recording the XP commit together, unless the XP is written behind
+        xp_transaction = await xp_service.earn_xp_for_quest(user, quest, ctx.guild.id if ctx.guild else None)
+    return f"You have successfully completed {quest.name} and earned {xp_transaction.experience}"
+
+
+@inject
+async def start_background_writes(
+    xp_write_queue: WriteBehindQueue | None = Provide[Container.enabled_xp_write_queue],
+) -> None:
+    if xp_write_queue is not None:
+        await xp_write_queue.start()
+
+
+@inject
+async def load_themes(theme_service: ThemeService = Provide[Container.theme_service]) -> None:
+    await theme_service.load_themes()
+
+
+@inject
+async def stop_background_writes(
+    xp_write_queue: WriteBehindQueue | None = Provide[Container.enabled_xp_write_queue],
+) -> None:
+    if xp_write_queue is not None:
+        await xp_write_queue.close()
+
+
+@inject
+async def get_profile_text(
+    ctx: Context,
+    user_service: UserService = Provide[Container.user_service],
+    xp_service: ExperienceTransactionService = Provide[Container.xp_service],
+) -> str:
+    if not ctx.guild:
+        return SERVER_ONLY_BAD_REQUEST_MESSAGE
     user = await user_service.get_user_by_discord_id(ctx.author.id)
-    if not user:
-        return REGISTER_FIRST_MESSAGE
+    experience = await xp_service.get_experience(user, ctx.guild.id) if user else 0
+    return PROFILE_MESSAGE.format(name=ctx.author.display_name, experience=experience, server=ctx.guild.name)
 
-    try:
-        quest = await quest_service.complete_quest_if_available(user, quest_name)
-    except (BaseQuestException, QuestDNE) as quest_error:
-        return quest_error.message
-    xp_transaction = await xp_service.earn_xp_for_quest(user, quest)
-    return f"You have successfully completed {quest.name} and earned {xp_transaction.experience}"
+
+@inject
+async def get_leaderboard_text(
+    ctx: Context,
+    count: int = LEADERBOARD_SIZE,
+    xp_service: ExperienceTransactionService = Provide[Container.xp_service],
+) -> str:
+    if not ctx.guild:
+        return SERVER_ONLY_BAD_REQUEST_MESSAGE
+    ranking = await xp_service.get_ranking(ctx.guild.id)
+    return format_leaderboard(
+        ranking.top(min(max(count, 1), MAX_LEADERBOARD_SIZE)),
+        ctx.author.id,
+        ranking.get_rank(ctx.author.id),
+        ranking.get_score(ctx.author.id),
+    )
+
+
+@inject
+async def rebuild_experience_totals(
+    xp_service: ExperienceTransactionService = Provide[Container.xp_service],
+) -> str:
+    corrected_count = await xp_service.rebuild_experience_totals()
+    return f"Experience totals rebuilt from the ledger, {corrected_count} corrected"
 
 
 @inject
 async def get_tavern_menu(ctx: Context, tavern_service: TavernService = Provide[Container.tavern_service]) -> str:
     if not ctx.guild:
         return SERVER_ONLY_BAD_REQUEST_MESSAGE
-    menu = await tavern_service.get_this_weeks_menu(ctx.guild.id)
-    if not menu:
-        return NO_MENU_THIS_WEEK_MESSAGE
-    menu_str = f"Menu for the week of {menu.start_date.strftime('%b %d, %Y')}"
-    for day, items in menu.grouped_items.items():
-        menu_str += f"\n**{day.name.title()}**:"
-        if not items:
-            menu_str += "\n  No items available."
-        for item in items:
-            menu_str += f"\n  - {item.food.capitalize()}"
-    return menu_str
+    menu = await tavern_service.get_this_weeks_rendered_menu(ctx.guild.id)
+    return menu.text if menu else NO_MENU_THIS_WEEK_MESSAGE
 
 
 @inject
@@ -108,14 +174,16 @@ async def upsert_tavern_menu(
     item_name_str: str,
     day_of_week: DayOfWeek,
     tavern_service: TavernService = Provide[Container.tavern_service],
+    unit_of_work: UnitOfWork = Provide[Container.unit_of_work],
 ) -> str:
     if not ctx.guild:
         return SERVER_ONLY_BAD_REQUEST_MESSAGE
     server_id = ctx.guild.id
-    menu = await tavern_service.get_this_weeks_menu(server_id)
-    if not menu:
-        menu = await tavern_service.create_menu_for_week(server_id)
-    await tavern_service.insert_menu_item(menu, item_name_str, day_of_week)
+    async with unit_of_work:
+        menu = await tavern_service.get_this_weeks_menu(server_id)
+        if not menu:
+            menu = await tavern_service.create_menu_for_week(server_id)
+        await tavern_service.insert_menu_item(menu, item_name_str, day_of_week)
     return "Item added"
 
 
@@ -125,15 +193,16 @@ async def remove_from_tavern_menu(
     item_name_str: str,
     day_of_week: DayOfWeek | None,
     tavern_service: TavernService = Provide[Container.tavern_service],
+    unit_of_work: UnitOfWork = Provide[Container.unit_of_work],
 ) -> str:
     if not ctx.guild:
         return SERVER_ONLY_BAD_REQUEST_MESSAGE
-    menu = await tavern_service.get_this_weeks_menu(ctx.guild.id)
-    if not menu:
-        return NO_MENU_THIS_WEEK_MESSAGE
-
     try:
-        await tavern_service.delete_menu_item(menu, item_name_str, day_of_week)
+        async with unit_of_work:
+            menu = await tavern_service.get_this_weeks_menu(ctx.guild.id)
+            if not menu:
+                return NO_MENU_THIS_WEEK_MESSAGE
+            await tavern_service.delete_menu_item(menu, item_name_str, day_of_week)
     except NoMenuItemFoundError:
         day_of_week_error_text = f" on {day_of_week.name.lower()}" if day_of_week else ""
         return f"{item_name_str.capitalize()} could not be found{day_of_week_error_text} in this week's menu."
@@ -148,29 +217,32 @@ async def select_from_tavern_menu(
     day_of_week: DayOfWeek,
     tavern_service: TavernService = Provide[Container.tavern_service],
 ) -> str:
-    menu = await tavern_service.get_this_weeks_menu(guild.id)
+    menu = await tavern_service.get_this_weeks_rendered_menu(guild.id)
     if not menu:
         return NO_MENU_THIS_WEEK_MESSAGE
-    if not (food_items := menu.grouped_items.get(day_of_week)):
+    if not (foods := menu.foods_by_day.get(day_of_week)):
         return NO_MENU_ITEMS_FOR_CHOSEN_DAY_MESSAGE
-    food_text = food_items[0].food.title()
+    food_text = foods[0].title()
     if style == ChooseStyle.RANDOM:
-        food_text = random.choice(food_items).food.title()  # noqa: S311
+        food_text = random.choice(foods).title()  # noqa: S311
     return f"Order Up!\n{food_text}"
 
 
 @inject
 async def tell_bard_tale(
+    name: str,
     story: str,
     theme_name: str,
     tavern_service: TavernService = Provide[Container.tavern_service],
     theme_service: ThemeService = Provide[Container.theme_service],
+    unit_of_work: UnitOfWork = Provide[Container.unit_of_work],
 ) -> str:
-    try:
-        theme = await theme_service.get_theme_by_name(theme_name)
-    except (NoResultFound, MultipleResultsFound):
-        return NO_SUCH_THEME_EXISTS
-    await tavern_service.create_bard_tale(story, theme)
+    async with unit_of_work:
+        try:
+            theme = await theme_service.get_theme_by_name(theme_name)
+        except (NoResultFound, MultipleResultsFound):
+            return NO_SUCH_THEME_EXISTS
+        await tavern_service.create_bard_tale(name, story, theme)
     return STORY_HAS_BEEN_RECORDED
 
 
@@ -189,9 +261,10 @@ async def request_story_by_theme(
     return tale.story
 
 
-async def request_story_by_name(
-    story_name: str,
+@inject
+async def find_bard_tales(
+    search_terms: str,
     tavern_service: TavernService = Provide[Container.tavern_service],
-) -> str:
-    await tavern_service.get_tales_by_name(story_name)
-    return ""
+) -> list[str]:
+    tales = await tavern_service.search_tales(search_terms, MAX_TALE_SEARCH_RESULTS)
+    return paginate_tales(tales)
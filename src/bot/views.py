@@ -0,0 +1,48 @@
+from collections.abc import Sequence
+
+from discord import ButtonStyle
+from discord import Interaction
+from discord.ui import Button
+from discord.ui import View
+from discord.ui import button
+
+from src.bot.constants import PAGINATION_TIMEOUT_SECONDS
+
+
+class PaginatedView(View):
+    """
+    Previous and next buttons which page a message through pre-rendered pages.
+
+    The message is edited in place, so every page must fit in a single message.
+    """
+
+    pages: Sequence[str]
+    page_index: int
+
+    def __init__(self, pages: Sequence[str], timeout: float = PAGINATION_TIMEOUT_SECONDS) -> None:
+        super().__init__(timeout=timeout)
+        self.pages = pages
+        self.page_index = 0
+        self._update_buttons()
+
+    def _update_buttons(self) -> None:
+        self.previous_page.disabled = self.page_index == 0
+        self.next_page.disabled = self.page_index == len(self.pages) - 1
+        self.page_counter.label = f"{self.page_index + 1}/{len(self.pages)}"
+
+    async def _show_page(self, interaction: Interaction, page_index: int) -> None:
+        self.page_index = page_index
+        self._update_buttons()
+        await interaction.response.edit_message(content=self.pages[page_index], view=self)
+
+    @button(label="Previous", style=ButtonStyle.secondary)
+    async def previous_page(self, interaction: Interaction, _: Button) -> None:
+        await self._show_page(interaction, self.page_index - 1)
+
+    @button(label="1/1", style=ButtonStyle.secondary, disabled=True)
+    async def page_counter(self, interaction: Interaction, _: Button) -> None:
+        await interaction.response.defer()
+
+    @button(label="Next", style=ButtonStyle.secondary)
+    async def next_page(self, interaction: Interaction, _: Button) -> None:
+        await self._show_page(interaction, self.page_index + 1)
@@ -0,0 +1,144 @@
+import asyncio
+import csv
+import json
+
+from argparse import ArgumentParser
+from argparse import Namespace
+from collections.abc import AsyncIterator
+from collections.abc import Iterator
+from collections.abc import Sequence
+from itertools import batched
+from logging import INFO
+from logging import basicConfig
+from logging import getLogger
+from pathlib import Path
+from time import perf_counter
+from typing import Any
+from typing import Final
+
+from dependency_injector.wiring import Provide
+from dependency_injector.wiring import inject
+
+from src.constants import DataFileFormat
+from src.containers import WIRE_TO
+from src.containers import AsyncDatabase
+from src.containers import Container
+from src.quests import Quest
+from src.quests import QuestService
+
+logger = getLogger(__name__)
+
+QUEST_FIELDS: Final = ("name", "experience", "max_completion_count")
+DEFAULT_IMPORT_BATCH_SIZE: Final = 500
+
+
+def _log_progress(action: str, row_count: int, start: float) -> None:
+    elapsed = perf_counter() - start
+    logger.info("%s %d quests, %.0f rows/sec", action, row_count, row_count / elapsed if elapsed else 0.0)
+
+
+def _read_quest_rows(path: Path, file_format: DataFileFormat) -> Iterator[dict[str, Any]]:
+    with path.open(encoding="utf-8", newline="") as quest_file:
+        if file_format is DataFileFormat.JSONL:
+            yield from (json.loads(line) for line in quest_file if line.strip())
+        else:
+            for row in csv.DictReader(quest_file):
+                # CSV can't tell an empty value from no value, an empty completion count means uncapped
+                yield {**row, "max_completion_count": row.get("max_completion_count") or None}
+
+
+async def _write_quest_rows(path: Path, file_format: DataFileFormat, quests: AsyncIterator[Quest]) -> int:
+    row_count = 0
+    with path.open("w", encoding="utf-8", newline="") as quest_file:
+        writer = csv.DictWriter(quest_file, QUEST_FIELDS) if file_format is DataFileFormat.CSV else None
+        if writer:
+            writer.writeheader()
+        async for quest in quests:
+            row = quest.model_dump(include=set(QUEST_FIELDS))
+            if writer:
+                writer.writerow(row)
+            else:
+                quest_file.write(f"{json.dumps(row)}\n")
+            row_count += 1
+    return row_count
+
+
+@inject
+async def export_quests(
+    path: Path,
+    file_format: DataFileFormat,
+    quest_service: QuestService = Provide[Container.quest_service],
+) -> int:
+    """Stream every quest into a JSONL or CSV file, returning the number of quests written."""
+    start = perf_counter()
+    row_count = await _write_quest_rows(path, file_format, quest_service.stream_all_quests())
+    _log_progress("Exported", row_count, start)
+    return row_count
+
+
+@inject
+async def import_quests(
+    path: Path,
+    file_format: DataFileFormat,
+    batch_size: int = DEFAULT_IMPORT_BATCH_SIZE,
+    quest_service: QuestService = Provide[Container.quest_service],
+) -> int:
+    """
+    Upsert the quests of a JSONL or CSV file on their name, a batch at a time.
+
+    Only a batch of the file is held in memory at once, each batch is committed before the next is read so an
+    interrupted import can be run again.
+
+    Returns
+    -------
+    int: The number of rows read
+    """
+    start = perf_counter()
+    row_count = 0
+    for rows in batched(_read_quest_rows(path, file_format), batch_size):
+        await quest_service.upsert_quests([Quest.model_validate(row) for row in rows])
+        row_count += len(rows)
+        _log_progress("Imported", row_count, start)
+    return row_count
+
+
+def _parse_args(args: Sequence[str] | None) -> Namespace:
+    parser = ArgumentParser(description="Import or export quests as JSONL or CSV")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path", type=Path)
+    parser.add_argument(
+        "--format",
+        dest="file_format",
+        choices=[file_format.value for file_format in DataFileFormat],
+        help="Defaults to the file's extension",
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_IMPORT_BATCH_SIZE)
+    parsed_args = parser.parse_args(args)
+    file_format = parsed_args.file_format or parsed_args.path.suffix.removeprefix(".")
+    supported_formats = [data_file_format.value for data_file_format in DataFileFormat]
+    if file_format not in supported_formats:
+        parser.error(
+            f"can't tell the format of {parsed_args.path}, pass --format or use one of the extensions: "
+            + ", ".join(supported_formats)
+        )
+    parsed_args.file_format = DataFileFormat(file_format)
+    return parsed_args
+
+
+@inject
+async def run_command(args: Namespace, db_client: AsyncDatabase = Provide[Container.async_db_client]) -> None:
+    try:
+        if args.command == "import":
+            await import_quests(args.path, args.file_format, args.batch_size)
+        else:
+            await export_quests(args.path, args.file_format)
+    finally:
+        await db_client.dispose()
+
+
+if __name__ == "__main__":
+    # Not init_resources, the bot's logging config truncates the running bot's log file
+    basicConfig(level=INFO)
+    container = Container()
+    container.wire(modules=[__name__, *WIRE_TO])
+    asyncio.run(run_command(_parse_args(None)))
@@ -40,6 +40,33 @@ class DBSettings(BaseSettings):
     database_host: NonEmptyString
     database_password: NonEmptyString
     database_port: str = Field(default="5432")
+    replica_database_uris: list[NonEmptyString] = Field(default=[])
+    statement_cache_size: int = Field(default=500, gt=0)
+    user_cache_size: int = Field(default=10_000, gt=0)
+    user_cache_ttl: float = Field(default=600.0, gt=0)
+    user_cache_negative_ttl: float = Field(default=60.0, gt=0)
+    leaderboard_cache_size: int = Field(default=1_000, gt=0)
+    leaderboard_refresh_seconds: float = Field(default=300.0, gt=0)
+    quest_board_cache_ttl: float = Field(default=300.0, gt=0)
+    quest_name_index_ttl: float = Field(default=300.0, gt=0)
+    theme_names_ttl: float = Field(default=3_600.0, gt=0)
+    theme_names_min_reload_seconds: float = Field(default=10.0, ge=0)
+    menu_cache_size: int = Field(default=1_000, gt=0)
+    tale_ids_cache_size: int = Field(default=1_000, gt=0)
+    tale_ids_cache_ttl: float = Field(default=300.0, gt=0)
+    xp_write_behind: bool = Field(default=False)
+    xp_flush_interval_ms: float = Field(default=500.0, gt=0)
+    xp_flush_batch_size: int = Field(default=100, gt=0)
+    xp_spool_path: NonEmptyString = Field(default="spool/experience.jsonl")
+    xp_max_write_attempts: int = Field(default=5, gt=0)
+    echo: bool = Field(default=False)
+    slow_query_threshold_ms: float = Field(default=250.0, ge=0)
+    query_log_sample_rate: float = Field(default=0.0, ge=0, le=1)
+    pool_size: int = Field(default=5, gt=0)
+    max_overflow: int = Field(default=10, ge=0)
+    pool_timeout: float = Field(default=30.0, gt=0)
+    pool_recycle: int = Field(default=1800, ge=-1)
+    pool_pre_ping: bool = Field(default=True)
 
     @computed_field  # type: ignore[prop-decorator]
     @property
@@ -71,6 +98,13 @@ class DBSettings(BaseSettings):
             ).url,
         )
 
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def async_replica_database_uris(self) -> list[str]:
+        return [
+            cast(str, furl(replica_uri).set(scheme=ASYNC_PSQL_SCHEME).url) for replica_uri in self.replica_database_uris
+        ]
+
 
 class DiscordSettings(BaseSettings):
     model_config = SettingsConfigDict(env_prefix="discord_")
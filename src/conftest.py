@@ -2,6 +2,7 @@ import asyncio
 
 from asyncio import AbstractEventLoop
 from asyncio import new_event_loop
+from collections.abc import Awaitable
 from collections.abc import Callable
 from collections.abc import Generator
 from copy import copy
@@ -12,6 +13,7 @@ from unittest.mock import sentinel
 import pytest
 
 from polyfactory.pytest_plugin import register_fixture
+from sqlalchemy import Executable
 from sqlalchemy import inspect
 from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlmodel.ext.asyncio.session import AsyncSession
@@ -36,6 +38,7 @@ def mock_container() -> Generator[Container]:
     mocked_container = copy(base_mock_container)
     mocked_container.async_db_client = MagicMock()
     mocked_container.async_repository_factory = MagicMock()
+    mocked_container.unit_of_work.override(MagicMock())
     mocked_container.init_resources()
     yield mocked_container
     mocked_container.unwire()
@@ -109,6 +112,27 @@ async def db_session(sqla_engine):
         await connection.close()
 
 
+@pytest.fixture
+def explain_plan(db_session) -> Callable[[Executable, dict], Awaitable[str]]:
+    """
+    Fixture that returns the query plan postgres picks for a statement.
+
+    The test tables are tiny so a sequential scan is always cheapest, sequential scans are disabled to show whether an
+    index could serve the statement instead.
+    """
+
+    async def explain(statement: Executable, params: dict) -> str:
+        connection = await db_session.connection()
+        await connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        compiled = statement.compile(dialect=connection.dialect)
+        bound_params = compiled.construct_params(params)
+        positional_params = tuple(bound_params[name] for name in compiled.positiontup or [])
+        result = await connection.exec_driver_sql(f"EXPLAIN {compiled}", positional_params)
+        return "\n".join(result.scalars())
+
+    return explain
+
+
 @pytest.fixture
 async def db_user(db_session):
     user = User(discord_id=1234567890)
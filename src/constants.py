@@ -9,6 +9,12 @@ QUEST_ALREADY_ACCEPTED: Final[str] = "You have already accepted this request"
 QUEST_DOES_NOT_EXIST: Final = "This quest does not exist"
 TEMP_CONST: Final[str] = "temp"
 
+# Experience earned outside a discord server is totalled under this server id, discord never assigns it
+NO_SERVER_ID: Final = 0
+
+# The Postgres text search configuration bard tales are indexed and searched with
+TALE_SEARCH_CONFIG: Final = "english"
+
 
 # Enums
 class DayOfWeek(IntEnum):
@@ -24,3 +30,8 @@ class DayOfWeek(IntEnum):
 class ChooseStyle(Enum):
     RANDOM = auto()
     FIRST = auto()
+
+
+class DataFileFormat(Enum):
+    JSONL = "jsonl"
+    CSV = "csv"
@@ -1,16 +1,23 @@
 from asyncio import current_task
 from collections.abc import AsyncGenerator
+from collections.abc import Sequence
 from contextlib import asynccontextmanager
+from itertools import cycle
 from logging import getLogger
 from logging.config import dictConfig
+from typing import Any
+from typing import cast
 
 from dependency_injector.containers import DeclarativeContainer
 from dependency_injector.providers import Callable
 from dependency_injector.providers import Configuration
+from dependency_injector.providers import Dict
 from dependency_injector.providers import Factory
+from dependency_injector.providers import Provider
 from dependency_injector.providers import Resource
 from dependency_injector.providers import Singleton
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlalchemy.ext.asyncio import async_scoped_session
 from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine
@@ -20,22 +27,36 @@ from sqlmodel import Session
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.config import Settings
+from src.helpers.caching import LRUCache
+from src.helpers.instrumentation import InstrumentedAsyncAdaptedQueuePool
+from src.helpers.instrumentation import InstrumentedQueuePool
+from src.helpers.instrumentation import PoolMetrics
+from src.helpers.instrumentation import PoolStats
+from src.helpers.instrumentation import QueryInstrumentation
+from src.helpers.name_map import NameMap
+from src.helpers.prefix_index import PrefixIndex
+from src.helpers.ranking import Ranking
 from src.helpers.sqlalchemy_helpers import BaseModel
+from src.helpers.sqlalchemy_helpers import StatementCache
+from src.helpers.write_behind import WriteBehindQueue
 from src.models import Theme
 from src.models import User
 from src.quests import ExperienceTransaction
 from src.quests import ExperienceTransactionService
 from src.quests import Quest
 from src.quests import QuestService
+from src.quests import UserExperience
 from src.quests import UserQuest
 from src.repositories import AsyncRepository
 from src.repositories import SyncRepository
+from src.repositories import UnitOfWork
 from src.services import ThemeService
 from src.services import UserService
 from src.tavern import BardTale
 from src.tavern import Menu
 from src.tavern import TavernService
 from src.tavern.models import MenuItem
+from src.tavern.services import RenderedMenu
 
 logger = getLogger(__name__)
 
@@ -43,8 +64,30 @@ WIRE_TO: list[str] = []
 
 
 class AsyncDatabase:
-    def __init__(self, db_url: str) -> None:
-        self._async_engine = create_async_engine(db_url, echo=True)
+    """
+    Async engine and task scoped sessions for the primary database and any read replicas.
+
+    Replica sessions are bound to the replicas round robin, each task keeps the replica its first read session used.
+    Without replicas, reads go to the primary.
+    """
+
+    def __init__(
+        self,
+        db_url: str,
+        *,
+        replica_urls: Sequence[str] = (),
+        echo: bool = False,
+        instrumentation: QueryInstrumentation | None = None,
+        pool_options: dict[str, Any] | None = None,
+    ) -> None:
+        self._async_engine = self._create_engine(
+            db_url, echo=echo, instrumentation=instrumentation, pool_options=pool_options
+        )
+        self._replica_engines = [
+            self._create_engine(replica_url, echo=echo, instrumentation=instrumentation, pool_options=pool_options)
+            for replica_url in replica_urls
+        ]
+        self._replica_binds = cycle(self._replica_engines)
         self._session_factory = async_scoped_session(
             async_sessionmaker(
                 self._async_engine,
@@ -55,6 +98,29 @@ class AsyncDatabase:
             ),
             scopefunc=current_task,
         )
+        self._replica_session_factory = async_scoped_session(
+            async_sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, class_=AsyncSession),
+            scopefunc=current_task,
+        )
+
+    @staticmethod
+    def _create_engine(
+        db_url: str,
+        *,
+        echo: bool,
+        instrumentation: QueryInstrumentation | None,
+        pool_options: dict[str, Any] | None,
+    ) -> AsyncEngine:
+        engine = create_async_engine(
+            db_url,
+            echo=echo,
+            poolclass=InstrumentedAsyncAdaptedQueuePool,
+            pool_metrics=PoolMetrics(),
+            **(pool_options or {}),
+        )
+        if instrumentation:
+            instrumentation.attach(engine.sync_engine)
+        return engine
 
     async def create_database(self) -> None:
         async with self._async_engine.begin() as conn:
@@ -63,6 +129,24 @@ class AsyncDatabase:
     def get_session(self) -> AsyncSession:
         return self._session_factory()
 
+    def get_read_session(self) -> AsyncSession:
+        if not self._replica_engines:
+            return self.get_session()
+        if self._replica_session_factory.registry.has():
+            return self._replica_session_factory()
+        return self._replica_session_factory(bind=next(self._replica_binds))
+
+    def get_pool_stats(self) -> PoolStats:
+        return cast(InstrumentedQueuePool, self._async_engine.pool).get_stats()
+
+    def get_replica_pool_stats(self) -> list[PoolStats]:
+        return [cast(InstrumentedQueuePool, engine.pool).get_stats() for engine in self._replica_engines]
+
+    async def dispose(self) -> None:
+        """Close every pooled connection, of the primary and each replica."""
+        for engine in (self._async_engine, *self._replica_engines):
+            await engine.dispose()
+
     @asynccontextmanager
     async def session(self) -> AsyncGenerator[AsyncSession]:
         session: AsyncSession = self._session_factory()
@@ -77,38 +161,148 @@ class AsyncDatabase:
 
 
 class SyncDatabase:
-    def __init__(self, db_url: str) -> None:
-        self._sync_engine = create_engine(db_url)
+    def __init__(
+        self,
+        db_url: str,
+        *,
+        echo: bool = False,
+        instrumentation: QueryInstrumentation | None = None,
+        pool_options: dict[str, Any] | None = None,
+    ) -> None:
+        self._sync_engine = create_engine(
+            db_url, echo=echo, poolclass=InstrumentedQueuePool, pool_metrics=PoolMetrics(), **(pool_options or {})
+        )
+        if instrumentation:
+            instrumentation.attach(self._sync_engine)
         self._sync_factory = scoped_session(sessionmaker(self._sync_engine, expire_on_commit=False, class_=Session))
 
     def get_session(self) -> Session:
         return self._sync_factory()
 
+    def get_pool_stats(self) -> PoolStats:
+        return cast(InstrumentedQueuePool, self._sync_engine.pool).get_stats()
+
+
+def _provide_if_enabled[ProvidedType](provider: Provider[ProvidedType], *, enabled: bool) -> ProvidedType | None:
+    return provider() if enabled else None
+
 
 class Container(DeclarativeContainer):
     config = Configuration("configuration")
     config.from_pydantic(Settings(), required=True, by_alias=True)
     logging = Resource(dictConfig, config=config.logger)
 
-    sync_db_client = Singleton(SyncDatabase, db_url=config.db.sync_database_uri)
-    async_db_client = Singleton(AsyncDatabase, db_url=config.db.async_database_uri)
-    sync_repository_factory = Callable(SyncRepository, session_factory=sync_db_client.provided.get_session)
-    async_repository_factory = Callable(AsyncRepository, session_factory=async_db_client.provided.get_session)
+    query_instrumentation = Singleton(
+        QueryInstrumentation,
+        slow_query_threshold_ms=config.db.slow_query_threshold_ms,
+        sample_rate=config.db.query_log_sample_rate,
+    )
+    pool_options = Dict(
+        pool_size=config.db.pool_size,
+        max_overflow=config.db.max_overflow,
+        pool_timeout=config.db.pool_timeout,
+        pool_recycle=config.db.pool_recycle,
+        pool_pre_ping=config.db.pool_pre_ping,
+    )
+    sync_db_client = Singleton(
+        SyncDatabase,
+        db_url=config.db.sync_database_uri,
+        echo=config.db.echo,
+        instrumentation=query_instrumentation,
+        pool_options=pool_options,
+    )
+    async_db_client = Singleton(
+        AsyncDatabase,
+        db_url=config.db.async_database_uri,
+        replica_urls=config.db.async_replica_database_uris,
+        echo=config.db.echo,
+        instrumentation=query_instrumentation,
+        pool_options=pool_options,
+    )
+    statement_cache = Singleton(StatementCache, max_size=config.db.statement_cache_size)
+    sync_repository_factory = Callable(
+        SyncRepository, session_factory=sync_db_client.provided.get_session, statement_cache=statement_cache
+    )
+    async_repository_factory = Callable(
+        AsyncRepository,
+        session_factory=async_db_client.provided.get_session,
+        statement_cache=statement_cache,
+        read_session_factory=async_db_client.provided.get_read_session,
+    )
+    unit_of_work = Factory(UnitOfWork, session_factory=async_db_client.provided.get_session)
 
-    user_service = Factory(UserService, repository_factory=async_repository_factory, model=User)
-    theme_service = Factory(ThemeService, repository_factory=async_repository_factory, model=Theme)
+    user_cache: Singleton[LRUCache[int, User | None]] = Singleton(
+        LRUCache, max_size=config.db.user_cache_size, ttl=config.db.user_cache_ttl
+    )
+
+    user_service = Factory(
+        UserService,
+        repository_factory=async_repository_factory.provider,
+        model=User,
+        user_cache=user_cache,
+        negative_ttl=config.db.user_cache_negative_ttl,
+    )
+    theme_names: Singleton[NameMap[Theme]] = Singleton(
+        NameMap, max_age=config.db.theme_names_ttl, min_age=config.db.theme_names_min_reload_seconds
+    )
+    theme_service = Factory(
+        ThemeService, repository_factory=async_repository_factory.provider, model=Theme, theme_names=theme_names
+    )
+
+    quest_board_cache: Singleton[LRUCache[int, Sequence[str]]] = Singleton(
+        LRUCache, max_size=4, ttl=config.db.quest_board_cache_ttl
+    )
+
+    quest_name_index = Singleton(PrefixIndex, max_age=config.db.quest_name_index_ttl)
 
     quest_service = Factory(
-        QuestService, repository_factory=async_repository_factory, quest_model=Quest, user_quest_model=UserQuest
+        QuestService,
+        repository_factory=async_repository_factory.provider,
+        quest_model=Quest,
+        user_quest_model=UserQuest,
+        board_cache=quest_board_cache,
+        name_index=quest_name_index,
+    )
+
+    rankings: Singleton[LRUCache[int, Ranking]] = Singleton(
+        LRUCache, max_size=config.db.leaderboard_cache_size, ttl=config.db.leaderboard_refresh_seconds
     )
 
+    # Writes the experience queued by xp_service, its own service has no write_behind so it writes directly
+    xp_write_queue = Singleton(
+        WriteBehindQueue,
+        write_batch=Factory(
+            ExperienceTransactionService,
+            repository_factory=async_repository_factory.provider,
+            experience_transaction_model=ExperienceTransaction,
+            user_experience_model=UserExperience,
+        ).provided.write_queued_xp,
+        spool_path=config.db.xp_spool_path,
+        max_batch_size=config.db.xp_flush_batch_size,
+        flush_interval_ms=config.db.xp_flush_interval_ms,
+        max_attempts=config.db.xp_max_write_attempts,
+    )
+    enabled_xp_write_queue = Callable(_provide_if_enabled, xp_write_queue.provider, enabled=config.db.xp_write_behind)
+
     xp_service = Factory(
-        ExperienceTransactionService, repository_factory=async_repository_factory, model=ExperienceTransaction
+        ExperienceTransactionService,
+        repository_factory=async_repository_factory.provider,
+        experience_transaction_model=ExperienceTransaction,
+        user_experience_model=UserExperience,
+        rankings=rankings,
+        write_behind=enabled_xp_write_queue,
+    )
+
+    menu_cache: Singleton[LRUCache[int, RenderedMenu | None]] = Singleton(LRUCache, max_size=config.db.menu_cache_size)
+    tale_ids_cache: Singleton[LRUCache[int, Sequence[int]]] = Singleton(
+        LRUCache, max_size=config.db.tale_ids_cache_size, ttl=config.db.tale_ids_cache_ttl
     )
 
     tavern_service = Factory(
         TavernService,
-        repository_factory=async_repository_factory,
+        repository_factory=async_repository_factory.provider,
+        menu_cache=menu_cache,
+        tale_ids_cache=tale_ids_cache,
         menu_model=Menu,
         menu_item_model=MenuItem,
         bard_tale_model=BardTale,
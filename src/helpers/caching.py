@@ -0,0 +1,90 @@
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass
+from enum import Enum
+from time import monotonic
+from typing import overload
+
+
+class CacheMiss(Enum):
+    """Returned by LRUCache.get when given as the default, so a cached None can be told apart from a miss."""
+
+    MISS = "miss"
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    size: int
+    max_size: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class LRUCache[KeyType: Hashable, ValueType]:
+    """
+    A bounded mapping which evicts the least recently used entry once full.
+
+    Entries can also expire, after the cache's ttl in seconds or the ttl given when setting them. Every lookup is
+    counted as a hit or miss so the effectiveness of a cache can be reported.
+    """
+
+    max_size: int
+    ttl: float | None
+    hits: int
+    misses: int
+
+    def __init__(self, max_size: int, ttl: float | None = None) -> None:
+        if max_size < 1:
+            raise ValueError("A cache must be able to hold at least one entry.")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[KeyType, tuple[ValueType, float | None]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: KeyType) -> bool:
+        return key in self._entries and not self._is_expired(key)
+
+    def _is_expired(self, key: KeyType) -> bool:
+        _, expires_at = self._entries[key]
+        return expires_at is not None and expires_at <= monotonic()
+
+    @overload
+    def get(self, key: KeyType) -> ValueType | None: ...
+
+    @overload
+    def get[DefaultType](self, key: KeyType, default: DefaultType) -> ValueType | DefaultType: ...
+
+    def get(self, key: KeyType, default: object = None) -> object:
+        if key not in self._entries or self._is_expired(key):
+            self._entries.pop(key, None)
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return self._entries[key][0]
+
+    def set(self, key: KeyType, value: ValueType, ttl: float | None = None) -> None:
+        ttl = ttl if ttl is not None else self.ttl
+        self._entries[key] = (value, monotonic() + ttl if ttl is not None else None)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: KeyType) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(hits=self.hits, misses=self.misses, size=len(self._entries), max_size=self.max_size)
@@ -9,3 +9,10 @@ BLOCK_POST_TEXT: Final[str] = "  " + BOX_SIDE_CHAR
 CODE_BLOCK: Final[str] = "```"
 WRAPPER_TEXT_LEN: Final[int] = len(BLOCK_POST_TEXT) + len(BLOCK_PRE_TEXT)
 MINIMUM_SPACING: Final[int] = 2
+LEADERBOARD_TITLE: Final[str] = "**Leaderboard**"
+NO_RANKED_ADVENTURERS: Final[str] = "No adventurers have earned experience here yet"
+DISCORD_MESSAGE_LIMIT: Final[int] = 2000
+NO_AVAILABLE_QUESTS: Final[str] = "No available quests"
+NO_MATCHING_TALES: Final[str] = "No tales match your search"
+TALE_SEPARATOR: Final[str] = "\n\n"
+TRUNCATION_MARKER: Final[str] = "..."
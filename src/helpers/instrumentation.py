@@ -0,0 +1,186 @@
+import random
+
+from bisect import bisect_left
+from dataclasses import dataclass
+from dataclasses import field
+from logging import getLogger
+from time import perf_counter
+from typing import Any
+from typing import Final
+
+from sqlalchemy import Engine
+from sqlalchemy import event
+from sqlalchemy.engine import ExceptionContext
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.pool import PoolProxiedConnection
+from sqlalchemy.pool import QueuePool
+
+logger = getLogger(__name__)
+
+LATENCY_BUCKETS_MS: Final = (1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0, 500.0, 1000.0, 2500.0)
+OTHER_STATEMENTS_KEY: Final = "<other>"
+_QUERY_START_KEY: Final = "query_start_times"
+
+
+class LatencyHistogram:
+    """
+    Counts latencies into fixed millisecond buckets.
+
+    A latency falls into the first bucket whose upper bound it does not exceed, anything slower than the last bound is
+    counted in a final overflow bucket.
+    """
+
+    bounds: tuple[float, ...]
+    counts: list[int]
+    total_ms: float
+    max_ms: float
+
+    def __init__(self, bounds: tuple[float, ...] = LATENCY_BUCKETS_MS) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    @property
+    def mean_ms(self) -> float:
+        count = self.count
+        return self.total_ms / count if count else 0.0
+
+    def observe(self, latency_ms: float) -> None:
+        self.counts[bisect_left(self.bounds, latency_ms)] += 1
+        self.total_ms += latency_ms
+        self.max_ms = max(self.max_ms, latency_ms)
+
+
+@dataclass
+class QueryInstrumentation:
+    """
+    Records the latency of every statement an engine executes and logs the slow or sampled ones.
+
+    Statements slower than slow_query_threshold_ms are logged as warnings, a sample_rate fraction of the remaining
+    statements are logged at debug level and every other statement is only counted in its histogram. Statements which
+    raise, e.g. when cancelled by a statement_timeout, are counted and logged the same way.
+
+    Parameters
+    ----------
+    slow_query_threshold_ms: float
+    sample_rate: float
+        The fraction, between 0 and 1, of statements under the threshold to log
+    max_statements: int
+        The number of distinct statements to keep histograms for, later statements share a single histogram
+    """
+
+    slow_query_threshold_ms: float
+    sample_rate: float = 0.0
+    max_statements: int = 500
+    histograms: dict[str, LatencyHistogram] = field(default_factory=dict, init=False)
+
+    def attach(self, engine: Engine) -> None:
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+
+    def record(self, statement: str, latency_ms: float, *, failed: bool = False) -> None:
+        histogram = self.histograms.get(statement)
+        if histogram is None:
+            if len(self.histograms) >= self.max_statements:
+                statement = OTHER_STATEMENTS_KEY
+            histogram = self.histograms.setdefault(statement, LatencyHistogram())
+        histogram.observe(latency_ms)
+        if latency_ms >= self.slow_query_threshold_ms:
+            logger.warning("%s query took %.1f ms: %s", "Failed" if failed else "Slow", latency_ms, statement)
+        elif self.sample_rate and random.random() < self.sample_rate:  # noqa: S311
+            logger.debug("Query took %.1f ms: %s", latency_ms, statement)
+
+    # Start times are keyed on the statement's execution context, which both the after and the error events are given
+    def _before_cursor_execute(
+        self, conn: Any, _cursor: Any, _statement: str, _parameters: Any, context: Any, *_args: Any
+    ) -> None:
+        conn.info.setdefault(_QUERY_START_KEY, {})[context] = perf_counter()
+
+    def _after_cursor_execute(
+        self, conn: Any, _cursor: Any, statement: str, _parameters: Any, context: Any, *_args: Any
+    ) -> None:
+        start = conn.info[_QUERY_START_KEY].pop(context)
+        self.record(statement, (perf_counter() - start) * 1000)
+
+    def _handle_error(self, exception_context: ExceptionContext) -> None:
+        # A statement which raises never reaches after_cursor_execute, one which failed before executing has no start
+        if exception_context.connection is None:
+            return
+        start_times = exception_context.connection.info.get(_QUERY_START_KEY, {})
+        if (start := start_times.pop(exception_context.execution_context, None)) is not None:
+            self.record(exception_context.statement or "", (perf_counter() - start) * 1000, failed=True)
+
+
+@dataclass(frozen=True)
+class PoolStats:
+    size: int
+    in_use: int
+    idle: int
+    overflow: int
+    timeouts: int
+    checkout_wait: LatencyHistogram
+
+
+@dataclass
+class PoolMetrics:
+    """
+    Collects how long connections take to check out of a pool and how often a checkout times out.
+
+    Given to an InstrumentedQueuePool through the engine's pool_metrics argument.
+    """
+
+    checkout_wait: LatencyHistogram = field(default_factory=LatencyHistogram)
+    timeouts: int = 0
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    A QueuePool which records checkout waits and timeouts into its PoolMetrics.
+
+    The wait covers everything between asking for a connection and receiving it, waiting for a free connection,
+    opening a new one and the pre ping.
+    """
+
+    pool_metrics: PoolMetrics
+
+    def __init__(self, creator: Any, pool_metrics: PoolMetrics | None = None, **kwargs: Any) -> None:
+        # pool_metrics is positional so create_engine recognises it as a pool argument
+        super().__init__(creator, **kwargs)
+        self.pool_metrics = pool_metrics or PoolMetrics()
+
+    def connect(self) -> PoolProxiedConnection:
+        start = perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            self.pool_metrics.timeouts += 1
+            raise
+        finally:
+            self.pool_metrics.checkout_wait.observe((perf_counter() - start) * 1000)
+
+    def recreate(self) -> QueuePool:
+        pool = super().recreate()
+        if isinstance(pool, InstrumentedQueuePool):
+            pool.pool_metrics = self.pool_metrics
+        return pool
+
+    def get_stats(self) -> PoolStats:
+        return PoolStats(
+            size=self.size(),
+            in_use=self.checkedout(),
+            idle=self.checkedin(),
+            overflow=max(self.overflow(), 0),
+            timeouts=self.pool_metrics.timeouts,
+            checkout_wait=self.pool_metrics.checkout_wait,
+        )
+
+
+class InstrumentedAsyncAdaptedQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    pass
@@ -5,13 +5,22 @@ from src.helpers.constants import BLOCK_POST_TEXT
 from src.helpers.constants import BLOCK_PRE_TEXT
 from src.helpers.constants import BOX_VERTICAL_CHAR
 from src.helpers.constants import CODE_BLOCK
+from src.helpers.constants import DISCORD_MESSAGE_LIMIT
 from src.helpers.constants import EXPERIENCE_COLUMN_NAME
+from src.helpers.constants import LEADERBOARD_TITLE
 from src.helpers.constants import MINIMUM_SPACING
+from src.helpers.constants import NO_AVAILABLE_QUESTS
+from src.helpers.constants import NO_MATCHING_TALES
+from src.helpers.constants import NO_RANKED_ADVENTURERS
 from src.helpers.constants import QUEST_COLUMN_NAME
+from src.helpers.constants import TALE_SEPARATOR
+from src.helpers.constants import TRUNCATION_MARKER
 from src.helpers.constants import WRAPPER_TEXT_LEN
 
 if TYPE_CHECKING:
     from src.quests.models import Quest
+    from src.tavern.models import BardTale
+    from src.tavern.models import Menu
 
 
 def _create_single_quest_line(first_column: str, second_column: str, line_length: int) -> str:
@@ -19,27 +28,145 @@ def _create_single_quest_line(first_column: str, second_column: str, line_length
     return "".join([BLOCK_PRE_TEXT, first_column, " " * num_spaces_needed, second_column, BLOCK_POST_TEXT])
 
 
-def format_quest_board(quests: Sequence["Quest"]) -> str:
+def _get_board_length(line_length: int) -> int:
+    # The code blocks, borders and header joined by four newlines, each quest then adds its line and a newline
+    return 2 * len(CODE_BLOCK) + 3 * line_length + 4
+
+
+def get_board_line_length(
+    max_name_length: int, max_experience_length: int, page_length: int = DISCORD_MESSAGE_LIMIT
+) -> int:
+    """
+    Get the length of every line of a quest board, from the longest quest name and experience it shows.
+
+    Capped so a board with a single quest still fits in page_length, format_quest_board_lines truncates the names of
+    any quests which don't fit in that.
     """
-    Format a list of quests to look like a quest board.
+    max_title_length = max(max_name_length, len(QUEST_COLUMN_NAME))
+    max_xp_length = max(max_experience_length, len(EXPERIENCE_COLUMN_NAME))
+    line_length = max_title_length + max_xp_length + WRAPPER_TEXT_LEN + MINIMUM_SPACING
+    # The borders, header and a single quest are four lines, with a newline after the quest
+    return min(line_length, (page_length - _get_board_length(0) - 1) // 4)
+
 
-    The formatting is normalized so that all quest names and XP values start at the same char position
-    Since Quests is len 6 and XP is len 2 the minimum line length is 18, and each column has minimum length 6 and 2.
+def _create_quest_board(board_quest_text: Sequence[str], line_length: int) -> str:
+    board_top_and_bottom = BOX_VERTICAL_CHAR * line_length
+    header = _create_single_quest_line(QUEST_COLUMN_NAME, EXPERIENCE_COLUMN_NAME, line_length)
+    return "\n".join([CODE_BLOCK, board_top_and_bottom, header, *board_quest_text, board_top_and_bottom, CODE_BLOCK])
+
+
+def format_quest_board_lines(quests: Sequence["Quest"], line_length: int) -> list[str]:
+    """
+    Format each quest as a line of a quest board, line_length long as given by get_board_line_length.
+
+    A quest name too long for the line is cut short and ends with a truncation marker.
+    """
+    lines = []
+    for quest in quests:
+        experience = str(quest.experience)
+        name = quest.name
+        max_name_length = line_length - WRAPPER_TEXT_LEN - MINIMUM_SPACING - len(experience)
+        if len(name) > max_name_length:
+            name = name[: max_name_length - len(TRUNCATION_MARKER)] + TRUNCATION_MARKER
+        lines.append(_create_single_quest_line(name, experience, line_length))
+    return lines
+
+
+def paginate_quest_board_lines(
+    board_quest_text: Sequence[str], line_length: int, page_length: int = DISCORD_MESSAGE_LIMIT
+) -> list[str]:
+    """
+    Split quest lines from format_quest_board_lines into quest boards which each fit in page_length characters.
+
+    Lets a board be built from quests read a page at a time, only their lines are held rather than every quest.
+    """
+    if not board_quest_text:
+        return [NO_AVAILABLE_QUESTS]
+    quests_per_page = max((page_length - _get_board_length(line_length)) // (line_length + 1), 1)
+    return [
+        _create_quest_board(board_quest_text[start : start + quests_per_page], line_length)
+        for start in range(0, len(board_quest_text), quests_per_page)
+    ]
+
+
+def format_leaderboard(
+    top: Sequence[tuple[int, int]], caller_discord_id: int, caller_rank: int | None, caller_experience: int | None
+) -> str:
+    """
+    Format the top of a leaderboard, followed by the caller's own rank when they are not already shown.
 
     Parameters
     ----------
-    quests: List of quest to represent
+    top: The discord ids and experience of the highest ranked users, highest first
+    caller_discord_id: The discord id of the user asking
+    caller_rank: The rank of the user asking, None if they have not earned any experience
+    caller_experience: The experience of the user asking
 
     Returns
     -------
-    A code block of text which represents a list of quest names and how much XP that quest is worth.
+    One line per user, mentioning them by their discord id.
     """
-    if not quests:
-        return "No available quests"
-    max_title_length = max([len(quest.name) for quest in quests] + [len(QUEST_COLUMN_NAME)])
-    max_xp_length = max([len(str(quest.experience)) for quest in quests] + [len(EXPERIENCE_COLUMN_NAME)])
-    line_length = max_title_length + max_xp_length + WRAPPER_TEXT_LEN + MINIMUM_SPACING
-    board_top_and_bottom = BOX_VERTICAL_CHAR * line_length
-    header = _create_single_quest_line(QUEST_COLUMN_NAME, EXPERIENCE_COLUMN_NAME, line_length)
-    board_quest_text = [_create_single_quest_line(quest.name, str(quest.experience), line_length) for quest in quests]
-    return "\n".join([CODE_BLOCK, board_top_and_bottom, header, *board_quest_text, board_top_and_bottom, CODE_BLOCK])
+    if not top:
+        return NO_RANKED_ADVENTURERS
+    lines = [LEADERBOARD_TITLE]
+    previous_experience, rank = None, 0
+    for position, (discord_id, experience) in enumerate(top, start=1):
+        if experience != previous_experience:
+            previous_experience, rank = experience, position
+        lines.append(f"{rank}. <@{discord_id}> - {experience} XP")
+    if caller_rank is None:
+        lines.append("You are not ranked yet, complete a quest to earn experience")
+    elif caller_discord_id not in {discord_id for discord_id, _ in top}:
+        lines.append(f"You are ranked {caller_rank} with {caller_experience} XP")
+    return "\n".join(lines)
+
+
+def format_menu(menu: "Menu") -> str:
+    """
+    Format a week's menu, listing every day of the week and the food served on it.
+
+    Parameters
+    ----------
+    menu: The menu with its items loaded
+
+    Returns
+    -------
+    The week the menu starts followed by each day's items, or a note that the day has none.
+    """
+    menu_str = f"Menu for the week of {menu.start_date.strftime('%b %d, %Y')}"
+    for day, items in menu.grouped_items.items():
+        menu_str += f"\n**{day.name.title()}**:"
+        if not items:
+            menu_str += "\n  No items available."
+        for item in items:
+            menu_str += f"\n  - {item.food.capitalize()}"
+    return menu_str
+
+
+def paginate_tales(tales: Sequence["BardTale"], page_length: int = DISCORD_MESSAGE_LIMIT) -> list[str]:
+    """
+    Format tales as pages which each fit in a message of page_length characters, keeping the tales in order.
+
+    Parameters
+    ----------
+    tales: The tales to list, each shown as its name followed by its story
+    page_length: The most characters a page may have
+
+    Returns
+    -------
+    One or more pages of tales, a story too long to fit on a page by itself is cut short.
+    """
+    if not tales:
+        return [NO_MATCHING_TALES]
+    pages: list[str] = []
+    page = ""
+    for tale in tales:
+        tale_text = f"**{tale.name.title()}**\n{tale.story}"
+        if len(tale_text) > page_length:
+            tale_text = tale_text[: page_length - len(TRUNCATION_MARKER)] + TRUNCATION_MARKER
+        if page and len(page) + len(TALE_SEPARATOR) + len(tale_text) > page_length:
+            pages.append(page)
+            page = ""
+        page = f"{page}{TALE_SEPARATOR}{tale_text}" if page else tale_text
+    pages.append(page)
+    return pages
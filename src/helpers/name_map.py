@@ -0,0 +1,52 @@
+from asyncio import Lock
+from collections.abc import Iterable
+from time import monotonic
+
+
+class NameMap[ValueType]:
+    """
+    Case insensitive lookup of values by name, using a dict keyed on their case folded names.
+
+    Names which only differ by case share a key, so a lookup returns every value with a matching name and its owner can
+    tell a missing name apart from an ambiguous one. A map can expire max_age seconds after it was built, telling its
+    owner to build it again from a fresh set of values. Owners which also rebuild a fresh map, such as when a lookup
+    misses, can wait until min_age seconds after it was built so rebuilds stay bounded however many lookups miss.
+    Owners sharing a map hold its rebuild_lock while rebuilding it, so only one of them rebuilds it at a time.
+    """
+
+    max_age: float | None
+    min_age: float
+    rebuild_lock: Lock
+
+    def __init__(self, max_age: float | None = None, min_age: float = 0.0) -> None:
+        self.max_age = max_age
+        self.min_age = min_age
+        self._values: dict[str, list[ValueType]] = {}
+        self._built_at: float | None = None
+        self.rebuild_lock = Lock()
+
+    def __len__(self) -> int:
+        return sum(len(values) for values in self._values.values())
+
+    @property
+    def is_fresh(self) -> bool:
+        return self._built_at is not None and (self.max_age is None or monotonic() - self._built_at < self.max_age)
+
+    @property
+    def can_rebuild(self) -> bool:
+        return self._built_at is None or monotonic() - self._built_at >= self.min_age
+
+    def build(self, named_values: Iterable[tuple[str, ValueType]]) -> None:
+        values: dict[str, list[ValueType]] = {}
+        for name, value in named_values:
+            values.setdefault(name.casefold(), []).append(value)
+        self._values = values
+        self._built_at = monotonic()
+
+    def clear(self) -> None:
+        self._values = {}
+        self._built_at = None
+
+    def get(self, name: str) -> list[ValueType]:
+        """Get every value whose name matches name, ignoring case."""
+        return list(self._values.get(name.casefold(), []))
@@ -0,0 +1,50 @@
+from bisect import bisect_left
+from collections.abc import Iterable
+from time import monotonic
+
+
+class PrefixIndex:
+    """
+    Case insensitive prefix search over a set of names, using a sorted array of their case folded forms.
+
+    Searching is a binary search for the first name at or after the prefix followed by a scan of the names sharing it,
+    so it never touches the source of the names. An index can expire max_age seconds after it was built, telling its
+    owner to build it again from a fresh set of names.
+    """
+
+    max_age: float | None
+
+    def __init__(self, max_age: float | None = None) -> None:
+        self.max_age = max_age
+        self._keys: list[str] = []
+        self._names: list[str] = []
+        self._built_at: float | None = None
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    @property
+    def is_fresh(self) -> bool:
+        return self._built_at is not None and (self.max_age is None or monotonic() - self._built_at < self.max_age)
+
+    def build(self, names: Iterable[str]) -> None:
+        entries = sorted({(name.casefold(), name) for name in names})
+        self._keys = [key for key, _ in entries]
+        self._names = [name for _, name in entries]
+        self._built_at = monotonic()
+
+    def clear(self) -> None:
+        self._keys = []
+        self._names = []
+        self._built_at = None
+
+    def search(self, prefix: str, limit: int) -> list[str]:
+        """Get up to limit names starting with prefix, ignoring case, in case folded order."""
+        key = prefix.casefold()
+        start = bisect_left(self._keys, key)
+        matches = []
+        for index in range(start, min(start + limit, len(self._keys))):
+            if not self._keys[index].startswith(key):
+                break
+            matches.append(self._names[index])
+        return matches
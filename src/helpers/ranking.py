@@ -0,0 +1,43 @@
+from bisect import bisect_left
+from bisect import insort
+from collections.abc import Iterable
+
+
+class Ranking:
+    """
+    Members ordered by descending score, kept sorted as scores change.
+
+    Looking up the top members is a slice and a member's rank a binary search. Changing a score moves a single entry,
+    so the ranking can be kept in step with every score change instead of being sorted again. Members with the same
+    score share a rank and are listed by ascending member id.
+    """
+
+    def __init__(self, scores: Iterable[tuple[int, int]] = ()) -> None:
+        self._scores = dict(scores)
+        self._order = sorted((-score, member_id) for member_id, score in self._scores.items())
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def __contains__(self, member_id: int) -> bool:
+        return member_id in self._scores
+
+    def get_score(self, member_id: int) -> int | None:
+        return self._scores.get(member_id)
+
+    def set_score(self, member_id: int, score: int) -> None:
+        if (previous_score := self._scores.get(member_id)) is not None:
+            del self._order[bisect_left(self._order, (-previous_score, member_id))]
+        insort(self._order, (-score, member_id))
+        self._scores[member_id] = score
+
+    def top(self, count: int) -> list[tuple[int, int]]:
+        """Get the member ids and scores of the count highest scoring members, highest first."""
+        return [(member_id, -negative_score) for negative_score, member_id in self._order[:count]]
+
+    def get_rank(self, member_id: int) -> int | None:
+        """Get a member's 1 based rank, the number of members with a higher score plus one, None if not ranked."""
+        if (score := self._scores.get(member_id)) is None:
+            return None
+        # (-score,) sorts before every entry with this score, whatever its member id
+        return bisect_left(self._order, (-score,)) + 1
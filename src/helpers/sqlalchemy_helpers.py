@@ -1,9 +1,15 @@
 import re
 
+from collections.abc import Callable
+from collections.abc import Hashable
+from collections.abc import Sequence
 from dataclasses import dataclass
 from dataclasses import field
+from dataclasses import fields
+from dataclasses import replace
 from enum import IntEnum
 from typing import Any
+from typing import Final
 from typing import override
 
 from sqlalchemy import Column
@@ -12,18 +18,25 @@ from sqlalchemy import ForeignKey
 from sqlalchemy import Integer
 from sqlalchemy import Table
 from sqlalchemy import TypeDecorator
+from sqlalchemy import bindparam
 from sqlalchemy import func
 from sqlalchemy.orm import InstrumentedAttribute
 from sqlalchemy.sql.base import ExecutableOption
+from sqlalchemy.sql.cache_key import HasCacheKey
 from sqlalchemy.sql.elements import UnaryExpression
 from sqlalchemy.sql.functions import random
 from sqlmodel import SQLModel
 from sqlmodel.sql.expression import Select
 
+from src.helpers.caching import CacheStats
+from src.helpers.caching import LRUCache
+from src.typeshed import EntitiesType
 from src.typeshed import JoinListType
 from src.typeshed import JoinStruct
 from src.typeshed import SQLLogicType
 
+KEYSET_AFTER_ID_PARAM: Final = "keyset_after_id"
+
 
 class BaseModel(SQLModel):
     pass
@@ -75,6 +88,24 @@ class _EagerOptionsHandler(_QueryHandler):
         return query
 
 
+@dataclass
+class _KeysetQueryHandler(_QueryHandler):
+    func_data: tuple[int | None, int | None]
+    id_column: InstrumentedAttribute | None = field(default=None)
+
+    @override
+    def update_query(self, query: Select) -> Select:
+        after_id, page_size = self.func_data
+        if self.id_column is None or (after_id is None and page_size is None):
+            return query
+        if after_id is not None:
+            query = query.filter(self.id_column > bindparam(KEYSET_AFTER_ID_PARAM))
+        query = query.order_by(self.id_column)
+        if page_size is not None:
+            query = query.limit(page_size)
+        return query
+
+
 @dataclass(frozen=True)
 class QueryArgs:
     filter_list: list[SQLLogicType] | None = None
@@ -86,12 +117,34 @@ class QueryArgs:
     group_by: list[Column] | None = None
     having: list[SQLLogicType] | None = None
     limit: int | None = None
+    after_id: int | None = None
+    page_size: int | None = None
+    params: dict[str, Any] | None = None
+    use_primary: bool = False
 
     def __post_init__(self) -> None:
         if not self.group_by and self.having:
             raise Warning("Defining query with having clause but no group by clause")
+        if (self.after_id is not None or self.page_size is not None) and (self.order_by or self.limit is not None):
+            # Pages are cut on the id, any other ordering would skip or repeat rows and page_size is the limit
+            raise ValueError("Keyset pagination orders and limits by id, it can't be combined with order_by or limit")
+
+    def get_params(self) -> dict[str, Any]:
+        params = dict(self.params) if self.params else {}
+        if self.after_id is not None:
+            params[KEYSET_AFTER_ID_PARAM] = self.after_id
+        return params
 
-    def get_query_handlers(self) -> list[_QueryHandler]:
+    def get_query_handlers(self, id_column: InstrumentedAttribute | None = None) -> list[_QueryHandler]:
+        """
+        Get the handlers which apply each argument to a query, in the order they are applied.
+
+        Parameters
+        ----------
+        id_column: InstrumentedAttribute | None
+            The id column of the queried model. Keyset pagination, after_id and page_size, orders and filters on it,
+            so it is only applied when this is provided.
+        """
         return [
             _QueryHandler("filter_by", self.filter_dict),
             _JoinQueryHandler("join", self.join_on),
@@ -102,9 +155,127 @@ class QueryArgs:
             _QueryHandler("order_by", self.order_by),
             _QueryHandler("distinct", self.distinct_on, allow_empty_data=True),
             _QueryHandler("limit", self.limit),
+            _KeysetQueryHandler("keyset", (self.after_id, self.page_size), id_column=id_column),
         ]
 
 
+class _UncacheableQuery(Exception): ...
+
+
+def _element_shape(element: Any) -> Hashable:
+    if isinstance(element, HasCacheKey):
+        cache_key = element._generate_cache_key()
+        # Literal values are extracted as bind parameters, a shared statement would keep the first call's values
+        if cache_key is None or not all(bind.required for bind in cache_key.bindparams):
+            raise _UncacheableQuery
+        return cache_key.key
+    if isinstance(element, JoinStruct):
+        return JoinStruct, _element_shape(element.join_model), _element_shape(element.join_on), element.use_outer_join
+    if isinstance(element, list | tuple):
+        return tuple(_element_shape(item) for item in element)
+    if element is None or isinstance(element, type | bool | int | str):
+        return element
+    raise _UncacheableQuery
+
+
+def _filter_dict_shape(filter_dict: dict[str, Any] | None) -> Hashable:
+    if filter_dict is None:
+        return None
+    if any(isinstance(value, SQLModel) for value in filter_dict.values()):
+        raise _UncacheableQuery
+    # None is kept as a literal so filter_by still renders IS NULL
+    return tuple(sorted((key, value is None) for key, value in filter_dict.items()))
+
+
+def _bind_filter_dict(query_args: QueryArgs) -> tuple[QueryArgs, dict[str, Any]]:
+    if not query_args.filter_dict:
+        return query_args, {}
+    bound_filters: dict[str, Any] = {}
+    bound_values: dict[str, Any] = {}
+    for key, value in query_args.filter_dict.items():
+        if value is None:
+            bound_filters[key] = value
+            continue
+        bound_filters[key] = bindparam(f"filter_dict_{key}")
+        bound_values[f"filter_dict_{key}"] = value
+    return replace(query_args, filter_dict=bound_filters), bound_values
+
+
+class StatementCache:
+    """
+    Cache of built select statements keyed on the shape of the QueryArgs which produced them.
+
+    Values in ``filter_dict`` are swapped for named bind parameters, so every query with the same keys shares one
+    statement and SQLAlchemy's compiled form of it. Query arguments holding literal values anywhere else are built
+    fresh on every call, use ``bindparam`` placeholders with ``QueryArgs.params`` to make them cacheable.
+    """
+
+    bypasses: int
+
+    def __init__(self, max_size: int) -> None:
+        self._statements: LRUCache[Hashable, Select] = LRUCache(max_size)
+        self.bypasses = 0
+
+    @staticmethod
+    def _get_shape(query_args: QueryArgs | None, to_select: Sequence[EntitiesType]) -> Hashable:
+        shape: list[Hashable] = [_element_shape(list(to_select))]
+        if query_args:
+            for query_field in fields(query_args):
+                if query_field.name in {"params", "use_primary"}:
+                    continue
+                value = getattr(query_args, query_field.name)
+                if query_field.name == "filter_dict":
+                    shape.append(_filter_dict_shape(value))
+                elif query_field.name == "after_id":
+                    shape.append(value is not None)
+                else:
+                    shape.append(_element_shape(value))
+        return tuple(shape)
+
+    def get_statement(
+        self,
+        query_args: QueryArgs | None,
+        to_select: Sequence[EntitiesType],
+        build: Callable[[QueryArgs | None], Select],
+    ) -> tuple[Select, dict[str, Any]]:
+        """
+        Find or build the statement for the provided query arguments.
+
+        Parameters
+        ----------
+        query_args: QueryArgs | None
+        to_select: Sequence[EntitiesType]
+            The entities the statement selects, these are part of the statement's shape
+        build: Callable[[QueryArgs | None], Select]
+            Builds the statement on a cache miss, or for query arguments which cannot be cached
+
+        Returns
+        -------
+        tuple[Select, dict[str, Any]]: The statement and the bind parameter values it should be executed with
+        """
+        params = query_args.get_params() if query_args else {}
+        try:
+            shape = self._get_shape(query_args, to_select)
+        except _UncacheableQuery:
+            self.bypasses += 1
+            return build(query_args), params
+
+        if query_args:
+            query_args, bound_values = _bind_filter_dict(query_args)
+            params.update(bound_values)
+        if (statement := self._statements.get(shape)) is None:
+            statement = build(query_args)
+            self._statements.set(shape, statement)
+        return statement, params
+
+    def clear(self) -> None:
+        self._statements.clear()
+
+    @property
+    def stats(self) -> CacheStats:
+        return self._statements.stats
+
+
 def many_to_many_table(first_table: str, second_table: str) -> Table:
     def get_column(table_name: str) -> Column:
         return Column(
@@ -125,6 +296,7 @@ def snake_case_table_name(model_name: str) -> str:
 
 
 def case_insensitive_str_compare(column: "str", value: str) -> SQLLogicType:
+    """Compare as lower(column) = value, which an index on lower(column) can serve unlike ilike."""
     return func.lower(column) == value.lower()
 
 
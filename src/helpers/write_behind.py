@@ -0,0 +1,381 @@
+import json
+import os
+
+from asyncio import CancelledError
+from asyncio import Event
+from asyncio import Future
+from asyncio import Lock
+from asyncio import Task
+from asyncio import create_task
+from asyncio import get_running_loop
+from asyncio import sleep
+from asyncio import to_thread
+from asyncio import wait_for
+from collections import deque
+from collections.abc import Awaitable
+from collections.abc import Callable
+from contextlib import suppress
+from dataclasses import dataclass
+from logging import getLogger
+from pathlib import Path
+from time import monotonic
+from time import perf_counter
+from typing import Any
+from typing import Final
+from typing import TextIO
+
+from src.helpers.instrumentation import LatencyHistogram
+
+logger = getLogger(__name__)
+
+MAX_RETRY_DELAY_MS: Final = 60_000.0
+
+type WriteBehindRecord = dict[str, Any]
+
+
+@dataclass(frozen=True)
+class WriteBehindStats:
+    queue_depth: int
+    written: int
+    failed_flushes: int
+    dead_lettered: int
+    flush_latency: LatencyHistogram
+
+
+class WriteBehindQueue:
+    """
+    Queues records in memory and writes them in batches, every flush_interval_ms or once max_batch_size are queued.
+
+    Records are appended to an append only spool file, one JSON object per line, so the records left in it by a crash
+    are queued again when the queue is started. Putting a record returns an awaitable which resolves once the record is
+    synced to disk, callers await it before acknowledging the record so a crash loses nothing they acknowledged. The
+    spool is synced on a worker thread so the event loop never waits on the disk, and the records put while a sync
+    runs are synced together by the next one, so under load one fsync covers many records. Written records are left in
+    the spool until compact_after of them have built up, then it is rewritten to the records still queued, so a crash
+    also writes the records written since the last compaction again. Writers must make writing a record twice a no-op.
+
+    A batch which fails is written again a record at a time, so a bad record can't hold back the records queued with
+    it. A record which fails on its own max_attempts times is moved to the dead letter spool, which can be appended to
+    the spool to queue its records again. After a failed flush the background flushes back off, doubling the wait up to
+    MAX_RETRY_DELAY_MS, so an outage uses up a record's attempts over minutes rather than seconds.
+
+    Parameters
+    ----------
+    write_batch: Callable[[list[WriteBehindRecord]], Awaitable[None]]
+        Writes a batch of records, the batch is queued again if it raises
+    spool_path: str | Path
+    dead_letter_path: str | Path | None
+        Where records which keep failing are moved, next to the spool with a .dead suffix if None
+    max_batch_size: int
+    flush_interval_ms: float
+    max_attempts: int
+    compact_after: int
+        How many written records the spool holds before it is compacted
+    """
+
+    max_batch_size: int
+    flush_interval_ms: float
+    max_attempts: int
+    compact_after: int
+    written: int
+    failed_flushes: int
+    dead_lettered: int
+    flush_latency: LatencyHistogram
+
+    def __init__(
+        self,
+        write_batch: Callable[[list[WriteBehindRecord]], Awaitable[None]],
+        spool_path: str | Path,
+        *,
+        dead_letter_path: str | Path | None = None,
+        max_batch_size: int = 100,
+        flush_interval_ms: float = 500.0,
+        max_attempts: int = 5,
+        compact_after: int = 1_000,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError("A batch must be able to hold at least one record.")
+        if max_attempts < 1:
+            raise ValueError("A record must be attempted at least once.")
+        self.write_batch = write_batch
+        self.spool_path = Path(spool_path)
+        self.dead_letter_path = (
+            Path(dead_letter_path)
+            if dead_letter_path is not None
+            else self.spool_path.with_name(f"{self.spool_path.stem}.dead{self.spool_path.suffix}")
+        )
+        self.max_batch_size = max_batch_size
+        self.flush_interval_ms = flush_interval_ms
+        self.max_attempts = max_attempts
+        self.compact_after = compact_after
+        self.written = 0
+        self.failed_flushes = 0
+        self.dead_lettered = 0
+        self.flush_latency = LatencyHistogram()
+        self._records: deque[WriteBehindRecord] = deque()
+        # Failed attempts of the records which have failed on their own, keyed by the record's id
+        self._attempts: dict[int, int] = {}
+        self._consecutive_failures = 0
+        self._retry_at = 0.0
+        self._batch_ready = Event()
+        self._flush_lock = Lock()
+        # Held while the spool file is written, so appending and compacting never overlap
+        self._spool_lock = Lock()
+        self._spool: TextIO | None = None
+        # Lines of the records put since the spool was last synced, and the futures waiting for them to be synced
+        self._unspooled: list[str] = []
+        self._unspooled_waiters: list[Future[None]] = []
+        self._spooler: Task[None] | None = None
+        # Written records still in the spool, removed by the next compaction
+        self._spooled_written = 0
+        self._flusher: Task[None] | None = None
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @property
+    def is_running(self) -> bool:
+        return self._flusher is not None
+
+    async def start(self) -> None:
+        """Queue the records left in the spool by the last run and start flushing in the background."""
+        if self.is_running:
+            return
+        self.spool_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.spool_path.exists():
+            with self.spool_path.open(encoding="utf-8") as spool:
+                self._records.extend(json.loads(line) for line in spool if line.strip())
+            if self._records:
+                logger.info("Queued %d records left in %s", len(self._records), self.spool_path)
+        self._spool = self.spool_path.open("a", encoding="utf-8")
+        self._flusher = create_task(self._flush_periodically())
+
+    def put(self, record: WriteBehindRecord) -> Future[None]:
+        """
+        Queue a record to be written by the next flush, and sync it to the spool in the background.
+
+        Returns
+        -------
+        Future[None]: Resolves once the record is synced to the spool, or raises if syncing it failed
+        """
+        if self._spool is None:
+            raise RuntimeError("The write behind queue must be started before records are queued.")
+        spooled: Future[None] = get_running_loop().create_future()
+        self._unspooled.append(f"{json.dumps(record)}\n")
+        self._unspooled_waiters.append(spooled)
+        self._records.append(record)
+        if self._spooler is None or self._spooler.done():
+            self._spooler = create_task(self._spool_in_background())
+        if len(self._records) >= self.max_batch_size:
+            self._batch_ready.set()
+        return spooled
+
+    async def flush(self) -> None:
+        """
+        Write every queued record, in batches of at most max_batch_size.
+
+        Raises the last error of a failed batch's records once they are queued again, records moved to the dead letter
+        spool don't fail the flush. The spool is synced before any record is written and compacted afterwards once
+        enough written records have built up in it.
+        """
+        async with self._flush_lock:
+            await self._sync_spool()
+            await self._write_queued()
+            if self._spooled_written >= self.compact_after:
+                await self._compact_spool()
+
+    async def _write_queued(self) -> None:
+        while self._records:
+            batch = [self._records.popleft() for _ in range(min(self.max_batch_size, len(self._records)))]
+            start = perf_counter()
+            try:
+                await self.write_batch(batch)
+            except Exception as batch_error:
+                self.failed_flushes += 1
+                error = batch_error
+            except BaseException:
+                self._records.extendleft(reversed(batch))
+                self.failed_flushes += 1
+                raise
+            else:
+                self.flush_latency.observe((perf_counter() - start) * 1000)
+                self.written += len(batch)
+                self._spooled_written += len(batch)
+                self._consecutive_failures = 0
+                continue
+            await self._write_one_at_a_time(batch, error)
+
+    async def _write_one_at_a_time(self, batch: list[WriteBehindRecord], batch_error: Exception) -> None:
+        failed: list[WriteBehindRecord] = []
+        error: Exception | None = None
+        for index, record in enumerate(batch):
+            try:
+                # A batch of one has already been written on its own
+                if len(batch) > 1:
+                    await self.write_batch([record])
+                else:
+                    raise batch_error
+            except Exception as record_error:
+                error = record_error
+                attempts = self._attempts.pop(id(record), 0) + 1
+                if attempts < self.max_attempts:
+                    self._attempts[id(record)] = attempts
+                    failed.append(record)
+                else:
+                    logger.error("Moving a record to %s after %d failed writes", self.dead_letter_path, attempts)
+                    await self._dead_letter(record)
+            except BaseException:
+                self._records.extendleft(reversed([*failed, *batch[index:]]))
+                raise
+            else:
+                self._attempts.pop(id(record), None)
+                self.written += 1
+                self._spooled_written += 1
+        self._records.extendleft(reversed(failed))
+        if error is not None and failed:
+            self._consecutive_failures += 1
+            self._retry_at = monotonic() + self._get_flush_wait_ms() / 1000
+            raise error
+
+    async def _dead_letter(self, record: WriteBehindRecord) -> None:
+        await to_thread(_append_lines, self.dead_letter_path, [f"{json.dumps(record)}\n"])
+        self.dead_lettered += 1
+        self._spooled_written += 1
+
+    async def close(self) -> None:
+        """Stop flushing in the background and write every queued record, leaving any which fail in the spool."""
+        if self._flusher is None:
+            return
+        self._flusher.cancel()
+        with suppress(CancelledError):
+            await self._flusher
+        self._flusher = None
+        if self._spooler is not None:
+            # Its failures were already passed on to the records' futures
+            with suppress(Exception):
+                await self._spooler
+            self._spooler = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception(
+                "Failed to write %d queued records, leaving them in %s", len(self._records), self.spool_path
+            )
+        finally:
+            # Compacted so the next start only queues the records which were never written
+            async with self._flush_lock:
+                await self._compact_spool()
+            if self._spool is not None:
+                self._spool.close()
+                self._spool = None
+
+    def get_stats(self) -> WriteBehindStats:
+        return WriteBehindStats(
+            queue_depth=len(self._records),
+            written=self.written,
+            failed_flushes=self.failed_flushes,
+            dead_lettered=self.dead_lettered,
+            flush_latency=self.flush_latency,
+        )
+
+    async def _spool_in_background(self) -> None:
+        try:
+            await self._sync_spool()
+        except Exception:
+            logger.exception("Failed to sync %d records to %s", len(self._unspooled), self.spool_path)
+
+    async def _sync_spool(self) -> None:
+        # Records put while a sync runs wait for the lock and are synced together by the next pass
+        async with self._spool_lock:
+            while self._unspooled and self._spool is not None:
+                lines, self._unspooled = self._unspooled, []
+                waiters, self._unspooled_waiters = self._unspooled_waiters, []
+                try:
+                    await to_thread(_write_and_sync, self._spool, lines)
+                except BaseException as error:
+                    # The lines are synced again by the next sync, the records themselves are still queued
+                    self._unspooled[:0] = lines
+                    _set_exception(waiters, error)
+                    raise
+                _set_result(waiters)
+
+    async def _compact_spool(self) -> None:
+        # Called holding the flush lock, so every record put since the last sync is either still queued and rewritten
+        # with the rest or already written, records put while the rewrite runs are left to the next sync
+        async with self._spool_lock:
+            if self._spool is None:
+                return
+            lines = [f"{json.dumps(record)}\n" for record in self._records]
+            unspooled, self._unspooled = self._unspooled, []
+            waiters, self._unspooled_waiters = self._unspooled_waiters, []
+            try:
+                await to_thread(self._rewrite_spool, lines)
+            except BaseException as error:
+                self._unspooled[:0] = unspooled
+                _set_exception(waiters, error)
+                raise
+            self._spooled_written = 0
+            _set_result(waiters)
+
+    def _rewrite_spool(self, lines: list[str]) -> None:
+        # Runs on a worker thread. Written aside and swapped in, a crash while rewriting leaves the previous spool
+        rewritten_path = self.spool_path.with_name(f"{self.spool_path.name}.rewrite")
+        with rewritten_path.open("w", encoding="utf-8") as rewritten_spool:
+            _write_and_sync(rewritten_spool, lines)
+        if self._spool is not None:
+            self._spool.close()
+        os.replace(rewritten_path, self.spool_path)
+        self._spool = self.spool_path.open("a", encoding="utf-8")
+
+    def _get_flush_wait_ms(self) -> float:
+        if not self._consecutive_failures:
+            return self.flush_interval_ms
+        return min(self.flush_interval_ms * 2.0**self._consecutive_failures, MAX_RETRY_DELAY_MS)
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            if self._consecutive_failures:
+                # Backing off, a full batch waits as well so an outage doesn't use up attempts faster under load
+                await sleep(self.flush_interval_ms / 1000)
+            else:
+                with suppress(TimeoutError):
+                    await wait_for(self._batch_ready.wait(), self.flush_interval_ms / 1000)
+            self._batch_ready.clear()
+            try:
+                if monotonic() < self._retry_at:
+                    # Still backing off, the records put meanwhile are spooled without waiting for the retry
+                    await self._sync_spool()
+                else:
+                    await self.flush()
+            except Exception:
+                logger.exception(
+                    "Failed to write %d queued records, retrying in %.0f ms",
+                    len(self._records),
+                    self._get_flush_wait_ms(),
+                )
+
+
+def _write_and_sync(spool: TextIO, lines: list[str]) -> None:
+    spool.writelines(lines)
+    spool.flush()
+    os.fsync(spool.fileno())
+
+
+def _set_result(waiters: list[Future[None]]) -> None:
+    for waiter in waiters:
+        if not waiter.done():
+            waiter.set_result(None)
+
+
+def _set_exception(waiters: list[Future[None]], error: BaseException) -> None:
+    for waiter in waiters:
+        if not waiter.done():
+            if isinstance(error, CancelledError):
+                waiter.cancel()
+            else:
+                waiter.set_exception(error)
+
+
+def _append_lines(path: Path, lines: list[str]) -> None:
+    with path.open("a", encoding="utf-8") as file:
+        _write_and_sync(file, lines)
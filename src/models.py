@@ -3,6 +3,8 @@ from typing import TYPE_CHECKING
 
 from pydantic import ConfigDict
 from sqlalchemy import BigInteger
+from sqlalchemy import Index
+from sqlalchemy import text
 from sqlalchemy.orm import declared_attr
 from sqlmodel import Field
 from sqlmodel import Relationship
@@ -65,3 +67,6 @@ class UserResourceMixin(BaseModel):
 
 class Theme(CoreModelMixin, table=True):
     name: NonEmptyString
+
+    # Themes are looked up by name ignoring case, lower(name) = :name is served by this index rather than a scan
+    __table_args__ = (Index("ix_theme_lower_name", text("lower(name)")),)
@@ -1,8 +1,17 @@
 from src.quests import exceptions
 from src.quests.models import ExperienceTransaction
 from src.quests.models import Quest
+from src.quests.models import UserExperience
 from src.quests.models import UserQuest
 from src.quests.services import ExperienceTransactionService
 from src.quests.services import QuestService
 
-__all__ = ["Quest", "UserQuest", "ExperienceTransaction", "QuestService", "ExperienceTransactionService", "exceptions"]
+__all__ = [
+    "Quest",
+    "UserQuest",
+    "ExperienceTransaction",
+    "UserExperience",
+    "QuestService",
+    "ExperienceTransactionService",
+    "exceptions",
+]
@@ -1,6 +1,10 @@
 from datetime import UTC
 from datetime import datetime
+from uuid import UUID
 
+from sqlalchemy import BigInteger
+from sqlalchemy import Index
+from sqlalchemy import text
 from sqlmodel import Field
 from sqlmodel import Relationship
 
@@ -35,6 +39,10 @@ class Quest(CoreModelMixin, table=True):
     # Relationships
     users: list["UserQuest"] = Relationship(back_populates="quest")
 
+    # Quests are looked up by name ignoring case, lower(name) = :name is served by this index rather than a scan.
+    # Names are unique ignoring case, so imported quests can be upserted on it
+    __table_args__ = (Index("ix_quest_lower_name", text("lower(name)"), unique=True),)
+
 
 class UserQuest(CoreModelMixin, UserResourceMixin, table=True):
     class Meta:
@@ -48,6 +56,17 @@ class UserQuest(CoreModelMixin, UserResourceMixin, table=True):
     quest: Quest = Relationship(back_populates="users")
     user: User = Relationship(back_populates="quests")
 
+    # A user can only have one uncompleted UserQuest per quest
+    __table_args__ = (
+        Index(
+            "ix_user_quest_active_user_id_quest_id",
+            "user_id",
+            "quest_id",
+            unique=True,
+            postgresql_where=text("date_completed IS NULL"),
+        ),
+    )
+
     @property
     def completed(self) -> bool:
         return self.date_completed is not None
@@ -67,6 +86,12 @@ class ExperienceTransaction(CoreModelMixin, UserResourceMixin, table=True):
         ID for user who earned this experience
     quest_id: int
         ID for quest that the user earned this experience from
+    experience: int
+        The quest's experience at the time it was completed
+    server_id: int | None
+        The discord server the quest was completed in, None if completed outside a server
+    write_key: UUID | None
+        Identifies experience written behind, so a record written twice is only recorded once
     user: User
     quest: Quest
     """
@@ -74,10 +99,29 @@ class ExperienceTransaction(CoreModelMixin, UserResourceMixin, table=True):
     # Columns
     quest_id: int = Field(foreign_key="quest.id", repr=False)
     experience: int = Field()
+    server_id: int | None = Field(default=None, sa_type=BigInteger)
+    write_key: UUID | None = Field(default=None, unique=True, repr=False)
 
     # Relationship
     quest: Quest = Relationship()
     user: User = Relationship(back_populates="experience")
 
-    def __post_init__(self) -> None:
-        self.experience = self.quest.experience
+
+class UserExperience(CoreModelMixin, UserResourceMixin, table=True):
+    """
+    The total experience a user has earned in a discord server, kept in step with the ExperienceTransaction ledger.
+
+    Attributes
+    ----------
+    user_id: int
+    server_id: int
+        The discord server the experience was earned in, NO_SERVER_ID for experience earned outside a server
+    experience: int
+        The sum of the user's ExperienceTransactions in the server
+    """
+
+    # Columns
+    server_id: int = Field(sa_type=BigInteger)
+    experience: int = Field(default=0)
+
+    __table_args__ = (Index("ix_user_experience_user_id_server_id", "user_id", "server_id", unique=True),)
@@ -1,26 +1,356 @@
-from collections.abc import Coroutine
+from collections.abc import AsyncIterator
 from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime
+from functools import partial
+from logging import getLogger
+from typing import Final
 from typing import cast
+from uuid import UUID
+from uuid import uuid4
 
-from sqlalchemy.orm import QueryableAttribute
-from sqlalchemy.orm import selectinload
+from sqlalchemy import BigInteger
+from sqlalchemy import DateTime
+from sqlalchemy import Integer
+from sqlalchemy import Uuid
+from sqlalchemy import and_
+from sqlalchemy import bindparam
+from sqlalchemy import delete
+from sqlalchemy import exists
+from sqlalchemy import func
+from sqlalchemy import insert
+from sqlalchemy import literal_column
+from sqlalchemy import or_
+from sqlalchemy import true
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import aliased
+from sqlmodel import col
+from sqlmodel import select
 
 from src.constants import GOOD_LUCK_ADVENTURER
+from src.constants import NO_SERVER_ID
+from src.helpers.caching import LRUCache
+from src.helpers.constants import DISCORD_MESSAGE_LIMIT
+from src.helpers.constants import NO_AVAILABLE_QUESTS
+from src.helpers.message_helpers import format_quest_board_lines
+from src.helpers.message_helpers import get_board_line_length
+from src.helpers.message_helpers import paginate_quest_board_lines
+from src.helpers.prefix_index import PrefixIndex
+from src.helpers.ranking import Ranking
 from src.helpers.sqlalchemy_helpers import QueryArgs
-from src.helpers.sqlalchemy_helpers import case_insensitive_str_compare
+from src.helpers.write_behind import WriteBehindQueue
+from src.helpers.write_behind import WriteBehindRecord
 from src.models import User
 from src.quests import ExperienceTransaction
 from src.quests import Quest
+from src.quests.exceptions import BaseQuestException
 from src.quests.exceptions import MaxQuestCompletionReached
 from src.quests.exceptions import QuestAlreadyAccepted
 from src.quests.exceptions import QuestDNE
 from src.quests.exceptions import QuestNotAccepted
+from src.quests.models import UserExperience
 from src.quests.models import UserQuest
 from src.repositories import AsyncRepository
 from src.services import MultiRepoService
-from src.services import SingleRepoService
+from src.typeshed import BaseModelType
+from src.typeshed import EntitiesType
+from src.typeshed import RepositoryFactory
 from src.typeshed import RepositoryHandler
 
+logger = getLogger(__name__)
+
+_QUEST_NAME_KEY: Final = func.lower(col(Quest.name))
+_QUEST_NAME_FILTER: Final = bindparam("quest_name") == _QUEST_NAME_KEY
+_QUEST_BOARD_SIZES: Final[list[EntitiesType]] = [
+    func.max(func.length(col(Quest.name))).label("max_name_length"),
+    func.min(col(Quest.experience)).label("min_experience"),
+    func.max(col(Quest.experience)).label("max_experience"),
+]
+
+# Completing a quest is one statement: find the quest, the user's active UserQuest for it and their completion count,
+# then mark the active UserQuest complete if the quest's completion cap allows it. The user's id is bound as
+# quest_user_id, a parameter named user_id would be taken as the UPDATE's value for user_quest.user_id
+_MATCHED_QUEST: Final = select(Quest).where(_QUEST_NAME_FILTER).order_by(col(Quest.id)).limit(1).cte("matched_quest")
+_ACTIVE_USER_QUEST: Final = (
+    select(UserQuest.id)
+    .join(_MATCHED_QUEST, col(UserQuest.quest_id) == _MATCHED_QUEST.c.id)
+    .where(col(UserQuest.user_id) == bindparam("quest_user_id"), col(UserQuest.date_completed).is_(None))
+    .order_by(col(UserQuest.id))
+    .limit(1)
+    .cte("active_user_quest")
+)
+# Only completions up to the quest's cap are counted, so the count stops early for users with a long quest history
+_CAPPED_COMPLETIONS: Final = (
+    select(UserQuest.id)
+    .join(_MATCHED_QUEST, col(UserQuest.quest_id) == _MATCHED_QUEST.c.id)
+    .where(col(UserQuest.user_id) == bindparam("quest_user_id"), col(UserQuest.date_completed).is_not(None))
+    .limit(select(func.coalesce(_MATCHED_QUEST.c.max_completion_count, 0)).scalar_subquery())
+    .subquery("capped_completions")
+)
+_COMPLETED_COUNT: Final = (
+    select(func.count().label("completed_count")).select_from(_CAPPED_COMPLETIONS).cte("completed_count")
+)
+_COMPLETED_USER_QUEST: Final = (
+    update(UserQuest)
+    .where(
+        col(UserQuest.id) == _ACTIVE_USER_QUEST.c.id,
+        col(UserQuest.quest_id) == _MATCHED_QUEST.c.id,
+        # Rechecked once the row is locked, so concurrent completions of the same UserQuest cannot both succeed
+        col(UserQuest.date_completed).is_(None),
+        or_(
+            func.coalesce(_MATCHED_QUEST.c.max_completion_count, 0) == 0,
+            select(_COMPLETED_COUNT.c.completed_count).scalar_subquery() < _MATCHED_QUEST.c.max_completion_count,
+        ),
+    )
+    .values(date_completed=func.timezone("UTC", func.now()))
+    .returning(col(UserQuest.id))
+    .cte("completed_user_quest")
+)
+_MATCHED_QUEST_ENTITY: Final = aliased(Quest, _MATCHED_QUEST)
+_COMPLETE_QUEST_STATEMENT: Final = (
+    select(
+        _MATCHED_QUEST_ENTITY,
+        _ACTIVE_USER_QUEST.c.id.label("active_user_quest_id"),
+        _COMPLETED_COUNT.c.completed_count,
+        _COMPLETED_USER_QUEST.c.id.label("completed_user_quest_id"),
+    )
+    .select_from(_MATCHED_QUEST_ENTITY)
+    .outerjoin(_ACTIVE_USER_QUEST, true())
+    .join(_COMPLETED_COUNT, true())
+    .outerjoin(_COMPLETED_USER_QUEST, true())
+)
+
+# Accepting a quest is one statement as well: insert a UserQuest for the matched quest unless the user already has an
+# uncompleted one, which the partial unique index on user_quest turns into a conflict instead of a duplicate
+_ACCEPTED_USER_QUEST: Final = (
+    pg_insert(UserQuest)
+    .from_select(
+        ["datetime_created", "datetime_edited", "user_id", "quest_id"],
+        select(
+            bindparam("accepted_at", type_=DateTime),
+            bindparam("accepted_at", type_=DateTime),
+            bindparam("quest_user_id"),
+            _MATCHED_QUEST.c.id,
+        ),
+    )
+    .on_conflict_do_nothing(
+        index_elements=[col(UserQuest.user_id), col(UserQuest.quest_id)],
+        index_where=col(UserQuest.date_completed).is_(None),
+    )
+    .returning(col(UserQuest.id))
+    .cte("accepted_user_quest")
+)
+_ACCEPT_QUEST_STATEMENT: Final = (
+    select(_MATCHED_QUEST_ENTITY, _ACCEPTED_USER_QUEST.c.id.label("accepted_user_quest_id"))
+    .select_from(_MATCHED_QUEST_ENTITY)
+    .outerjoin(_ACCEPTED_USER_QUEST, true())
+)
+
+# Earning experience records it in the ledger and adds it to the user's total for the server in the same statement
+_EARNED_TRANSACTION: Final = (
+    insert(ExperienceTransaction)
+    .values(
+        datetime_created=bindparam("earned_at"),
+        datetime_edited=bindparam("earned_at"),
+        user_id=bindparam("earning_user_id"),
+        quest_id=bindparam("earned_quest_id"),
+        experience=bindparam("earned_experience"),
+        server_id=bindparam("earned_server_id"),
+    )
+    .returning(ExperienceTransaction)
+    .cte("earned_transaction")
+)
+_EXPERIENCE_TOTAL_INSERT: Final = pg_insert(UserExperience).from_select(
+    ["datetime_created", "datetime_edited", "user_id", "server_id", "experience"],
+    _EARNED_TRANSACTION.select().with_only_columns(
+        _EARNED_TRANSACTION.c.datetime_created,
+        _EARNED_TRANSACTION.c.datetime_edited,
+        _EARNED_TRANSACTION.c.user_id,
+        func.coalesce(_EARNED_TRANSACTION.c.server_id, NO_SERVER_ID),
+        _EARNED_TRANSACTION.c.experience,
+    ),
+)
+_EXPERIENCE_TOTAL: Final = (
+    _EXPERIENCE_TOTAL_INSERT.on_conflict_do_update(
+        index_elements=[col(UserExperience.user_id), col(UserExperience.server_id)],
+        set_={
+            "experience": col(UserExperience.experience) + _EXPERIENCE_TOTAL_INSERT.excluded.experience,
+            "datetime_edited": _EXPERIENCE_TOTAL_INSERT.excluded.datetime_edited,
+        },
+    )
+    .returning(col(UserExperience.experience))
+    .cte("experience_total")
+)
+_EARNED_TRANSACTION_ENTITY: Final = aliased(ExperienceTransaction, _EARNED_TRANSACTION)
+_EARN_XP_STATEMENT: Final = (
+    select(_EARNED_TRANSACTION_ENTITY, _EXPERIENCE_TOTAL.c.experience.label("total_experience"))
+    .select_from(_EARNED_TRANSACTION_ENTITY)
+    .join(_EXPERIENCE_TOTAL, true())
+)
+
+# Experience queued in write behind mode is written a batch at a time, the batch is bound as one array per column and
+# unnested into rows. A record written again, such as after a crash, conflicts on its write key and is skipped, so
+# totals are summed from the transactions actually inserted, per user and server as an upsert can't update a row twice
+_QUEUED_XP: Final = (
+    func.unnest(
+        bindparam("queued_earned_ats", type_=ARRAY(DateTime)),
+        bindparam("queued_user_ids", type_=ARRAY(Integer)),
+        bindparam("queued_quest_ids", type_=ARRAY(Integer)),
+        bindparam("queued_experiences", type_=ARRAY(Integer)),
+        bindparam("queued_server_ids", type_=ARRAY(BigInteger)),
+        bindparam("queued_write_keys", type_=ARRAY(Uuid)),
+    )
+    .table_valued("earned_at", "user_id", "quest_id", "experience", "server_id", "write_key")
+    .render_derived(name="queued_xp")
+)
+_QUEUED_TRANSACTIONS: Final = (
+    pg_insert(ExperienceTransaction)
+    .from_select(
+        ["datetime_created", "datetime_edited", "user_id", "quest_id", "experience", "server_id", "write_key"],
+        _QUEUED_XP.select().with_only_columns(
+            _QUEUED_XP.c.earned_at,
+            _QUEUED_XP.c.earned_at,
+            _QUEUED_XP.c.user_id,
+            _QUEUED_XP.c.quest_id,
+            _QUEUED_XP.c.experience,
+            _QUEUED_XP.c.server_id,
+            _QUEUED_XP.c.write_key,
+        ),
+    )
+    .on_conflict_do_nothing(index_elements=[col(ExperienceTransaction.write_key)])
+    .returning(
+        col(ExperienceTransaction.datetime_created),
+        col(ExperienceTransaction.user_id),
+        col(ExperienceTransaction.experience),
+        col(ExperienceTransaction.server_id),
+    )
+    .cte("queued_transactions")
+)
+_QUEUED_SERVER_ID: Final = func.coalesce(_QUEUED_TRANSACTIONS.c.server_id, literal_column(str(NO_SERVER_ID)))
+_QUEUED_TOTALS_INSERT: Final = pg_insert(UserExperience).from_select(
+    ["datetime_created", "datetime_edited", "user_id", "server_id", "experience"],
+    _QUEUED_TRANSACTIONS.select()
+    .with_only_columns(
+        func.min(_QUEUED_TRANSACTIONS.c.datetime_created),
+        func.max(_QUEUED_TRANSACTIONS.c.datetime_created),
+        _QUEUED_TRANSACTIONS.c.user_id,
+        _QUEUED_SERVER_ID,
+        func.sum(_QUEUED_TRANSACTIONS.c.experience),
+    )
+    .group_by(_QUEUED_TRANSACTIONS.c.user_id, _QUEUED_SERVER_ID),
+)
+_QUEUED_TOTALS: Final = (
+    _QUEUED_TOTALS_INSERT.on_conflict_do_update(
+        index_elements=[col(UserExperience.user_id), col(UserExperience.server_id)],
+        set_={
+            "experience": col(UserExperience.experience) + _QUEUED_TOTALS_INSERT.excluded.experience,
+            "datetime_edited": _QUEUED_TOTALS_INSERT.excluded.datetime_edited,
+        },
+    )
+    .returning(col(UserExperience.id))
+    .cte("queued_totals")
+)
+_WRITE_QUEUED_XP_STATEMENT: Final = select(
+    select(func.count()).select_from(_QUEUED_TRANSACTIONS).scalar_subquery(),
+    select(func.count()).select_from(_QUEUED_TOTALS).scalar_subquery(),
+)
+
+# Rebuilding the totals from the ledger rewrites the totals which differ from it and removes those with no ledger rows
+# Rendered inline, postgres only matches the grouped expression to the selected one if both are identical
+_LEDGER_SERVER_ID: Final = func.coalesce(col(ExperienceTransaction.server_id), literal_column(str(NO_SERVER_ID)))
+_LEDGER_TOTALS: Final = (
+    select(
+        col(ExperienceTransaction.user_id),
+        _LEDGER_SERVER_ID.label("server_id"),
+        func.sum(col(ExperienceTransaction.experience)).label("experience"),
+    )
+    .group_by(col(ExperienceTransaction.user_id), _LEDGER_SERVER_ID)
+    .cte("ledger_totals")
+)
+_REMOVED_TOTALS: Final = (
+    delete(UserExperience)
+    .where(
+        ~exists().where(
+            _LEDGER_TOTALS.c.user_id == col(UserExperience.user_id),
+            _LEDGER_TOTALS.c.server_id == col(UserExperience.server_id),
+        )
+    )
+    .returning(col(UserExperience.id))
+    .cte("removed_totals")
+)
+_REBUILT_TOTALS_INSERT: Final = pg_insert(UserExperience).from_select(
+    ["datetime_created", "datetime_edited", "user_id", "server_id", "experience"],
+    _LEDGER_TOTALS.select().with_only_columns(
+        bindparam("rebuilt_at", type_=DateTime),
+        bindparam("rebuilt_at", type_=DateTime),
+        _LEDGER_TOTALS.c.user_id,
+        _LEDGER_TOTALS.c.server_id,
+        _LEDGER_TOTALS.c.experience,
+    ),
+)
+_REBUILT_TOTALS: Final = (
+    _REBUILT_TOTALS_INSERT.on_conflict_do_update(
+        index_elements=[col(UserExperience.user_id), col(UserExperience.server_id)],
+        set_={
+            "experience": _REBUILT_TOTALS_INSERT.excluded.experience,
+            "datetime_edited": _REBUILT_TOTALS_INSERT.excluded.datetime_edited,
+        },
+        where=col(UserExperience.experience) != _REBUILT_TOTALS_INSERT.excluded.experience,
+    )
+    .returning(col(UserExperience.id))
+    .cte("rebuilt_totals")
+)
+_REBUILD_TOTALS_STATEMENT: Final = select(
+    select(func.count()).select_from(_REBUILT_TOTALS).scalar_subquery(),
+    select(func.count()).select_from(_REMOVED_TOTALS).scalar_subquery(),
+)
+
+_RANKING_FILTER: Final = and_(
+    col(UserExperience.user_id) == col(User.id), col(UserExperience.server_id) == bindparam("ranking_server_id")
+)
+
+
+@dataclass(frozen=True)
+class QuestCompletionResult:
+    """
+    The outcome of a user attempting to complete a quest.
+
+    Attributes
+    ----------
+    quest_name: str
+    quest: Quest | None
+        The quest matching quest_name, None if no quest matched
+    accepted: bool
+        Whether the user had an active, uncompleted, UserQuest for the quest
+    max_completion_reached: bool
+        Whether the user had already completed the quest as many times as it allows
+    completed_user_quest_id: int | None
+        The id of the UserQuest marked complete, None if the quest was not completed
+    """
+
+    quest_name: str
+    quest: Quest | None = None
+    accepted: bool = False
+    max_completion_reached: bool = False
+    completed_user_quest_id: int | None = None
+
+    @property
+    def completed(self) -> bool:
+        return self.completed_user_quest_id is not None
+
+    @property
+    def error(self) -> QuestDNE | BaseQuestException | None:
+        if self.quest is None:
+            return QuestDNE(self.quest_name)
+        if self.completed:
+            return None
+        if self.accepted and self.max_completion_reached:
+            return MaxQuestCompletionReached(self.quest)
+        # Also the outcome when a concurrent command completed the active UserQuest first
+        return QuestNotAccepted(self.quest)
+
 
 class QuestRepositoryHandler(RepositoryHandler):
     quest: AsyncRepository[Quest]
@@ -28,19 +358,38 @@ class QuestRepositoryHandler(RepositoryHandler):
 
 
 class QuestService(MultiRepoService):
+    """
+    Service for quests and the users taking part in them.
+
+    When given a board cache, the rendered pages of the quest board are cached by page length until quests are
+    written through this service, or until the cache's ttl passes for quests changed elsewhere. A quest name index is
+    kept the same way, rebuilt on the next search once it is cleared or expires.
+    """
+
     _repositories: QuestRepositoryHandler
+    _board_cache: LRUCache[int, Sequence[str]] | None
+    _name_index: PrefixIndex | None
 
-    def _get_quest_by_name(self, quest_name: str) -> Coroutine[None, None, Quest | None]:
-        return self._repositories.quest.get_first(
-            QueryArgs(
-                filter_list=[case_insensitive_str_compare(Quest.name, quest_name)],
-                eager_options=[selectinload(cast(QueryableAttribute, Quest.users))],
-            )
-        )
+    def __init__(
+        self,
+        repository_factory: RepositoryFactory,
+        *,
+        board_cache: LRUCache[int, Sequence[str]] | None = None,
+        name_index: PrefixIndex | None = None,
+        read_from_primary: bool = False,
+        **models: type[BaseModelType],
+    ) -> None:
+        super().__init__(repository_factory, read_from_primary=read_from_primary, **models)
+        self._board_cache = board_cache
+        self._name_index = name_index
 
-    @staticmethod
-    def _get_uncompleted_query_count_args(quest: Quest, user: User) -> QueryArgs:
-        return QueryArgs(filter_dict={"user": user, "quest": quest, "completed": False})
+    def _after_write(self, model: type[BaseModelType]) -> None:
+        if model is not Quest:
+            return
+        if self._board_cache is not None:
+            self._board_cache.clear()
+        if self._name_index is not None:
+            self._name_index.clear()
 
     async def accept_quest_if_available(self, user: User, quest_name: str) -> str:
         """
@@ -61,17 +410,44 @@ class QuestService(MultiRepoService):
         QuestDNE: If no quest is found with the provided name
         QuestAlreadyAccepted: If the provided user has already accepted this quest
         """
-        quest = await self._get_quest_by_name(quest_name)
-        if not quest:
+        rows = await self._repositories.user_quest.execute(
+            _ACCEPT_QUEST_STATEMENT,
+            {"quest_name": quest_name.lower(), "quest_user_id": user.id, "accepted_at": datetime.now()},
+        )
+        if not rows:
             raise QuestDNE(quest_name)
-
-        if await self._repositories.user_quest.get_count(self._get_uncompleted_query_count_args(quest, user)) >= 1:
+        quest, accepted_user_quest_id = rows[0]
+        if accepted_user_quest_id is None:
             raise QuestAlreadyAccepted(quest)
-
-        user_quest = UserQuest(user=user, quest=quest)
-        await self._repositories.user_quest.add(user_quest)
         return GOOD_LUCK_ADVENTURER.format(quest_name)
 
+    async def complete_quest(self, user: User, quest_name: str) -> QuestCompletionResult:
+        """
+        Attempt to complete a quest for a user in a single round trip.
+
+        Parameters
+        ----------
+        user: User
+        quest_name: str
+
+        Returns
+        -------
+        QuestCompletionResult: Whether the quest was completed, and if not its error explains why
+        """
+        rows = await self._repositories.user_quest.execute(
+            _COMPLETE_QUEST_STATEMENT, {"quest_name": quest_name.lower(), "quest_user_id": user.id}
+        )
+        if not rows:
+            return QuestCompletionResult(quest_name)
+        quest, active_user_quest_id, completed_count, completed_user_quest_id = rows[0]
+        return QuestCompletionResult(
+            quest_name,
+            quest=quest,
+            accepted=active_user_quest_id is not None,
+            max_completion_reached=bool(quest.max_completion_count) and completed_count >= quest.max_completion_count,
+            completed_user_quest_id=completed_user_quest_id,
+        )
+
     async def complete_quest_if_available(self, user: User, quest_name: str) -> Quest:
         """
         Attempt to retrieve a quest for a quest and check that a user can complete it.
@@ -89,39 +465,245 @@ class QuestService(MultiRepoService):
         ------
         QuestDNE: If no quest is found with the provided name
         QuestNotAccepted: If the user has not accepted the provided quest
+        MaxQuestCompletionReached: If the user has completed the quest as many times as it allows
         """
-        quest = await self._get_quest_by_name(quest_name)
-        if not quest:
-            raise QuestDNE(quest_name)
+        result = await self.complete_quest(user, quest_name)
+        if (error := result.error) is not None:
+            raise error
+        return cast(Quest, result.quest)
 
-        active_user_quest = await self._repositories.user_quest.get_first(
-            self._get_uncompleted_query_count_args(quest, user)
+    async def get_quest_board_pages(self, page_length: int = DISCORD_MESSAGE_LIMIT) -> Sequence[str]:
+        """Get the quest board split into pages of at most page_length characters, see paginate_quest_board_lines."""
+        if self._board_cache is not None and (pages := self._board_cache.get(page_length)) is not None:
+            return pages
+        pages = await self._render_quest_board(page_length)
+        if self._board_cache is not None:
+            self._board_cache.set(page_length, pages)
+        return pages
+
+    async def _render_quest_board(self, page_length: int) -> list[str]:
+        # Quests are read a keyset page at a time and only their lines are kept, the aggregates size the columns
+        # without holding every quest first
+        rows = await self._repositories.quest.get_all_with_entities(_QUEST_BOARD_SIZES)
+        max_name_length, min_experience, max_experience = rows[0]
+        if max_name_length is None:
+            return [NO_AVAILABLE_QUESTS]
+        line_length = get_board_line_length(
+            max_name_length, max(len(str(min_experience)), len(str(max_experience))), page_length
         )
+        quest_lines: list[str] = []
+        async for quests in self._repositories.quest.iter_pages():
+            quest_lines.extend(format_quest_board_lines(quests, line_length))
+        return paginate_quest_board_lines(quest_lines, line_length, page_length)
 
-        if not active_user_quest:
-            raise QuestNotAccepted(quest)
+    async def search_quest_names(self, prefix: str, limit: int) -> list[str]:
+        """
+        Get up to limit quest names starting with prefix, ignoring case.
 
-        completed_quests_args = QueryArgs(filter_dict={"quest": quest, "user": user, "completed": True})
+        Searches are served from the name index, the database is only read when it has to be rebuilt.
+        """
+        name_index = self._name_index if self._name_index is not None else PrefixIndex()
+        if not name_index.is_fresh:
+            quest_names = await self._repositories.quest.get_all_with_entities([col(Quest.name)])
+            name_index.build(cast(Sequence[str], quest_names))
+        return name_index.search(prefix, limit)
 
-        if (
-            quest.max_completion_count
-            and await self._repositories.user_quest.get_count(completed_quests_args) >= quest.max_completion_count
-        ):
-            raise MaxQuestCompletionReached(quest)
+    def stream_all_quests(self) -> AsyncIterator[Quest]:
+        return self._repositories.quest.stream()
 
-        active_user_quest.mark_complete()
-        await self._repositories.quest.session.commit()
+    async def upsert_quests(self, quests: Sequence[Quest]) -> Sequence[Quest]:
+        """
+        Insert quests, updating the existing quest with the same name ignoring case instead of adding another.
 
-        return quest
+        When quests share a name only the last of them is written, a single upsert can't update the same quest twice.
+        """
+        quests_by_name = {quest.name.lower(): quest for quest in quests}
+        return await self.upsert(
+            list(quests_by_name.values()),
+            [_QUEST_NAME_KEY],
+            update_fields=["name", "experience", "max_completion_count", "datetime_edited"],
+        )
+
+
+class ExperienceRepositoryHandler(RepositoryHandler):
+    experience_transaction: AsyncRepository[ExperienceTransaction]
+    user_experience: AsyncRepository[UserExperience]
+
+
+class ExperienceTransactionService(MultiRepoService):
+    """
+    Service for earning experience and reading the totals it adds up to.
 
-    async def get_all_quests(self) -> Sequence[Quest]:
-        return await self._repositories.quest.get_all()
+    When given a rankings cache, each server's leaderboard is loaded from the UserExperience totals on first use and
+    kept in step as experience is earned, once the unit of work earning it commits. Cached rankings are reloaded once
+    the cache's ttl passes, picking up totals changed elsewhere, such as by a rebuild.
+
+    When given a write behind queue, earned experience is queued instead of written and the queue writes it in batches
+    through write_queued_xp. Experience is queued, and cached rankings kept in step, once the unit of work earning it
+    commits, and the unit of work waits for it to be synced to the queue's spool before it exits, so a reply sent after
+    it never acknowledges experience a crash could lose. Totals read from the database trail the queue until it
+    flushes.
+    """
+
+    _repositories: ExperienceRepositoryHandler
+    _rankings: LRUCache[int, Ranking] | None
+    _write_behind: WriteBehindQueue | None
+
+    def __init__(
+        self,
+        repository_factory: RepositoryFactory,
+        *,
+        rankings: LRUCache[int, Ranking] | None = None,
+        write_behind: WriteBehindQueue | None = None,
+        read_from_primary: bool = False,
+        **models: type[BaseModelType],
+    ) -> None:
+        super().__init__(repository_factory, read_from_primary=read_from_primary, **models)
+        self._rankings = rankings
+        self._write_behind = write_behind
+
+    async def earn_xp_for_quest(self, user: User, quest: Quest, server_id: int | None = None) -> ExperienceTransaction:
+        """
+        Record the experience a user earned for a quest and add it to their total for the server, in one statement.
 
+        Parameters
+        ----------
+        user: User
+        quest: Quest
+        server_id: int | None
+            The discord server the quest was completed in, None if completed outside a server
 
-class ExperienceTransactionService(SingleRepoService):
-    _repository: AsyncRepository[ExperienceTransaction]
+        Returns
+        -------
+        ExperienceTransaction: The recorded transaction, unsaved when it was queued to be written behind
+        """
+        if self._write_behind is not None:
+            return await self._queue_xp_for_quest(self._write_behind, user, quest, server_id)
+        repository = self._repositories.experience_transaction
+        rows = await repository.execute(
+            _EARN_XP_STATEMENT,
+            {
+                "earned_at": datetime.now(),
+                "earning_user_id": user.id,
+                "earned_quest_id": quest.id,
+                "earned_experience": quest.experience,
+                "earned_server_id": server_id,
+            },
+        )
+        xp_transaction, total_experience = rows[0]
+        repository.after_commit(
+            partial(self._set_ranked_score, server_id or NO_SERVER_ID, user.discord_id, total_experience)
+        )
+        return cast(ExperienceTransaction, xp_transaction)
 
-    async def earn_xp_for_quest(self, user: User, quest: Quest) -> ExperienceTransaction:
-        xp_transaction = ExperienceTransaction(user=user, quest=quest)
-        await self._repository.add(xp_transaction)
+    async def _queue_xp_for_quest(
+        self, write_behind: WriteBehindQueue, user: User, quest: Quest, server_id: int | None
+    ) -> ExperienceTransaction:
+        # Checked here, a record without them would only fail once its batch is written
+        if user.id is None or quest.id is None:
+            raise ValueError("Experience can only be queued for a saved user and quest.")
+        earned_at = datetime.now()
+        # The write key lets write_queued_xp skip a record which was already written, e.g. before a crash
+        xp_transaction = ExperienceTransaction(
+            datetime_created=earned_at,
+            datetime_edited=earned_at,
+            user_id=user.id,
+            quest_id=quest.id,
+            experience=quest.experience,
+            server_id=server_id,
+            write_key=uuid4(),
+        )
+        # Queued once the unit of work commits, experience for a quest completion which rolled back is never written
+        await self._repositories.experience_transaction.await_after_commit(
+            partial(self._put_queued_xp, write_behind, xp_transaction, user.discord_id)
+        )
         return xp_transaction
+
+    async def _put_queued_xp(
+        self, write_behind: WriteBehindQueue, xp_transaction: ExperienceTransaction, discord_id: int
+    ) -> None:
+        spooled = write_behind.put(
+            {
+                "earned_at": xp_transaction.datetime_created.isoformat(),
+                "user_id": xp_transaction.user_id,
+                "quest_id": xp_transaction.quest_id,
+                "experience": xp_transaction.experience,
+                "server_id": xp_transaction.server_id,
+                "write_key": str(xp_transaction.write_key),
+            }
+        )
+        server_id = xp_transaction.server_id or NO_SERVER_ID
+        if self._rankings is not None and (ranking := self._rankings.get(server_id)) is not None:
+            ranking.set_score(discord_id, (ranking.get_score(discord_id) or 0) + xp_transaction.experience)
+        try:
+            await spooled
+        except Exception:
+            # Still queued, so it is written by the next flush unless the bot crashes first
+            logger.exception("Failed to spool experience for user %d", discord_id)
+
+    def _set_ranked_score(self, server_id: int, discord_id: int, total_experience: int) -> None:
+        if self._rankings is not None and (ranking := self._rankings.get(server_id)) is not None:
+            ranking.set_score(discord_id, total_experience)
+
+    async def write_queued_xp(self, records: list[WriteBehindRecord]) -> None:
+        """
+        Write a batch of experience queued by earn_xp_for_quest to the ledger and the totals, in one statement.
+
+        Records already in the ledger are skipped by their write key, so a batch can safely be written again. The
+        session is rolled back if the batch fails, leaving it usable for the next batch.
+        """
+        repository = self._repositories.experience_transaction
+        try:
+            await repository.execute(
+                _WRITE_QUEUED_XP_STATEMENT,
+                {
+                    "queued_earned_ats": [datetime.fromisoformat(record["earned_at"]) for record in records],
+                    "queued_user_ids": [record["user_id"] for record in records],
+                    "queued_quest_ids": [record["quest_id"] for record in records],
+                    "queued_experiences": [record["experience"] for record in records],
+                    "queued_server_ids": [record["server_id"] for record in records],
+                    "queued_write_keys": [UUID(record["write_key"]) for record in records],
+                },
+            )
+        except Exception:
+            await repository.rollback()
+            raise
+
+    async def get_experience(self, user: User, server_id: int | None) -> int:
+        """Get a user's total experience in a server from its UserExperience, without summing the ledger."""
+        user_experience = await self._repositories.user_experience.get_first(
+            QueryArgs(filter_dict={"user_id": user.id, "server_id": server_id or NO_SERVER_ID})
+        )
+        return user_experience.experience if user_experience else 0
+
+    async def get_ranking(self, server_id: int) -> Ranking:
+        """Get the ranking of users by their total experience in a server, keyed by discord id."""
+        if self._rankings is not None and (ranking := self._rankings.get(server_id)) is not None:
+            return ranking
+        rows = await self._repositories.user_experience.get_all_with_entities(
+            [col(User.discord_id), col(UserExperience.experience)],
+            QueryArgs(filter_list=[_RANKING_FILTER], params={"ranking_server_id": server_id}),
+        )
+        ranking = Ranking((discord_id, experience) for discord_id, experience in rows)
+        if self._rankings is not None:
+            self._rankings.set(server_id, ranking)
+        return ranking
+
+    async def rebuild_experience_totals(self) -> int:
+        """
+        Recompute every UserExperience from the ExperienceTransaction ledger in a single statement.
+
+        Experience earned while the rebuild runs may be overwritten by the rebuilt total, so run it when the bot is
+        quiet. Cached rankings are dropped so they are reloaded from the rebuilt totals.
+
+        Returns
+        -------
+        int: The number of totals which did not match the ledger and were rewritten or removed
+        """
+        rows = await self._repositories.user_experience.execute(
+            _REBUILD_TOTALS_STATEMENT, {"rebuilt_at": datetime.now()}
+        )
+        if self._rankings is not None:
+            self._rankings.clear()
+        rebuilt_count, removed_count = rows[0]
+        return cast(int, rebuilt_count + removed_count)
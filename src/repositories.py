@@ -1,29 +1,85 @@
 from abc import ABC
+from collections.abc import AsyncIterator
+from collections.abc import Awaitable
 from collections.abc import Callable
 from collections.abc import Sequence
 from dataclasses import dataclass
 from dataclasses import field
 from dataclasses import replace
+from functools import partial
+from inspect import isawaitable
+from types import TracebackType
+from typing import Any
+from typing import Final
 from typing import cast
 
 from sqlalchemy import ColumnElement
+from sqlalchemy import Row
 from sqlalchemy import ScalarResult
+from sqlalchemy import Table
 from sqlalchemy import func
+from sqlalchemy import insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.sql.dml import ReturningInsert
 from sqlmodel import Session
+from sqlmodel import SQLModel
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel.sql.expression import Select
+from sqlmodel.sql.expression import SelectOfScalar
 
 from src.helpers.sqlalchemy_helpers import QueryArgs
+from src.helpers.sqlalchemy_helpers import StatementCache
 from src.typeshed import BaseModelType
 from src.typeshed import EntitiesType
 
+UPSERT_IGNORED_FIELDS: Final = frozenset({"id", "datetime_created"})
+UNIT_OF_WORK_DEPTH_KEY: Final = "unit_of_work_depth"
+AFTER_COMMIT_KEY: Final = "after_commit"
+DEFAULT_BATCH_SIZE: Final = 500
+
+
+def _to_rows(objs: Sequence[SQLModel]) -> list[dict[str, Any]]:
+    if not objs:
+        return []
+    # Postgres rejects any value for a generated column, even NULL, so they are left to their generation expression
+    table = cast(Table, getattr(type(objs[0]), "__table__"))
+    generated_fields = {column.key for column in table.columns if column.computed is not None}
+    rows = [obj.model_dump(exclude=generated_fields) for obj in objs]
+    for row in rows:
+        if row.get("id") is None:
+            row.pop("id", None)
+    return rows
+
+
+def _upsert_statement(
+    model: type[BaseModelType],
+    objs: Sequence[BaseModelType],
+    index_elements: Sequence[str | ColumnElement],
+    update_fields: Sequence[str] | None,
+    index_where: ColumnElement[bool] | None,
+) -> ReturningInsert[tuple[BaseModelType]]:
+    rows = _to_rows(objs)
+    statement = pg_insert(model).values(rows)
+    if update_fields is None:
+        update_fields = [key for key in rows[0] if key not in UPSERT_IGNORED_FIELDS.union(index_elements)]
+    if update_fields:
+        statement = statement.on_conflict_do_update(
+            index_elements=index_elements,
+            index_where=index_where,
+            set_={update_field: statement.excluded[update_field] for update_field in update_fields},
+        )
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=index_elements, index_where=index_where)
+    return statement.returning(model)
+
 
 @dataclass
 class BaseRepository[SessionType, BaseModelType](ABC):
     session_factory: Callable[..., SessionType]
     model: type[BaseModelType]
     _session: SessionType | None
+    statement_cache: StatementCache | None
 
     @property
     def session(self) -> SessionType:
@@ -32,35 +88,135 @@ class BaseRepository[SessionType, BaseModelType](ABC):
         return self._session
 
     def _query(self, query_args: QueryArgs | None, to_select: list[EntitiesType] | None = None) -> Select:
-        query_handlers = query_args.get_query_handlers() if query_args else []
+        query_handlers = query_args.get_query_handlers(id_column=getattr(self.model, "id", None)) if query_args else []
         to_select = to_select or [self.model]
         query: Select = select(*to_select)
         for query_handler in query_handlers:
             query = query_handler.update_query(query)
         return query
 
+    def _statement(
+        self, query_args: QueryArgs | None, to_select: list[EntitiesType] | None = None
+    ) -> tuple[Select, dict[str, Any]]:
+        to_select = to_select or [self.model]
+        if self.statement_cache:
+            return self.statement_cache.get_statement(query_args, to_select, partial(self._query, to_select=to_select))
+        params = query_args.get_params() if query_args else {}
+        return self._query(query_args, to_select=to_select), params
+
+    def _exists_statement(self, query_args: QueryArgs | None) -> tuple[SelectOfScalar[bool], dict[str, Any]]:
+        # EXISTS ignores its subquery's columns, so the statement the cache holds for the same reads can be reused
+        query, params = self._statement(query_args)
+        return select(query.exists()), params
+
 
 @dataclass
 class AsyncRepository(BaseRepository[AsyncSession, BaseModelType]):
+    """
+    Repository of a model backed by an AsyncSession.
+
+    When a read_session_factory is provided, reads which do not need to see this task's writes go through its
+    session, which is usually bound to a read replica. Reads use the primary session instead inside a unit of work,
+    when read_from_primary is set for the repository, or when a single read asks for it with use_primary.
+    """
+
     session_factory: Callable[..., AsyncSession]
     model: type[BaseModelType]
     _session: AsyncSession | None = field(default=None, init=False)
+    statement_cache: StatementCache | None = field(default=None)
+    read_session_factory: Callable[..., AsyncSession] | None = field(default=None)
+    read_from_primary: bool = field(default=False)
+
+    def _read_session(self, *, use_primary: bool = False) -> AsyncSession:
+        if (
+            use_primary
+            or self.read_from_primary
+            or not self.read_session_factory
+            or self.session.info.get(UNIT_OF_WORK_DEPTH_KEY)
+        ):
+            return self.session
+        return self.read_session_factory()
+
+    async def _commit(self) -> None:
+        if self.session.info.get(UNIT_OF_WORK_DEPTH_KEY):
+            # The unit of work commits once it completes, flushing still assigns ids and runs constraints
+            await self.session.flush()
+        else:
+            await self.session.commit()
+
+    async def rollback(self) -> None:
+        await self.session.rollback()
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """
+        Call callback once this repository's writes are committed, e.g. to update state kept outside the database.
+
+        Inside a unit of work callback is called after the outermost unit of work commits, and is dropped if it rolls
+        back. Outside of one writes are committed as they are made, so callback is called straight away.
+        """
+        if self.session.info.get(UNIT_OF_WORK_DEPTH_KEY):
+            self.session.info.setdefault(AFTER_COMMIT_KEY, []).append(callback)
+        else:
+            callback()
+
+    async def await_after_commit(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """
+        Call and await callback once this repository's writes are committed, like after_commit.
+
+        Inside a unit of work callback is awaited as the outermost unit of work exits, so it has finished before the
+        code after the unit of work runs. Outside of one callback is awaited straight away.
+        """
+        if self.session.info.get(UNIT_OF_WORK_DEPTH_KEY):
+            self.session.info.setdefault(AFTER_COMMIT_KEY, []).append(callback)
+        else:
+            await callback()
 
     async def get_query(self, query_args: QueryArgs | None = None) -> ScalarResult:
-        query = self._query(query_args)
-        return cast(ScalarResult, await self.session.exec(query))
+        query, params = self._statement(query_args)
+        session = self._read_session(use_primary=bool(query_args and query_args.use_primary))
+        return cast(ScalarResult, await session.exec(query, params=params))
 
     async def get_query_with_entities(
         self, entities_list: list[EntitiesType], query_args: QueryArgs | None = None
     ) -> ScalarResult:
-        query = self._query(query_args, to_select=entities_list)
-        return cast(ScalarResult, await self.session.exec(query))
+        query, params = self._statement(query_args, to_select=entities_list)
+        session = self._read_session(use_primary=bool(query_args and query_args.use_primary))
+        return cast(ScalarResult, await session.exec(query, params=params))
 
     async def get_all(self, query_args: QueryArgs | None = None) -> Sequence[BaseModelType]:
         query = await self.get_query(query_args)
         res: Sequence[BaseModelType] = query.all()
         return res
 
+    async def stream(
+        self, query_args: QueryArgs | None = None, batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> AsyncIterator[BaseModelType]:
+        """
+        Iterate over every matching row through a server side cursor, fetching batch_size rows at a time.
+
+        The session's transaction stays open until the iterator is exhausted or closed.
+        """
+        query, params = self._statement(query_args)
+        session = self._read_session(use_primary=bool(query_args and query_args.use_primary))
+        result = await session.stream_scalars(query, params, execution_options={"yield_per": batch_size})
+        async for obj in result:
+            yield obj
+
+    async def iter_pages(
+        self, query_args: QueryArgs | None = None, page_size: int = DEFAULT_BATCH_SIZE
+    ) -> AsyncIterator[Sequence[BaseModelType]]:
+        """
+        Iterate over every matching row a page at a time, using keyset pagination on the model's id.
+
+        Each page is its own query, so pages cost the same no matter how deep into the results they are.
+        """
+        query_args = replace(query_args or QueryArgs(), page_size=page_size)
+        while page := await self.get_all(query_args):
+            yield page
+            if len(page) < page_size:
+                return
+            query_args = replace(query_args, after_id=page[-1].id)
+
     async def get_all_with_entities(
         self, entities_list: list[EntitiesType], query_args: QueryArgs | None = None
     ) -> Sequence[tuple]:
@@ -75,6 +231,12 @@ class AsyncRepository(BaseRepository[AsyncSession, BaseModelType]):
         )
         return cast(int, query.first())
 
+    async def exists(self, query_args: QueryArgs | None = None) -> bool:
+        """Check whether any row matches with a SELECT EXISTS, which stops at the first match instead of counting."""
+        query, params = self._exists_statement(query_args)
+        session = self._read_session(use_primary=bool(query_args and query_args.use_primary))
+        return (await session.exec(query, params=params)).one()
+
     async def get_first(self, query_args: QueryArgs | None = None) -> BaseModelType | None:
         if not query_args:
             query_args = QueryArgs()
@@ -98,21 +260,107 @@ class AsyncRepository(BaseRepository[AsyncSession, BaseModelType]):
         result: tuple | None = query.first()
         return result
 
-    async def get_by_id(self, id_: int) -> BaseModelType | None:
-        return await self.session.get(self.model, id_)
+    async def get_by_id(self, id_: int, *, use_primary: bool = False) -> BaseModelType | None:
+        return await self._read_session(use_primary=use_primary).get(self.model, id_)
+
+    async def merge(self, obj: BaseModelType, *, load: bool = True) -> BaseModelType:
+        """
+        Get the copy of obj belonging to this repository's session, e.g. for an object loaded by another session.
+
+        With load False the database is not queried, obj's state is trusted to match its row.
+        """
+        return await self.session.merge(obj, load=load)
+
+    async def execute(self, statement: Select, params: dict[str, Any] | None = None) -> Sequence[Row[Any]]:
+        """
+        Execute a prebuilt statement which writes, such as a select from data modifying CTEs, on the primary session.
+
+        The transaction is committed afterwards, or flushed inside a unit of work.
+
+        Returns
+        -------
+        Sequence[Row[Any]]: Every row the statement returned
+        """
+        result = await self.session.exec(statement, params=params)
+        # session.exec types a select's rows as plain tuples
+        rows = cast(Sequence[Row[Any]], result.all())
+        await self._commit()
+        return rows
 
     async def add(self, obj: BaseModelType, and_refresh: list[str] | None = None) -> None:
         self.session.add(obj)
-        await self.session.commit()
+        await self._commit()
         if and_refresh:
             await self.session.refresh(obj, attribute_names=and_refresh)
 
+    async def add_all(self, objs: Sequence[BaseModelType]) -> None:
+        self.session.add_all(objs)
+        await self._commit()
+
+    async def bulk_insert(self, objs: Sequence[BaseModelType]) -> Sequence[BaseModelType]:
+        """
+        Insert many rows using batched multi row INSERT ... RETURNING statements in a single transaction.
+
+        Unlike add_all the provided objects are only used for their column values, relationships are not cascaded.
+
+        Parameters
+        ----------
+        objs: Sequence[BaseModelType]
+
+        Returns
+        -------
+        Sequence[BaseModelType]: The inserted rows, in the same order as the provided objects
+        """
+        if not objs:
+            return []
+        result = await self.session.scalars(
+            insert(self.model).returning(self.model, sort_by_parameter_order=True), _to_rows(objs)
+        )
+        inserted: Sequence[BaseModelType] = result.all()
+        await self._commit()
+        return inserted
+
+    async def upsert(
+        self,
+        objs: Sequence[BaseModelType],
+        index_elements: Sequence[str | ColumnElement],
+        update_fields: Sequence[str] | None = None,
+        index_where: ColumnElement[bool] | None = None,
+    ) -> Sequence[BaseModelType]:
+        """
+        Insert many rows with a single INSERT ... ON CONFLICT ... RETURNING statement.
+
+        Parameters
+        ----------
+        objs: Sequence[BaseModelType]
+        index_elements: Sequence[str | ColumnElement]
+            Columns or expressions of the unique index which detects a conflict
+        update_fields: Sequence[str] | None
+            Fields overwritten on conflict, defaults to every field except the id, creation date and index elements.
+            If empty, conflicting rows are left untouched and are not returned
+        index_where: ColumnElement[bool] | None
+            The predicate of a partial unique index
+
+        Returns
+        -------
+        Sequence[BaseModelType]: The inserted and updated rows
+        """
+        if not objs:
+            return []
+        result = await self.session.scalars(
+            _upsert_statement(self.model, objs, index_elements, update_fields, index_where),
+            execution_options={"populate_existing": True},
+        )
+        upserted: Sequence[BaseModelType] = result.all()
+        await self._commit()
+        return upserted
+
     async def update(self) -> None:
-        await self.session.commit()
+        await self._commit()
 
     async def delete(self, obj: BaseModelType) -> None:
         await self.session.delete(obj)
-        await self.session.commit()
+        await self._commit()
 
 
 @dataclass
@@ -120,16 +368,17 @@ class SyncRepository(BaseRepository[Session, BaseModelType]):
     session_factory: Callable[..., Session]
     model: type[BaseModelType]
     _session: Session | None = field(default=None, init=False)
+    statement_cache: StatementCache | None = field(default=None)
 
     def get_query(self, query_args: QueryArgs | None = None) -> ScalarResult:
-        query = self._query(query_args)
-        return cast(ScalarResult, self.session.exec(query))
+        query, params = self._statement(query_args)
+        return cast(ScalarResult, self.session.exec(query, params=params))
 
     def get_query_with_entities(
         self, entities_list: list[EntitiesType], query_args: QueryArgs | None = None
     ) -> ScalarResult:
-        query = self._query(query_args, to_select=entities_list)
-        return cast(ScalarResult, self.session.exec(query))
+        query, params = self._statement(query_args, to_select=entities_list)
+        return cast(ScalarResult, self.session.exec(query, params=params))
 
     def get_all(self, query_args: QueryArgs | None = None) -> Sequence[BaseModelType]:
         query = self.get_query(query_args)
@@ -150,6 +399,10 @@ class SyncRepository(BaseRepository[Session, BaseModelType]):
         )
         return cast(int, query.first())
 
+    def exists(self, query_args: QueryArgs | None = None) -> bool:
+        query, params = self._exists_statement(query_args)
+        return self.session.exec(query, params=params).one()
+
     def get_first(self, query_args: QueryArgs | None = None) -> BaseModelType | None:
         if not query_args:
             query_args = QueryArgs()
@@ -176,9 +429,81 @@ class SyncRepository(BaseRepository[Session, BaseModelType]):
     def get_by_id(self, id_: int) -> BaseModelType | None:
         return self.session.get(self.model, id_)
 
+    def add_all(self, objs: Sequence[BaseModelType]) -> None:
+        self.session.add_all(objs)
+        self.session.commit()
+
+    def bulk_insert(self, objs: Sequence[BaseModelType]) -> Sequence[BaseModelType]:
+        if not objs:
+            return []
+        inserted: Sequence[BaseModelType] = self.session.scalars(
+            insert(self.model).returning(self.model, sort_by_parameter_order=True), _to_rows(objs)
+        ).all()
+        self.session.commit()
+        return inserted
+
+    def upsert(
+        self,
+        objs: Sequence[BaseModelType],
+        index_elements: Sequence[str | ColumnElement],
+        update_fields: Sequence[str] | None = None,
+        index_where: ColumnElement[bool] | None = None,
+    ) -> Sequence[BaseModelType]:
+        if not objs:
+            return []
+        upserted: Sequence[BaseModelType] = self.session.scalars(
+            _upsert_statement(self.model, objs, index_elements, update_fields, index_where),
+            execution_options={"populate_existing": True},
+        ).all()
+        self.session.commit()
+        return upserted
+
     def update(self) -> None:
         self.session.commit()
 
     def delete(self, obj: BaseModelType) -> None:
         self.session.delete(obj)
         self.session.commit()
+
+
+@dataclass
+class UnitOfWork:
+    """
+    Group the writes of every repository sharing the current session into one transaction.
+
+    While a unit of work is open repositories flush their writes instead of committing them. The outermost unit of work
+    commits when it exits, then calls the callbacks registered with AsyncRepository.after_commit and awaits those
+    registered with AsyncRepository.await_after_commit, or rolls back and drops them if an exception escapes it.
+
+    Examples
+    --------
+    >>> async with unit_of_work:
+    ...     quest = await quest_service.complete_quest_if_available(user, quest_name)
+    ...     await xp_service.earn_xp_for_quest(user, quest)
+    """
+
+    session_factory: Callable[..., AsyncSession]
+    _session: AsyncSession | None = field(default=None, init=False)
+
+    async def __aenter__(self) -> AsyncSession:
+        self._session = self.session_factory()
+        self._session.info[UNIT_OF_WORK_DEPTH_KEY] = self._session.info.get(UNIT_OF_WORK_DEPTH_KEY, 0) + 1
+        return self._session
+
+    async def __aexit__(
+        self, exc_type: type[BaseException] | None, exc_value: BaseException | None, traceback: TracebackType | None
+    ) -> None:
+        session = cast(AsyncSession, self._session)
+        self._session = None
+        depth = session.info.pop(UNIT_OF_WORK_DEPTH_KEY) - 1
+        if depth:
+            session.info[UNIT_OF_WORK_DEPTH_KEY] = depth
+            return
+        callbacks: list[Callable[[], Awaitable[None] | None]] = session.info.pop(AFTER_COMMIT_KEY, [])
+        if exc_type is None:
+            await session.commit()
+            for callback in callbacks:
+                if isawaitable(awaitable := callback()):
+                    await awaitable
+        else:
+            await session.rollback()
@@ -1,16 +1,59 @@
-from collections.abc import Callable
+from abc import ABC
+from abc import abstractmethod
+from collections.abc import Sequence
+from datetime import datetime
+from functools import partial
 from logging import Logger
 from logging import getLogger
+from typing import Final
+from typing import cast
 
+from sqlalchemy import Boolean
+from sqlalchemy import ColumnElement
+from sqlalchemy import bindparam
 from sqlalchemy import func
+from sqlalchemy import literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import MultipleResultsFound
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.orm import aliased
+from sqlmodel import col
+from sqlmodel import select
 
+from src.helpers.caching import CacheMiss
+from src.helpers.caching import CacheStats
+from src.helpers.caching import LRUCache
+from src.helpers.name_map import NameMap
 from src.helpers.sqlalchemy_helpers import QueryArgs
 from src.models import Theme
 from src.models import User
 from src.repositories import AsyncRepository
 from src.typeshed import BaseModelType
+from src.typeshed import RepositoryFactory
 from src.typeshed import RepositoryHandler
 
+# Getting or creating a user is one statement. A conflicting insert updates discord_id to itself so the existing row is
+# returned too, xmax is only 0 for a row this statement inserted
+_REGISTERING_USER: Final = pg_insert(User).values(
+    datetime_created=bindparam("registered_at"),
+    datetime_edited=bindparam("registered_at"),
+    discord_id=bindparam("discord_id"),
+)
+_REGISTERED_USER: Final = (
+    _REGISTERING_USER.on_conflict_do_update(
+        index_elements=[col(User.discord_id)], set_={"discord_id": _REGISTERING_USER.excluded.discord_id}
+    )
+    .returning(User, literal_column("xmax = 0", Boolean).label("created"))
+    .cte("registered_user")
+)
+_REGISTERED_USER_ENTITY: Final = aliased(User, _REGISTERED_USER)
+_GET_OR_CREATE_USER_STATEMENT: Final = select(_REGISTERED_USER_ENTITY, _REGISTERED_USER.c.created).select_from(
+    _REGISTERED_USER_ENTITY
+)
+
+# Compared as lower(name) so the lookup is served by ix_theme_lower_name, an ilike can't use it
+_THEME_NAME_FILTER: Final = func.lower(Theme.name) == bindparam("theme_name")
+
 
 class BaseService:
     logger: Logger
@@ -19,47 +62,222 @@ class BaseService:
         self.logger = getLogger(f"{__name__}.{self.__class__.__name__}")
 
 
-class SingleRepoService(BaseService):
+class BulkWriteService(BaseService, ABC):
+    """Service which can write many objects of one of its models at once, see the matching AsyncRepository methods."""
+
+    @abstractmethod
+    def _get_repository_for(self, model: type[BaseModelType]) -> AsyncRepository[BaseModelType]: ...
+
+    def _after_write(self, model: type[BaseModelType]) -> None:
+        """React to objects of model being written, e.g. to invalidate what the service caches of the model."""
+
+    async def add_all(self, objs: Sequence[BaseModelType]) -> None:
+        if objs:
+            await self._get_repository_for(type(objs[0])).add_all(objs)
+            self._after_write(type(objs[0]))
+
+    async def bulk_insert(self, objs: Sequence[BaseModelType]) -> Sequence[BaseModelType]:
+        if not objs:
+            return []
+        inserted = await self._get_repository_for(type(objs[0])).bulk_insert(objs)
+        self._after_write(type(objs[0]))
+        return inserted
+
+    async def upsert(
+        self,
+        objs: Sequence[BaseModelType],
+        index_elements: Sequence[str | ColumnElement],
+        update_fields: Sequence[str] | None = None,
+        index_where: ColumnElement[bool] | None = None,
+    ) -> Sequence[BaseModelType]:
+        if not objs:
+            return []
+        upserted = await self._get_repository_for(type(objs[0])).upsert(
+            objs, index_elements, update_fields, index_where
+        )
+        self._after_write(type(objs[0]))
+        return upserted
+
+
+class SingleRepoService(BulkWriteService):
     _repository: AsyncRepository
 
     def __init__(
         self,
-        repository_factory: Callable[[type[BaseModelType]], AsyncRepository[BaseModelType]],
+        repository_factory: RepositoryFactory,
         model: type[BaseModelType],
+        *,
+        read_from_primary: bool = False,
     ) -> None:
         super().__init__()
-        self._repository = repository_factory(model)
+        self._repository = repository_factory(model=model, read_from_primary=read_from_primary)
+
+    def _get_repository_for(self, _model: type[BaseModelType]) -> AsyncRepository[BaseModelType]:
+        return self._repository
 
 
-class MultiRepoService(BaseService):
+class MultiRepoService(BulkWriteService):
     _repositories: RepositoryHandler
 
     def __init__(
         self,
-        repository_factory: Callable[[type[BaseModelType]], AsyncRepository[BaseModelType]],
+        repository_factory: RepositoryFactory,
+        *,
+        read_from_primary: bool = False,
         **models: type[BaseModelType],
     ) -> None:
         super().__init__()
-        self._repositories = RepositoryHandler(repository_factory, **models)
+        self._repositories = RepositoryHandler(repository_factory, read_from_primary=read_from_primary, **models)
+
+    def _get_repository_for(self, model: type[BaseModelType]) -> AsyncRepository[BaseModelType]:
+        return self._repositories.get_repository_for(model)
 
 
 class UserService(SingleRepoService):
+    """
+    Service for users, optionally caching users by their discord id.
+
+    The cache also remembers discord ids which are not registered, for negative_ttl seconds when provided, so commands
+    from unregistered users do not query the database every time.
+    """
+
     _repository: AsyncRepository[User]
+    _user_cache: LRUCache[int, User | None] | None
+    _negative_ttl: float | None
+
+    def __init__(
+        self,
+        repository_factory: RepositoryFactory,
+        model: type[User],
+        *,
+        user_cache: LRUCache[int, User | None] | None = None,
+        negative_ttl: float | None = None,
+        read_from_primary: bool = False,
+    ) -> None:
+        super().__init__(repository_factory, model, read_from_primary=read_from_primary)
+        self._user_cache = user_cache
+        self._negative_ttl = negative_ttl
+
+    @property
+    def cache_stats(self) -> CacheStats | None:
+        return self._user_cache.stats if self._user_cache else None
 
     async def get_user_by_id(self, user_id: int) -> User | None:
         return await self._repository.get_by_id(user_id)
 
     async def get_user_by_discord_id(self, discord_id: int) -> User | None:
-        return await self._repository.get_first(QueryArgs(filter_dict={"discord_id": discord_id}))
+        if self._user_cache is None:
+            return await self._repository.get_first(QueryArgs(filter_dict={"discord_id": discord_id}))
+        cached_user = self._user_cache.get(discord_id, CacheMiss.MISS)
+        if cached_user is not CacheMiss.MISS:
+            # The cached user may belong to an earlier command's session
+            return await self._repository.merge(cached_user, load=False) if cached_user else None
+        user = await self._repository.get_first(QueryArgs(filter_dict={"discord_id": discord_id}))
+        self._user_cache.set(discord_id, user, ttl=None if user else self._negative_ttl)
+        return user
+
+    async def get_or_create_by_discord_id(self, discord_id: int) -> tuple[User, bool]:
+        """
+        Get the user with a discord id, registering them first if they are new.
+
+        A cache miss is a single INSERT ... ON CONFLICT (discord_id) DO UPDATE ... RETURNING, which returns the user
+        whether they were inserted or already existed, so concurrent registrations of the same user cannot fail on the
+        unique constraint.
+
+        Parameters
+        ----------
+        discord_id: int
+
+        Returns
+        -------
+        tuple[User, bool]: The user and whether they were created by this call
+        """
+        if self._user_cache is not None:
+            cached_user = self._user_cache.get(discord_id)
+            if cached_user:
+                return await self._repository.merge(cached_user, load=False), False
+        rows = await self._repository.execute(
+            _GET_OR_CREATE_USER_STATEMENT, {"registered_at": datetime.now(), "discord_id": discord_id}
+        )
+        user, created = rows[0]
+        if created:
+            # Only cached once another lookup finds it, this user is rolled back if the unit of work fails
+            self._invalidate_user(discord_id)
+        elif self._user_cache is not None:
+            self._user_cache.set(discord_id, user)
+        return cast(User, user), bool(created)
 
     async def create_user(self, discord_id: int) -> User:
         user = User(discord_id=discord_id)
         await self._repository.add(user)
+        self._invalidate_user(discord_id)
         return user
 
+    def _invalidate_user(self, discord_id: int) -> None:
+        # Invalidated once the insert commits, a lookup before then would cache the user as unregistered again
+        if self._user_cache is not None:
+            self._repository.after_commit(partial(self._user_cache.invalidate, discord_id))
+
 
 class ThemeService(SingleRepoService):
+    """
+    Service for the themes tales are told about, optionally looking them up from an in memory map of every theme.
+
+    Themes are few and rarely change, so the map is loaded whole and built again once it expires or a lookup misses,
+    a theme added elsewhere is found by the first lookup for it. A lookup which misses only rebuilds the map once it is
+    older than its min_age, one rebuild at a time, so lookups of names which don't exist reload the themes at most once
+    per min_age.
+    """
+
     _repository: AsyncRepository[Theme]
+    _theme_names: NameMap[Theme] | None
+
+    def __init__(
+        self,
+        repository_factory: RepositoryFactory,
+        model: type[Theme],
+        *,
+        theme_names: NameMap[Theme] | None = None,
+        read_from_primary: bool = False,
+    ) -> None:
+        super().__init__(repository_factory, model, read_from_primary=read_from_primary)
+        self._theme_names = theme_names
+
+    async def load_themes(self) -> None:
+        """Build the theme map from every theme, a no-op without one."""
+        if self._theme_names is not None:
+            themes = await self._repository.get_all()
+            self._theme_names.build((theme.name, theme) for theme in themes)
+
+    async def _reload_themes(self, theme_names: NameMap[Theme]) -> None:
+        # The lock belongs to the shared map rather than this service, a service is made per command. Lookups waiting on
+        # it find the map rebuilt by the first of them, instead of rebuilding it again
+        async with theme_names.rebuild_lock:
+            if not theme_names.is_fresh or theme_names.can_rebuild:
+                await self.load_themes()
 
     async def get_theme_by_name(self, theme_name: str) -> Theme:
-        return await self._repository.get_one(QueryArgs(filter_list=[func.ilike(Theme.name, theme_name)]))
+        """
+        Get the theme with a name, ignoring case.
+
+        Raises
+        ------
+        NoResultFound
+            No theme has the name
+        MultipleResultsFound
+            More than one theme has the name
+        """
+        if self._theme_names is None:
+            return await self._repository.get_one(
+                QueryArgs(filter_list=[_THEME_NAME_FILTER], params={"theme_name": theme_name.lower()})
+            )
+        themes = self._theme_names.get(theme_name) if self._theme_names.is_fresh else []
+        if not themes:
+            await self._reload_themes(self._theme_names)
+            themes = self._theme_names.get(theme_name)
+        if not themes:
+            raise NoResultFound("No row was found when one was required")
+        if len(themes) > 1:
+            raise MultipleResultsFound("Multiple rows were found when exactly one was required")
+        # The mapped theme may belong to an earlier command's session
+        return await self._repository.merge(themes[0], load=False)
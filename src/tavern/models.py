@@ -3,9 +3,14 @@ from datetime import datetime
 
 from sqlalchemy import BigInteger
 from sqlalchemy import Column
+from sqlalchemy import Computed
+from sqlalchemy import Index
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlmodel import Field
 from sqlmodel import Relationship
 
+from src.constants import TALE_SEARCH_CONFIG
 from src.constants import DayOfWeek
 from src.helpers.sqlalchemy_helpers import EnumColumn
 from src.models import CoreModelMixin
@@ -18,6 +23,9 @@ class Menu(CoreModelMixin, table=True):
     start_date: date = Field(default_factory=datetime.today)
     items: list["MenuItem"] = Relationship(back_populates="menu")
 
+    # This week's menu is the latest started within the last week, a range of this index per server
+    __table_args__ = (Index("ix_menu_server_id_start_date", "server_id", text("start_date DESC")),)
+
     @property
     def grouped_items(self) -> dict[DayOfWeek, list["MenuItem"]]:
         dow_items: dict[DayOfWeek, list[MenuItem]] = {day: [] for day in DayOfWeek}
@@ -41,6 +49,20 @@ class BardTale(CoreModelMixin, table=True):
     name: NonEmptyString
     story: NonEmptyString
 
-    theme_id: int = Field(foreign_key="theme.id", repr=False)
+    theme_id: int = Field(foreign_key="theme.id", index=True, repr=False)
+    # Kept up to date by Postgres from the name and story, matches in the name rank above matches in the story
+    search_vector: str | None = Field(
+        default=None,
+        sa_column=Column(
+            TSVECTOR,
+            Computed(
+                f"setweight(to_tsvector('{TALE_SEARCH_CONFIG}', name), 'A')"
+                f" || setweight(to_tsvector('{TALE_SEARCH_CONFIG}', story), 'B')"
+            ),
+        ),
+        repr=False,
+    )
 
     theme: Theme = Relationship()
+
+    __table_args__ = (Index("ix_bard_tale_search_vector", "search_vector", postgresql_using="gin"),)
@@ -1,26 +1,56 @@
+import random
+
 from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import date
 from datetime import datetime
+from datetime import time
 from datetime import timedelta
+from functools import partial
+from typing import Final
 from typing import cast
 
 from sqlalchemy import Date
-from sqlalchemy import cast as sql_cast
+from sqlalchemy import bindparam
 from sqlalchemy import func
+from sqlalchemy import literal_column
 from sqlalchemy.orm import QueryableAttribute
 from sqlalchemy.orm import selectinload
+from sqlmodel import asc
+from sqlmodel import col
 from sqlmodel import desc
 
+from src.constants import TALE_SEARCH_CONFIG
 from src.constants import DayOfWeek
+from src.helpers.caching import CacheMiss
+from src.helpers.caching import LRUCache
+from src.helpers.message_helpers import format_menu
 from src.helpers.sqlalchemy_helpers import QueryArgs
 from src.models import Theme
+from src.repositories import DEFAULT_BATCH_SIZE
 from src.repositories import AsyncRepository
 from src.services import MultiRepoService
 from src.tavern import BardTale
 from src.tavern.exceptions import NoMenuItemFoundError
 from src.tavern.models import Menu
 from src.tavern.models import MenuItem
+from src.typeshed import BaseModelType
+from src.typeshed import RepositoryFactory
 from src.typeshed import RepositoryHandler
 
+_MENU_LENGTH: Final = timedelta(days=7)
+# A menu is this week's while today is within _MENU_LENGTH of its start, compared on the bare start_date column so
+# the lookup is a range scan of ix_menu_server_id_start_date
+_THIS_WEEK_FILTER: Final = col(Menu.start_date).between(
+    bindparam("earliest_start_date", type_=Date), bindparam("today", type_=Date)
+)
+
+_TALE_SEARCH_QUERY: Final = func.websearch_to_tsquery(
+    literal_column(f"'{TALE_SEARCH_CONFIG}'::regconfig"), bindparam("tale_search_terms")
+)
+_TALE_SEARCH_FILTER: Final = col(BardTale.search_vector).bool_op("@@")(_TALE_SEARCH_QUERY)
+_TALE_SEARCH_RANK: Final = func.ts_rank_cd(col(BardTale.search_vector), _TALE_SEARCH_QUERY)
+
 
 class TavernRepositoryHandler(RepositoryHandler):
     menu: AsyncRepository[Menu]
@@ -28,29 +58,96 @@ class TavernRepositoryHandler(RepositoryHandler):
     bard_tale: AsyncRepository[BardTale]
 
 
+@dataclass(frozen=True)
+class RenderedMenu:
+    """A menu's text and the food served each day, detached from the session which loaded the menu."""
+
+    text: str
+    foods_by_day: dict[DayOfWeek, list[str]]
+
+
+def _seconds_until_menu_changes(menu: Menu | None) -> float:
+    # A menu is this week's through its last day, without one a menu only starts by being created so check again daily
+    last_day = menu.start_date + _MENU_LENGTH if menu else date.today()
+    return (datetime.combine(last_day + timedelta(days=1), time.min) - datetime.now()).total_seconds()
+
+
 class TavernService(MultiRepoService):
+    """
+    Service for each server's menu and the tales told in the tavern.
+
+    When given a menu cache, each server's rendered menu for the week is read from the primary and cached until a write
+    to the menu through this service commits or the menu's week ends. When given a tale id cache, the ids of each
+    theme's tales are cached so a random tale is picked from them in memory and loaded by id, instead of Postgres
+    sorting every tale in the theme.
+    """
+
     _repositories: TavernRepositoryHandler
+    _menu_cache: LRUCache[int, RenderedMenu | None] | None
+    _tale_ids_cache: LRUCache[int, Sequence[int]] | None
+
+    def __init__(
+        self,
+        repository_factory: RepositoryFactory,
+        *,
+        menu_cache: LRUCache[int, RenderedMenu | None] | None = None,
+        tale_ids_cache: LRUCache[int, Sequence[int]] | None = None,
+        read_from_primary: bool = False,
+        **models: type[BaseModelType],
+    ) -> None:
+        super().__init__(repository_factory, read_from_primary=read_from_primary, **models)
+        self._menu_cache = menu_cache
+        self._tale_ids_cache = tale_ids_cache
 
-    async def get_this_weeks_menu(self, server_id: int) -> Menu | None:
-        today = datetime.today()
+    def _invalidate_menu(self, server_id: int) -> None:
+        # Invalidated once the write commits, a read before then would cache the menu from before the write again
+        if self._menu_cache is not None:
+            self._repositories.menu.after_commit(partial(self._menu_cache.invalidate, server_id))
+
+    async def get_this_weeks_rendered_menu(self, server_id: int) -> RenderedMenu | None:
+        """Get this week's menu for a server rendered for reading, served from the menu cache when possible."""
+        if self._menu_cache is not None:
+            cached_menu = self._menu_cache.get(server_id, CacheMiss.MISS)
+            if cached_menu is not CacheMiss.MISS:
+                return cached_menu
+        # Filled from the primary, a lagging replica could cache a menu from before the last write until the week ends
+        menu = await self.get_this_weeks_menu(server_id, use_primary=self._menu_cache is not None)
+        rendered_menu = (
+            RenderedMenu(
+                text=format_menu(menu),
+                foods_by_day={day: [item.food for item in items] for day, items in menu.grouped_items.items()},
+            )
+            if menu
+            else None
+        )
+        if self._menu_cache is not None:
+            self._menu_cache.set(server_id, rendered_menu, ttl=_seconds_until_menu_changes(menu))
+        return rendered_menu
+
+    async def get_this_weeks_menu(self, server_id: int, *, use_primary: bool = False) -> Menu | None:
+        today = date.today()
         return await self._repositories.menu.get_first(
             QueryArgs(
                 filter_dict={"server_id": server_id},
-                filter_list=[sql_cast(today, Date).between(Menu.start_date, Menu.start_date + timedelta(days=7))],
+                filter_list=[_THIS_WEEK_FILTER],
                 eager_options=[selectinload(cast(QueryableAttribute, Menu.items))],
                 order_by=[desc(Menu.start_date)],
+                params={"earliest_start_date": today - _MENU_LENGTH, "today": today},
+                use_primary=use_primary,
             )
         )
 
     async def create_menu_for_week(self, server_id: int) -> Menu:
         menu = Menu(server_id=server_id)
         await self._repositories.menu.add(menu, and_refresh=["items"])
+        self._invalidate_menu(server_id)
         return menu
 
     async def insert_menu_item(self, menu: Menu, item_name: str, day_of_week: DayOfWeek) -> None:
         menu_item = MenuItem.model_validate({"food": item_name, "day_of_the_week": day_of_week})
         menu.items.append(menu_item)
         await self._repositories.menu.update()
+        self._invalidate_menu(menu.server_id)
 
     async def delete_menu_item(self, menu: Menu, item_name: str, day_of_week: DayOfWeek | None) -> None:
         items = menu.grouped_items[day_of_week] if day_of_week else menu.items
@@ -58,24 +155,85 @@ class TavernService(MultiRepoService):
         for item in items:
             if item.food == item_name:
                 await self._repositories.menu_item.delete(item)
+                self._invalidate_menu(menu.server_id)
                 return
         else:
             raise NoMenuItemFoundError(item_name)
 
-    async def create_bard_tale(self, story: str, theme: Theme) -> BardTale:
-        bard_tale = BardTale.model_validate({"story": story, "theme": theme})
+    async def create_bard_tale(self, name: str, story: str, theme: Theme) -> BardTale:
+        bard_tale = BardTale.model_validate({"name": name, "story": story, "theme_id": theme.id})
         await self._repositories.bard_tale.add(bard_tale)
+        # Dropped once the tale commits, a pick before then would cache the theme's ids without it again
+        self._repositories.bard_tale.after_commit(partial(self._invalidate_tale_ids, bard_tale.theme_id))
         return bard_tale
 
-    async def get_tales_by_theme(self, theme: Theme) -> Sequence[BardTale]:
-        return await self._repositories.bard_tale.get_all(QueryArgs(filter_dict={"theme": theme}))
+    async def get_tales_by_theme(
+        self, theme: Theme, *, after_id: int | None = None, page_size: int = DEFAULT_BATCH_SIZE
+    ) -> Sequence[BardTale]:
+        """
+        Get a page of the tales told about a theme, in the order they were told.
 
-    async def get_random_tale_by_theme(self, theme: Theme) -> BardTale | None:
-        return await self._repositories.bard_tale.get_first(
-            QueryArgs(filter_dict={"theme": theme}, order_by=[func.random()])
+        Parameters
+        ----------
+        theme: Theme
+        after_id: int | None
+            The id of the last tale of the previous page, None for the first page
+        page_size: int
+            The most tales to return, fewer are returned on the last page
+        """
+        return await self._repositories.bard_tale.get_all(
+            QueryArgs(filter_dict={"theme_id": theme.id}, after_id=after_id, page_size=page_size)
         )
 
-    async def get_tales_by_name(self, search_name: str) -> Sequence[BardTale]:
+    def _invalidate_tale_ids(self, theme_id: int) -> None:
+        if self._tale_ids_cache is not None:
+            self._tale_ids_cache.invalidate(theme_id)
+
+    async def _get_tale_ids(self, theme_id: int) -> Sequence[int]:
+        if self._tale_ids_cache is not None and (tale_ids := self._tale_ids_cache.get(theme_id)) is not None:
+            return tale_ids
+        # Only the ids are read, an index only scan of ix_bard_tale_theme_id without sorting
+        rows = await self._repositories.bard_tale.get_all_with_entities(
+            [col(BardTale.id)], QueryArgs(filter_dict={"theme_id": theme_id})
+        )
+        tale_ids = cast(Sequence[int], rows)
+        if self._tale_ids_cache is not None:
+            self._tale_ids_cache.set(theme_id, tale_ids)
+        return tale_ids
+
+    async def get_random_tale_by_theme(self, theme: Theme) -> BardTale | None:
+        """
+        Get a random tale told about a theme, picked from the theme's tale ids and loaded by its primary key.
+
+        A cached id whose tale has since been deleted elsewhere drops the theme's cached ids and the pick is made once
+        more from fresh ones.
+        """
+        if theme.id is None:
+            return None
+        tale_ids = await self._get_tale_ids(theme.id)
+        tale = await self._get_tale_from(tale_ids)
+        if tale is None and tale_ids and self._tale_ids_cache is not None:
+            self._invalidate_tale_ids(theme.id)
+            tale = await self._get_tale_from(await self._get_tale_ids(theme.id))
+        return tale
+
+    async def _get_tale_from(self, tale_ids: Sequence[int]) -> BardTale | None:
+        if not tale_ids:
+            return None
+        return await self._repositories.bard_tale.get_by_id(random.choice(tale_ids))  # noqa: S311
+
+    async def search_tales(self, search_terms: str, limit: int) -> Sequence[BardTale]:
+        """
+        Get up to limit tales matching web search style terms in their name or story, best matches first.
+
+        Matches are found through the GIN index on the tales' search vectors and ranked by how close together and how
+        often the terms appear, with matches in a tale's name weighted above matches in its story.
+        """
         return await self._repositories.bard_tale.get_all(
-            QueryArgs(filter_list=[BardTale.name.ilike(f"%{search_name}%")])  # type: ignore[attr-defined]
+            QueryArgs(
+                filter_list=[_TALE_SEARCH_FILTER],
+                order_by=[desc(_TALE_SEARCH_RANK), asc(col(BardTale.id))],
+                limit=limit,
+                params={"tale_search_terms": search_terms},
+            )
         )
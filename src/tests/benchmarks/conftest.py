@@ -0,0 +1,48 @@
+from collections.abc import Awaitable
+from collections.abc import Callable
+from dataclasses import dataclass
+from time import perf_counter
+
+import pytest
+
+
+@dataclass(frozen=True)
+class BenchmarkResult:
+    name: str
+    iterations: int
+    total_seconds: float
+
+    @property
+    def per_call_us(self) -> float:
+        return self.total_seconds / self.iterations * 1_000_000
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.per_call_us:.2f}us per call over {self.iterations} calls"
+
+
+@pytest.fixture
+def benchmark() -> Callable[..., BenchmarkResult]:
+    def run(name: str, func: Callable[[], object], iterations: int = 10_000) -> BenchmarkResult:
+        func()
+        start = perf_counter()
+        for _ in range(iterations):
+            func()
+        result = BenchmarkResult(name, iterations, perf_counter() - start)
+        print(result)
+        return result
+
+    return run
+
+
+@pytest.fixture
+def async_benchmark() -> Callable[..., Awaitable[BenchmarkResult]]:
+    async def run(name: str, func: Callable[[], Awaitable[object]], iterations: int = 1_000) -> BenchmarkResult:
+        await func()
+        start = perf_counter()
+        for _ in range(iterations):
+            await func()
+        result = BenchmarkResult(name, iterations, perf_counter() - start)
+        print(result)
+        return result
+
+    return run
@@ -0,0 +1,78 @@
+from dataclasses import replace
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+from unittest.mock import MagicMock
+
+import pytest
+
+from sqlalchemy import Date
+from sqlalchemy import Interval
+from sqlalchemy import bindparam
+from sqlalchemy import insert
+from sqlalchemy import text
+from sqlmodel import desc
+
+from src.helpers.sqlalchemy_helpers import QueryArgs
+from src.repositories import AsyncRepository
+from src.tavern import Menu
+from src.tavern.services import _THIS_WEEK_FILTER
+
+SERVER_COUNT = 200
+WEEKS_OF_HISTORY = 520
+
+
+@pytest.mark.benchmark
+@pytest.mark.integration
+@pytest.mark.asyncio(loop_scope="session")
+class TestMenuLookupBenchmark:
+    @pytest.fixture
+    async def menu_history(self, db_session):
+        now = datetime.now()
+        await db_session.execute(
+            insert(Menu),
+            [
+                {
+                    "datetime_created": now,
+                    "datetime_edited": now,
+                    "server_id": server_id,
+                    "start_date": date.today() - timedelta(weeks=week),
+                }
+                for server_id in range(1, SERVER_COUNT + 1)
+                for week in range(WEEKS_OF_HISTORY)
+            ],
+        )
+        await db_session.execute(text("ANALYZE menu"))
+
+    @pytest.mark.usefixtures("menu_history")
+    async def test_range_against_computed_filter(self, async_benchmark, db_session):
+        # Arrange
+        repository = AsyncRepository(MagicMock(return_value=db_session), Menu)
+        computed_filter = bindparam("today", type_=Date).between(
+            Menu.start_date, Menu.start_date + bindparam("menu_length", type_=Interval)
+        )
+        today = date.today()
+        computed_query_args = QueryArgs(
+            filter_dict={"server_id": SERVER_COUNT // 2},
+            filter_list=[computed_filter],
+            order_by=[desc(Menu.start_date)],
+            params={"today": today, "menu_length": timedelta(days=7)},
+        )
+        range_query_args = replace(
+            computed_query_args,
+            filter_list=[_THIS_WEEK_FILTER],
+            params={"earliest_start_date": today - timedelta(days=7), "today": today},
+        )
+        # Act
+        computed_result = await async_benchmark(
+            f"computed filter over {SERVER_COUNT * WEEKS_OF_HISTORY} menus",
+            lambda: repository.get_first(computed_query_args),
+            iterations=200,
+        )
+        range_result = await async_benchmark(
+            f"start_date range over {SERVER_COUNT * WEEKS_OF_HISTORY} menus",
+            lambda: repository.get_first(range_query_args),
+            iterations=200,
+        )
+        # Assert
+        assert range_result.per_call_us < computed_result.per_call_us
@@ -0,0 +1,24 @@
+import pytest
+
+from src.helpers.prefix_index import PrefixIndex
+
+
+@pytest.mark.benchmark
+class TestPrefixIndexBenchmark:
+    @pytest.mark.parametrize("name_count", [1_000, 100_000])
+    def test_search_against_scan(self, benchmark, name_count):
+        # Arrange
+        names = [f"Quest number {i}" for i in range(name_count)]
+        prefix_index = PrefixIndex()
+        prefix_index.build(names)
+        prefix = f"quest number {name_count // 2}"
+        # Act
+        scan_result = benchmark(
+            f"scan {name_count} names",
+            lambda: [name for name in names if name.casefold().startswith(prefix)][:25],
+            iterations=20,
+        )
+        search_result = benchmark(f"search {name_count} names", lambda: prefix_index.search(prefix, 25))
+        # Assert
+        assert search_result.per_call_us < scan_result.per_call_us
+        assert search_result.per_call_us < 1000
@@ -0,0 +1,45 @@
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.helpers.caching import LRUCache
+from src.quests import Quest
+from src.quests import QuestService
+from src.quests import UserQuest
+
+
+def _quest_service(quest_count: int, board_cache: LRUCache | None) -> QuestService:
+    quests = [Quest(name=f"Quest number {i}", experience=i * 10) for i in range(quest_count)]
+
+    async def iter_pages(page_size: int = 500):
+        for start in range(0, quest_count, page_size):
+            yield quests[start : start + page_size]
+
+    board_sizes = (len(f"Quest number {quest_count}"), 0, quest_count * 10)
+    quest_repository = AsyncMock(
+        get_all_with_entities=AsyncMock(return_value=[board_sizes]),
+        iter_pages=MagicMock(side_effect=iter_pages),
+    )
+    return QuestService(
+        repository_factory=MagicMock(side_effect=[quest_repository, AsyncMock()]),
+        quest_model=Quest,
+        user_quest_model=UserQuest,
+        board_cache=board_cache,
+    )
+
+
+@pytest.mark.benchmark
+class TestQuestBoardBenchmark:
+    @pytest.mark.parametrize("quest_count", [10, 1_000, 10_000])
+    async def test_cached_board_against_render(self, async_benchmark, quest_count):
+        # Arrange
+        uncached = _quest_service(quest_count, board_cache=None)
+        cached = _quest_service(quest_count, board_cache=LRUCache(max_size=4))
+        # Act
+        render_result = await async_benchmark(
+            f"render board of {quest_count}", uncached.get_quest_board_pages, iterations=100
+        )
+        cached_result = await async_benchmark(f"cached board of {quest_count}", cached.get_quest_board_pages)
+        # Assert
+        assert cached_result.per_call_us < render_result.per_call_us
@@ -0,0 +1,83 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from sqlalchemy import insert
+from sqlmodel import col
+
+from src.helpers.sqlalchemy_helpers import QueryArgs
+from src.models import User
+from src.quests import Quest
+from src.quests import UserQuest
+from src.quests.services import QuestService
+from src.repositories import AsyncRepository
+
+HISTORY_SIZE = 20_000
+
+
+@pytest.mark.benchmark
+@pytest.mark.integration
+@pytest.mark.asyncio(loop_scope="session")
+class TestQuestHistoryBenchmark:
+    @pytest.fixture
+    async def quest_history(self, db_session):
+        user = User(discord_id=1)
+        capped_quest = Quest(name="Capped quest", experience=10, max_completion_count=3)
+        uncapped_quest = Quest(name="Uncapped quest", experience=10, max_completion_count=HISTORY_SIZE * 2)
+        db_session.add_all([user, capped_quest, uncapped_quest])
+        await db_session.flush()
+        now = datetime.now()
+        await db_session.execute(
+            insert(UserQuest),
+            [
+                {
+                    "datetime_created": now,
+                    "datetime_edited": now,
+                    "user_id": user.id,
+                    "quest_id": quest.id,
+                    "date_completed": now,
+                }
+                for quest in (capped_quest, uncapped_quest)
+                for _ in range(HISTORY_SIZE)
+            ],
+        )
+        return user, capped_quest, uncapped_quest
+
+    @pytest.fixture
+    def quest_service(self, db_session):
+        return QuestService(
+            repository_factory=lambda model, **_: AsyncRepository(MagicMock(return_value=db_session), model),
+            quest_model=Quest,
+            user_quest_model=UserQuest,
+        )
+
+    async def test_exists_against_count(self, async_benchmark, db_session, quest_history):
+        # Arrange
+        user, *_ = quest_history
+        repository = AsyncRepository(MagicMock(return_value=db_session), UserQuest)
+        query_args = QueryArgs(filter_list=[col(UserQuest.user_id) == user.id])
+        # Act
+        count_result = await async_benchmark(
+            "count user quests", lambda: repository.get_count(query_args), iterations=50
+        )
+        exists_result = await async_benchmark("user quest exists", lambda: repository.exists(query_args), iterations=50)
+        # Assert
+        assert exists_result.per_call_us < count_result.per_call_us
+
+    async def test_completion_count_stops_at_cap(self, async_benchmark, quest_history, quest_service):
+        # Arrange
+        user, capped_quest, uncapped_quest = quest_history
+        # Act
+        uncapped_result = await async_benchmark(
+            "complete quest counting every completion",
+            lambda: quest_service.complete_quest(user, uncapped_quest.name),
+            iterations=50,
+        )
+        capped_result = await async_benchmark(
+            "complete quest counting up to its cap",
+            lambda: quest_service.complete_quest(user, capped_quest.name),
+            iterations=50,
+        )
+        # Assert
+        assert capped_result.per_call_us < uncapped_result.per_call_us
@@ -0,0 +1,67 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from sqlalchemy import func
+from sqlalchemy import insert
+from sqlalchemy import text
+
+from src.factories import ThemeFactory
+from src.helpers.caching import LRUCache
+from src.helpers.sqlalchemy_helpers import QueryArgs
+from src.repositories import AsyncRepository
+from src.tavern import BardTale
+from src.tavern import TavernService
+
+TALES_PER_THEME = 100_000
+
+
+@pytest.mark.benchmark
+@pytest.mark.integration
+@pytest.mark.asyncio(loop_scope="session")
+class TestRandomTaleBenchmark:
+    @pytest.fixture
+    async def theme(self, db_session, theme_factory: type[ThemeFactory]):
+        theme = theme_factory.build()
+        db_session.add(theme)
+        await db_session.flush()
+        now = datetime.now()
+        await db_session.execute(
+            insert(BardTale),
+            [
+                {
+                    "datetime_created": now,
+                    "datetime_edited": now,
+                    "name": f"Tale {index}",
+                    "story": f"Story {index}",
+                    "theme_id": theme.id,
+                }
+                for index in range(TALES_PER_THEME)
+            ],
+        )
+        await db_session.execute(text("ANALYZE bard_tale"))
+        return theme
+
+    async def test_cached_ids_against_order_by_random(self, async_benchmark, db_session, theme):
+        # Arrange
+        repository = AsyncRepository(MagicMock(return_value=db_session), BardTale)
+        tavern_service = TavernService(
+            repository_factory=MagicMock(return_value=repository),
+            tale_ids_cache=LRUCache(max_size=1),
+            bard_tale_model=BardTale,
+        )
+        await tavern_service.get_random_tale_by_theme(theme)
+        # Act
+        sorted_result = await async_benchmark(
+            f"order by random() over {TALES_PER_THEME} tales",
+            lambda: repository.get_first(QueryArgs(filter_dict={"theme_id": theme.id}, order_by=[func.random()])),
+            iterations=20,
+        )
+        cached_result = await async_benchmark(
+            f"cached tale ids over {TALES_PER_THEME} tales",
+            lambda: tavern_service.get_random_tale_by_theme(theme),
+            iterations=200,
+        )
+        # Assert
+        assert cached_result.per_call_us < sorted_result.per_call_us
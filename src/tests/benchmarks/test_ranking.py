@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from src.helpers.ranking import Ranking
+
+MEMBER_COUNT = 100_000
+
+
+@pytest.mark.benchmark
+class TestRankingBenchmark:
+    @pytest.fixture
+    def ranking(self):
+        rng = random.Random(0)
+        return Ranking((member_id, rng.randrange(100_000)) for member_id in range(MEMBER_COUNT))
+
+    def test_top_and_rank_are_sub_millisecond(self, benchmark, ranking):
+        # Arrange
+        member_ids = iter(range(10_000_000))
+        # Act
+        top_result = benchmark("top 10 of 100k", lambda: ranking.top(10))
+        rank_result = benchmark("rank of 100k", lambda: ranking.get_rank(next(member_ids) % MEMBER_COUNT))
+        # Assert
+        assert top_result.per_call_us < 1000
+        assert rank_result.per_call_us < 1000
+
+    def test_score_updates_are_sub_millisecond(self, benchmark, ranking):
+        # Arrange
+        rng = random.Random(1)
+        # Act
+        update_result = benchmark(
+            "score update in 100k",
+            lambda: ranking.set_score(rng.randrange(MEMBER_COUNT), rng.randrange(100_000)),
+        )
+        # Assert
+        assert update_result.per_call_us < 1000
+        assert len(ranking) == MEMBER_COUNT
+
+    def test_against_sorting_every_call(self, benchmark, ranking):
+        # Arrange
+        scores = {member_id: ranking.get_score(member_id) for member_id in range(MEMBER_COUNT)}
+        # Act
+        sort_result = benchmark(
+            "sort 100k for top 10", lambda: sorted(scores.items(), key=lambda item: -item[1])[:10], iterations=20
+        )
+        top_result = benchmark("top 10 of 100k", lambda: ranking.top(10))
+        # Assert
+        assert top_result.per_call_us < sort_result.per_call_us
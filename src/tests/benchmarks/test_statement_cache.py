@@ -0,0 +1,50 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from sqlalchemy.orm import selectinload
+
+from src.helpers.sqlalchemy_helpers import QueryArgs
+from src.helpers.sqlalchemy_helpers import StatementCache
+from src.models import User
+from src.quests import Quest
+from src.quests.services import _QUEST_NAME_FILTER
+from src.repositories import AsyncRepository
+
+
+@pytest.mark.benchmark
+class TestStatementCacheBenchmark:
+    @pytest.mark.parametrize(
+        "make_query_args",
+        [
+            lambda i: QueryArgs(filter_dict={"discord_id": i}, limit=1),
+            lambda i: QueryArgs(
+                filter_list=[_QUEST_NAME_FILTER],
+                eager_options=[selectinload(Quest.users)],
+                params={"quest_name": f"quest {i}"},
+                limit=1,
+            ),
+        ],
+        ids=["user_by_discord_id", "quest_by_name"],
+    )
+    def test_cached_statement_against_rebuild(self, benchmark, make_query_args):
+        # Arrange
+        uncached = AsyncRepository(MagicMock(), User)
+        cached = AsyncRepository(MagicMock(), User, statement_cache=StatementCache(max_size=10))
+        counter = iter(range(10_000_000))
+
+        def rebuild():
+            # Executing a fresh statement makes SQLAlchemy walk it to find its compiled form
+            query, _ = uncached._statement(make_query_args(next(counter)))
+            return query._generate_cache_key()
+
+        def from_cache():
+            query, _ = cached._statement(make_query_args(next(counter)))
+            return query._generate_cache_key()
+
+        # Act
+        rebuild_result = benchmark("rebuild statement", rebuild)
+        cached_result = benchmark("cached statement", from_cache)
+        # Assert
+        assert cached_result.per_call_us < rebuild_result.per_call_us
+        assert cached.statement_cache.stats.misses == 1
@@ -0,0 +1,113 @@
+import random
+
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from sqlalchemy import column
+from sqlalchemy import insert
+from sqlalchemy import or_
+from sqlalchemy import table
+from sqlalchemy import text
+from sqlmodel import col
+
+from src.factories import ThemeFactory
+from src.helpers.sqlalchemy_helpers import QueryArgs
+from src.repositories import AsyncRepository
+from src.tavern import BardTale
+from src.tavern import TavernService
+
+CORPUS_SIZE = 100_000
+INGEST_BATCH_SIZE = 1_000
+WORDS = [
+    "dragon", "knight", "tavern", "forest", "castle", "goblin", "wizard", "river", "mountain", "crown",
+    "sword", "shadow", "maiden", "giant", "storm", "harvest", "raven", "lantern", "bridge", "wolf",
+]  # fmt: skip
+# A single tale in the corpus mentions it, a search for it should only read that tale
+RARE_WORD = "basilisk"
+
+
+def _tale_rows(theme_id: int, count: int, rng: random.Random) -> list[dict]:
+    now = datetime.now()
+    return [
+        {
+            "datetime_created": now,
+            "datetime_edited": now,
+            "name": " ".join(rng.choices(WORDS, k=3)),
+            "story": " ".join(rng.choices(WORDS, k=40)),
+            "theme_id": theme_id,
+        }
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.benchmark
+@pytest.mark.integration
+@pytest.mark.asyncio(loop_scope="session")
+class TestTaleSearchBenchmark:
+    @pytest.fixture
+    async def theme(self, db_session, theme_factory: type[ThemeFactory]):
+        theme = theme_factory.build()
+        db_session.add(theme)
+        await db_session.flush()
+        return theme
+
+    @pytest.fixture
+    async def corpus(self, db_session, theme):
+        rows = _tale_rows(theme.id, CORPUS_SIZE, random.Random(0))
+        rows[CORPUS_SIZE // 2]["story"] += f" {RARE_WORD}"
+        await db_session.execute(insert(BardTale), rows)
+        await db_session.execute(text("ANALYZE bard_tale"))
+
+    async def test_ingest_against_unindexed_table(self, async_benchmark, db_session, theme):
+        # Arrange
+        await db_session.execute(text("CREATE TEMPORARY TABLE plain_bard_tale (LIKE bard_tale INCLUDING DEFAULTS)"))
+        await db_session.execute(text("ALTER TABLE plain_bard_tale DROP COLUMN search_vector"))
+        plain_bard_tale = table(
+            "plain_bard_tale",
+            *(column(name) for name in ("datetime_created", "datetime_edited", "name", "story", "theme_id")),
+        )
+        rng = random.Random(1)
+        # Act
+        plain_result = await async_benchmark(
+            f"ingest {INGEST_BATCH_SIZE} tales without a search vector",
+            lambda: db_session.execute(insert(plain_bard_tale), _tale_rows(theme.id, INGEST_BATCH_SIZE, rng)),
+            iterations=10,
+        )
+        indexed_result = await async_benchmark(
+            f"ingest {INGEST_BATCH_SIZE} tales with a search vector",
+            lambda: db_session.execute(insert(BardTale), _tale_rows(theme.id, INGEST_BATCH_SIZE, rng)),
+            iterations=10,
+        )
+        # Assert
+        print(f"{INGEST_BATCH_SIZE / indexed_result.per_call_us * 1_000_000:.0f} tales/sec ingested with search")
+        assert indexed_result.per_call_us < plain_result.per_call_us * 10
+
+    @pytest.mark.usefixtures("corpus")
+    async def test_search_against_ilike_scan(self, async_benchmark, db_session):
+        # Arrange
+        repository = AsyncRepository(MagicMock(return_value=db_session), BardTale)
+        tavern_service = TavernService(repository_factory=MagicMock(return_value=repository), bard_tale_model=BardTale)
+        ilike_query_args = QueryArgs(
+            filter_list=[or_(col(BardTale.name).ilike(f"%{RARE_WORD}%"), col(BardTale.story).ilike(f"%{RARE_WORD}%"))],
+            limit=25,
+        )
+        # Act
+        ilike_result = await async_benchmark(
+            f"ilike scan over {CORPUS_SIZE} tales", lambda: repository.get_all(ilike_query_args), iterations=20
+        )
+        search_result = await async_benchmark(
+            f"ranked search over {CORPUS_SIZE} tales",
+            lambda: tavern_service.search_tales(RARE_WORD, 25),
+            iterations=200,
+        )
+        # Every matching tale is ranked, a word most tales mention costs about as much as the scan
+        await async_benchmark(
+            f"ranked search for a common word over {CORPUS_SIZE} tales",
+            lambda: tavern_service.search_tales(WORDS[0], 25),
+            iterations=20,
+        )
+        # Assert
+        assert len(await tavern_service.search_tales(RARE_WORD, 25)) == 1
+        assert search_result.per_call_us < ilike_result.per_call_us
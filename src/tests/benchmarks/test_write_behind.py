@@ -0,0 +1,80 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.helpers.write_behind import WriteBehindQueue
+from src.models import User
+from src.quests import ExperienceTransaction
+from src.quests import ExperienceTransactionService
+from src.quests import Quest
+from src.quests import UserExperience
+from src.repositories import AsyncRepository
+
+BATCH_SIZE = 100
+
+
+@pytest.mark.benchmark
+@pytest.mark.integration
+@pytest.mark.asyncio(loop_scope="session")
+class TestWriteBehindBenchmark:
+    @pytest.fixture
+    async def user_and_quest(self, db_session):
+        user = User(discord_id=1)
+        quest = Quest(name="Rewarding quest", experience=25)
+        db_session.add_all([user, quest])
+        await db_session.flush()
+        return user, quest
+
+    @pytest.fixture
+    def xp_service(self, db_session):
+        return ExperienceTransactionService(
+            repository_factory=lambda model, **_: AsyncRepository(MagicMock(return_value=db_session), model),
+            experience_transaction_model=ExperienceTransaction,
+            user_experience_model=UserExperience,
+        )
+
+    @pytest.fixture
+    async def write_queue(self, xp_service, tmp_path):
+        write_queue = WriteBehindQueue(
+            xp_service.write_queued_xp,
+            tmp_path / "experience.jsonl",
+            max_batch_size=BATCH_SIZE,
+            flush_interval_ms=60_000,
+        )
+        await write_queue.start()
+        yield write_queue
+        await write_queue.close()
+
+    async def test_earning_against_queueing(self, async_benchmark, db_session, xp_service, write_queue, user_and_quest):
+        # Arrange
+        user, quest = user_and_quest
+        queued_xp_service = ExperienceTransactionService(
+            repository_factory=lambda model, **_: AsyncRepository(MagicMock(return_value=db_session), model),
+            experience_transaction_model=ExperienceTransaction,
+            user_experience_model=UserExperience,
+            write_behind=write_queue,
+        )
+
+        async def earn_batch_one_at_a_time() -> None:
+            for _ in range(BATCH_SIZE):
+                await xp_service.earn_xp_for_quest(user, quest, 10)
+
+        async def write_queued_batch() -> None:
+            for _ in range(BATCH_SIZE):
+                await queued_xp_service.earn_xp_for_quest(user, quest, 10)
+            await write_queue.flush()
+
+        # Act
+        earn_result = await async_benchmark(
+            "earn xp", lambda: xp_service.earn_xp_for_quest(user, quest, 10), iterations=200
+        )
+        queue_result = await async_benchmark(
+            "queue xp", lambda: queued_xp_service.earn_xp_for_quest(user, quest, 10), iterations=200
+        )
+        one_at_a_time_result = await async_benchmark(
+            f"earn {BATCH_SIZE} xp one at a time", earn_batch_one_at_a_time, iterations=5
+        )
+        batch_result = await async_benchmark(f"write {BATCH_SIZE} queued xp", write_queued_batch, iterations=5)
+        # Assert
+        assert queue_result.per_call_us < earn_result.per_call_us
+        assert batch_result.per_call_us < one_at_a_time_result.per_call_us
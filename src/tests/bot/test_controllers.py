@@ -1,4 +1,3 @@
-from datetime import date
 from unittest.mock import AsyncMock
 from unittest.mock import MagicMock
 from unittest.mock import sentinel
@@ -6,14 +5,18 @@ from unittest.mock import sentinel
 import pytest
 
 from src.bot.constants import ALREADY_REGISTERED_MESSAGE
+from src.bot.constants import MAX_TALE_SEARCH_RESULTS
 from src.bot.constants import NEW_USER_MESSAGE
 from src.bot.constants import NO_MENU_ITEMS_FOR_CHOSEN_DAY_MESSAGE
 from src.bot.constants import NO_MENU_THIS_WEEK_MESSAGE
-from src.bot.constants import REGISTER_FIRST_MESSAGE
+from src.bot.constants import PROFILE_MESSAGE
 from src.bot.constants import SERVER_ONLY_BAD_REQUEST_MESSAGE
 from src.bot.controllers import add_quest_to_user
 from src.bot.controllers import check_and_register_user
 from src.bot.controllers import complete_quest_for_user
+from src.bot.controllers import find_bard_tales
+from src.bot.controllers import get_leaderboard_text
+from src.bot.controllers import get_profile_text
 from src.bot.controllers import get_tavern_menu
 from src.bot.controllers import remove_from_tavern_menu
 from src.bot.controllers import select_from_tavern_menu
@@ -22,12 +25,16 @@ from src.constants import QUEST_DOES_NOT_EXIST
 from src.constants import ChooseStyle
 from src.constants import DayOfWeek
 from src.factories import MenuFactory
-from src.factories import MenuItemFactory
 from src.factories import UserFactory
+from src.helpers.constants import NO_MATCHING_TALES
+from src.helpers.message_helpers import format_leaderboard
+from src.helpers.ranking import Ranking
 from src.quests.exceptions import QuestDNE
+from src.tavern import BardTale
 from src.tavern import Menu
 from src.tavern.exceptions import NoMenuItemFoundError
 from src.tavern.models import MenuItem
+from src.tavern.services import RenderedMenu
 
 TEST_WIRE_TO: list[str] = ["src.bot.controllers"]
 
@@ -35,7 +42,7 @@ TEST_WIRE_TO: list[str] = ["src.bot.controllers"]
 @pytest.fixture(params=[True, False])
 def mock_container_if_user_exists(mock_container, user_factory: type[UserFactory], request):
     mocked_user_service = AsyncMock(
-        get_user_by_discord_id=AsyncMock(return_value=user_factory.build() if request.param else None)
+        get_or_create_by_discord_id=AsyncMock(return_value=(user_factory.build(), not request.param))
     )
     mock_container.user_service.override(mocked_user_service)
     mock_container.wire(TEST_WIRE_TO)
@@ -52,15 +59,15 @@ class TestCheckAndRegisterUser:
         # Act
         res = await check_and_register_user(ctx)
         # Assert
-        mocked_user_service.get_user_by_discord_id.assert_called_with(sentinel.discord_id)
+        mocked_user_service.get_or_create_by_discord_id.assert_called_with(sentinel.discord_id)
         assert res == expected_result_mapping[user_exists]
 
 
 @pytest.mark.asyncio
 class TestAddQuestToUser:
-    async def test_if_registered(self, mock_container_if_user_exists):
+    async def test_registers_on_first_use(self, mock_container_if_user_exists):
         # Arrange
-        mock_container, _, user_exists = mock_container_if_user_exists
+        mock_container, mocked_user_service, _ = mock_container_if_user_exists
         ctx = MagicMock(author=MagicMock(id=sentinel.discord_id))
         mocked_quest_service = AsyncMock()
         mock_container.quest_service.override(mocked_quest_service)
@@ -68,15 +75,16 @@ class TestAddQuestToUser:
         # Act
         res = await add_quest_to_user(ctx, sentinel.quest_name)
         # Assert
-        assert (res == REGISTER_FIRST_MESSAGE) is not user_exists
-        assert mocked_quest_service.accept_quest_if_available.called is user_exists
+        user, _ = mocked_user_service.get_or_create_by_discord_id.return_value
+        mocked_quest_service.accept_quest_if_available.assert_called_once_with(user, sentinel.quest_name)
+        assert res == mocked_quest_service.accept_quest_if_available.return_value
 
 
 @pytest.mark.asyncio
 class TestCompleteQuestForUser:
-    async def test_if_registered(self, mock_container_if_user_exists, mocked_ctx):
+    async def test_registers_on_first_use(self, mock_container_if_user_exists, mocked_ctx):
         # Arrange
-        mock_container, _, user_exists = mock_container_if_user_exists
+        mock_container, _, _ = mock_container_if_user_exists
         mocked_quest_service = AsyncMock()
         mocked_xp_service = AsyncMock()
         mock_container.quest_service.override(mocked_quest_service)
@@ -87,9 +95,29 @@ class TestCompleteQuestForUser:
         res = await complete_quest_for_user(mocked_ctx, sentinel.quest_name)
 
         # Assert
-        assert (res == REGISTER_FIRST_MESSAGE) is not user_exists
-        assert mocked_quest_service.complete_quest_if_available.called is user_exists
-        assert mocked_xp_service.earn_xp_for_quest.called is user_exists
+        mocked_quest_service.complete_quest_if_available.assert_called_once()
+        mocked_xp_service.earn_xp_for_quest.assert_called_once()
+        assert mocked_xp_service.earn_xp_for_quest.call_args.args[2] == sentinel.guild_id
+        assert res.startswith("You have successfully completed")
+
+    @pytest.mark.parametrize("mock_container_if_user_exists", [True], indirect=True)
+    async def test_completes_in_one_unit_of_work(self, mock_container_if_user_exists, mocked_ctx):
+        # Arrange
+        mock_container, _, _ = mock_container_if_user_exists
+        unit_of_work = MagicMock()
+        mocked_xp_service = AsyncMock()
+        mock_container.quest_service.override(AsyncMock())
+        mock_container.xp_service.override(mocked_xp_service)
+        mock_container.unit_of_work.override(unit_of_work)
+        mock_container.wire(TEST_WIRE_TO)
+        unit_of_work.__aexit__.side_effect = lambda *_: mocked_xp_service.earn_xp_for_quest.assert_called()
+
+        # Act
+        await complete_quest_for_user(mocked_ctx, sentinel.quest_name)
+
+        # Assert
+        unit_of_work.__aenter__.assert_awaited_once()
+        unit_of_work.__aexit__.assert_awaited_once()
 
     @pytest.mark.parametrize("mock_container_if_user_exists", [True], indirect=True)
     async def test_fails_to_complete(self, mock_container_if_user_exists, mocked_ctx):
@@ -109,6 +137,70 @@ class TestCompleteQuestForUser:
         assert res == QUEST_DOES_NOT_EXIST
 
 
+@pytest.mark.asyncio
+class TestGetLeaderboardText:
+    async def test_no_guild(self, mocked_ctx):
+        # Arrange
+        mocked_ctx.guild = None
+        # Act
+        res = await get_leaderboard_text(mocked_ctx)
+        # Assert
+        assert res == SERVER_ONLY_BAD_REQUEST_MESSAGE
+
+    async def test_shows_top_and_caller_rank(self, mocked_ctx, mock_container):
+        # Arrange
+        mocked_ctx.author.id = 3
+        ranking = Ranking([(1, 100), (2, 50), (3, 10)])
+        mocked_xp_service = AsyncMock(get_ranking=AsyncMock(return_value=ranking))
+        mock_container.xp_service.override(mocked_xp_service)
+        mock_container.wire(TEST_WIRE_TO)
+        # Act
+        res = await get_leaderboard_text(mocked_ctx, 2)
+        # Assert
+        mocked_xp_service.get_ranking.assert_called_once_with(sentinel.guild_id)
+        assert res == format_leaderboard([(1, 100), (2, 50)], 3, 3, 10)
+
+
+@pytest.mark.asyncio
+class TestGetProfileText:
+    async def test_no_guild(self, mocked_ctx):
+        # Arrange
+        mocked_ctx.guild = None
+        # Act
+        res = await get_profile_text(mocked_ctx)
+        # Assert
+        assert res == SERVER_ONLY_BAD_REQUEST_MESSAGE
+
+    async def test_unregistered_user_has_no_experience(self, mocked_ctx, mock_container):
+        # Arrange
+        mocked_xp_service = AsyncMock()
+        mock_container.user_service.override(AsyncMock(get_user_by_discord_id=AsyncMock(return_value=None)))
+        mock_container.xp_service.override(mocked_xp_service)
+        mock_container.wire(TEST_WIRE_TO)
+        # Act
+        res = await get_profile_text(mocked_ctx)
+        # Assert
+        mocked_xp_service.get_experience.assert_not_called()
+        assert res == PROFILE_MESSAGE.format(
+            name=mocked_ctx.author.display_name, experience=0, server=mocked_ctx.guild.name
+        )
+
+    async def test_reads_experience_total(self, mocked_ctx, mock_container, user_factory: type[UserFactory]):
+        # Arrange
+        user = user_factory.build()
+        mocked_xp_service = AsyncMock(get_experience=AsyncMock(return_value=120))
+        mock_container.user_service.override(AsyncMock(get_user_by_discord_id=AsyncMock(return_value=user)))
+        mock_container.xp_service.override(mocked_xp_service)
+        mock_container.wire(TEST_WIRE_TO)
+        # Act
+        res = await get_profile_text(mocked_ctx)
+        # Assert
+        mocked_xp_service.get_experience.assert_called_once_with(user, sentinel.guild_id)
+        assert res == PROFILE_MESSAGE.format(
+            name=mocked_ctx.author.display_name, experience=120, server=mocked_ctx.guild.name
+        )
+
+
 class TestGetTavernMenu:
     @pytest.mark.usefixtures("mock_container")
     async def test_get_no_guild(self, mocked_ctx):
@@ -121,7 +213,7 @@ class TestGetTavernMenu:
 
     async def test_get_with_no_menu(self, mocked_ctx, mock_container):
         # Arrange
-        tavern_service = AsyncMock(get_this_weeks_menu=AsyncMock(return_value=None))
+        tavern_service = AsyncMock(get_this_weeks_rendered_menu=AsyncMock(return_value=None))
         mock_container.tavern_service.override(tavern_service)
         mock_container.wire(TEST_WIRE_TO)
 
@@ -133,34 +225,15 @@ class TestGetTavernMenu:
 
     async def test_get_tavern_menu(self, mock_container, mocked_ctx):
         # Arrange
-        menu_item = MenuItem(food="test", day_of_the_week=DayOfWeek.MONDAY)
-        tavern_service = AsyncMock(
-            get_this_weeks_menu=AsyncMock(
-                return_value=Menu(server_id=sentinel.guild_id, start_date=date(2024, 6, 6), items=[menu_item])
-            )
-        )
+        menu = RenderedMenu(text="Menu for the week of Jun 06, 2024", foods_by_day={})
+        tavern_service = AsyncMock(get_this_weeks_rendered_menu=AsyncMock(return_value=menu))
         mock_container.tavern_service.override(tavern_service)
         mock_container.wire(TEST_WIRE_TO)
         # Act
         res = await get_tavern_menu(mocked_ctx)
         # Assert
-        assert res == (
-            "Menu for the week of Jun 06, 2024\n"
-            "**Sunday**:\n"
-            "  No items available.\n"
-            "**Monday**:\n"
-            f"  - {menu_item.food.capitalize()}\n"
-            "**Tuesday**:\n"
-            "  No items available.\n"
-            "**Wednesday**:\n"
-            "  No items available.\n"
-            "**Thursday**:\n"
-            "  No items available.\n"
-            "**Friday**:\n"
-            "  No items available.\n"
-            "**Saturday**:\n"
-            "  No items available."
-        )
+        assert res == menu.text
+        tavern_service.get_this_weeks_rendered_menu.assert_called_once_with(mocked_ctx.guild.id)
 
 
 class TestUpsertTavernMenu:
@@ -247,7 +320,7 @@ class TestRemoveTavernMenu:
 class TestSelectFromTavernMenu:
     async def test_no_menu(self, mocked_guild, mock_container):
         # Arrange
-        tavern_service = AsyncMock(get_this_weeks_menu=AsyncMock(return_value=None))
+        tavern_service = AsyncMock(get_this_weeks_rendered_menu=AsyncMock(return_value=None))
         mock_container.tavern_service.override(tavern_service)
         mock_container.wire(TEST_WIRE_TO)
         # Act
@@ -255,10 +328,10 @@ class TestSelectFromTavernMenu:
         # Assert
         assert res == NO_MENU_THIS_WEEK_MESSAGE
 
-    async def test_no_items_for_selected_day(self, mocked_guild, mock_container, menu_factory: type[MenuFactory]):
+    async def test_no_items_for_selected_day(self, mocked_guild, mock_container):
         # Arrange
-        menu = menu_factory.build(items=[])
-        tavern_service = AsyncMock(get_this_weeks_menu=AsyncMock(return_value=menu))
+        menu = RenderedMenu(text="menu", foods_by_day={DayOfWeek.MONDAY: [], DayOfWeek.TUESDAY: ["soup"]})
+        tavern_service = AsyncMock(get_this_weeks_rendered_menu=AsyncMock(return_value=menu))
         mock_container.tavern_service.override(tavern_service)
         mock_container.wire(TEST_WIRE_TO)
         # Act
@@ -266,38 +339,52 @@ class TestSelectFromTavernMenu:
         # Assert
         assert res == NO_MENU_ITEMS_FOR_CHOSEN_DAY_MESSAGE
 
-    async def test_select_first(
-        self, mocked_guild, mock_container, menu_factory: type[MenuFactory], menu_item_factory: type[MenuItemFactory]
-    ):
+    async def test_select_first(self, mocked_guild, mock_container):
         # Arrange
-        menu_items = menu_item_factory.batch(size=2, day_of_the_week=DayOfWeek.MONDAY)
-        menu = menu_factory.build(items=menu_items)
-        tavern_service = AsyncMock(get_this_weeks_menu=AsyncMock(return_value=menu))
+        menu = RenderedMenu(text="menu", foods_by_day={DayOfWeek.MONDAY: ["roast boar", "stew"]})
+        tavern_service = AsyncMock(get_this_weeks_rendered_menu=AsyncMock(return_value=menu))
         mock_container.tavern_service.override(tavern_service)
         mock_container.wire(TEST_WIRE_TO)
         # Act
         res = await select_from_tavern_menu(mocked_guild, ChooseStyle.FIRST, DayOfWeek.MONDAY)
         # Assert
-        assert res == f"Order Up!\n{menu_items[0].food.title()}"
-
-    async def test_select_random(
-        self,
-        mocked_guild,
-        mock_container,
-        mocker,
-        menu_factory: type[MenuFactory],
-        menu_item_factory: type[MenuItemFactory],
-    ):
+        assert res == "Order Up!\nRoast Boar"
+
+    async def test_select_random(self, mocked_guild, mock_container, mocker):
         # Arrange
         random_choice = mocker.patch("src.bot.controllers.random.choice")
-        menu_items = menu_item_factory.batch(size=2, day_of_the_week=DayOfWeek.MONDAY)
-        menu = menu_factory.build(items=menu_items)
-        random_choice.return_value = menu_items[1]
-        tavern_service = AsyncMock(get_this_weeks_menu=AsyncMock(return_value=menu))
+        foods = ["roast boar", "stew"]
+        random_choice.return_value = foods[1]
+        menu = RenderedMenu(text="menu", foods_by_day={DayOfWeek.MONDAY: foods})
+        tavern_service = AsyncMock(get_this_weeks_rendered_menu=AsyncMock(return_value=menu))
         mock_container.tavern_service.override(tavern_service)
         mock_container.wire(TEST_WIRE_TO)
         # Act
         res = await select_from_tavern_menu(mocked_guild, ChooseStyle.RANDOM, DayOfWeek.MONDAY)
         # Assert
-        assert res == f"Order Up!\n{menu_items[1].food.title()}"
-        random_choice.assert_called_with(menu_items)
+        assert res == "Order Up!\nStew"
+        random_choice.assert_called_with(foods)
+
+
+class TestFindBardTales:
+    async def test_no_matching_tales(self, mock_container):
+        # Arrange
+        tavern_service = AsyncMock(search_tales=AsyncMock(return_value=[]))
+        mock_container.tavern_service.override(tavern_service)
+        mock_container.wire(TEST_WIRE_TO)
+        # Act
+        pages = await find_bard_tales("dragon")
+        # Assert
+        assert pages == [NO_MATCHING_TALES]
+        tavern_service.search_tales.assert_called_once_with("dragon", MAX_TALE_SEARCH_RESULTS)
+
+    async def test_matching_tales(self, mock_container):
+        # Arrange
+        tales = [BardTale(name="the dragon", story="it slept", theme_id=1)]
+        tavern_service = AsyncMock(search_tales=AsyncMock(return_value=tales))
+        mock_container.tavern_service.override(tavern_service)
+        mock_container.wire(TEST_WIRE_TO)
+        # Act
+        pages = await find_bard_tales("dragon")
+        # Assert
+        assert pages == ["**The Dragon**\nit slept"]
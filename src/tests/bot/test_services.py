@@ -1,15 +1,40 @@
+import asyncio
+
+from collections import Counter
 from unittest.mock import AsyncMock
 from unittest.mock import MagicMock
+from uuid import uuid4
 
 import pytest
 
+from sqlalchemy import delete
+from sqlalchemy import event
+from sqlalchemy import func
+from sqlalchemy import update
+from sqlmodel import col
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
 from src.constants import GOOD_LUCK_ADVENTURER
 from src.factories import UserFactory
+from src.helpers.caching import LRUCache
+from src.helpers.constants import NO_AVAILABLE_QUESTS
+from src.helpers.prefix_index import PrefixIndex
+from src.helpers.write_behind import WriteBehindQueue
+from src.models import User
+from src.quests import ExperienceTransaction
+from src.quests import ExperienceTransactionService
+from src.quests import Quest
+from src.quests import UserExperience
+from src.quests import UserQuest
 from src.quests.exceptions import MaxQuestCompletionReached
 from src.quests.exceptions import QuestAlreadyAccepted
 from src.quests.exceptions import QuestDNE
 from src.quests.exceptions import QuestNotAccepted
+from src.quests.services import _QUEST_NAME_FILTER
 from src.quests.services import QuestService
+from src.repositories import AsyncRepository
+from src.repositories import UnitOfWork
 
 
 @pytest.mark.asyncio
@@ -18,11 +43,8 @@ class TestQuestService:
     async def test_accept_quest_if_available(self, user_factory: type[UserFactory]):
         # Arrange
         user = user_factory.build()
-        mock_quest_repository = AsyncMock(
-            get_first=AsyncMock(return_value=MagicMock(users=[])), session=AsyncMock(commit=AsyncMock())
-        )
-        mock_user_quest_repo = AsyncMock(get_count=AsyncMock(return_value=0), add=AsyncMock())
-        mock_repository_factory = MagicMock(side_effect=[mock_quest_repository, mock_user_quest_repo])
+        mock_user_quest_repo = AsyncMock(execute=AsyncMock(return_value=[(MagicMock(), 1)]))
+        mock_repository_factory = MagicMock(side_effect=[AsyncMock(), mock_user_quest_repo])
         quest_service = QuestService(
             repository_factory=mock_repository_factory, quest_model=MagicMock(), user_quest_model=MagicMock()
         )
@@ -30,96 +52,567 @@ class TestQuestService:
         res = await quest_service.accept_quest_if_available(user, "Quest title")
         # Assert
         assert res == GOOD_LUCK_ADVENTURER.format("Quest title")
-        mock_user_quest_repo.add.assert_called()
+        mock_user_quest_repo.execute.assert_called_once()
 
-    async def test_quest_dne(self, user_factory: type[UserFactory]):
+    @pytest.mark.parametrize(
+        ("rows", "expected_error"), [([], QuestDNE), ([(MagicMock(), None)], QuestAlreadyAccepted)]
+    )
+    async def test_cannot_accept_quest(self, user_factory: type[UserFactory], rows, expected_error):
         # Arrange
-        user = user_factory.build()
-        mock_quest_repository = AsyncMock(get_first=AsyncMock(return_value=None))
-        mock_repository_factory = MagicMock(side_effect=[mock_quest_repository, AsyncMock()])
+        mock_user_quest_repo = AsyncMock(execute=AsyncMock(return_value=rows))
+        mock_repository_factory = MagicMock(side_effect=[AsyncMock(), mock_user_quest_repo])
         quest_service = QuestService(
             repository_factory=mock_repository_factory, quest_model=MagicMock(), user_quest_model=MagicMock()
         )
         # Act & Assert
-        with pytest.raises(QuestDNE):
-            await quest_service.accept_quest_if_available(user, "Quest title")
+        with pytest.raises(expected_error):
+            await quest_service.accept_quest_if_available(user_factory.build(), "Quest title")
 
-    async def test_quest_already_accepted(self, user_factory: type[UserFactory]):
+    async def test_concurrently_completed_quest_is_not_accepted(self, user_factory: type[UserFactory]):
         # Arrange
-        user = user_factory.build()
-        quest = MagicMock(users=[user])
-        mock_quest_repository = AsyncMock(
-            get_first=AsyncMock(return_value=quest), session=AsyncMock(commit=AsyncMock())
-        )
-        mock_user_quest_repo = AsyncMock(get_count=AsyncMock(return_value=1))
-        mock_repository_factory = MagicMock(side_effect=[mock_quest_repository, mock_user_quest_repo])
+        quest = MagicMock(max_completion_count=None)
+        # The active UserQuest was found but another command completed it before this one could
+        mock_user_quest_repository = AsyncMock(execute=AsyncMock(return_value=[(quest, 1, 0, None)]))
+        mock_repository_factory = MagicMock(side_effect=[AsyncMock(), mock_user_quest_repository])
         quest_service = QuestService(
             repository_factory=mock_repository_factory, quest_model=MagicMock(), user_quest_model=MagicMock()
         )
-        # Act & Assert
-        with pytest.raises(QuestAlreadyAccepted):
-            await quest_service.accept_quest_if_available(user, "Quest title")
+        # Act
+        res = await quest_service.complete_quest(user_factory.build(), "Quest title")
+        # Assert
+        assert not res.completed
+        assert isinstance(res.error, QuestNotAccepted)
 
-    @pytest.mark.parametrize("max_completion_count", [None, 2])
-    async def test_quest_completed(self, user_factory: type[UserFactory], max_completion_count):
+    async def test_quest_completed(self, user_factory: type[UserFactory]):
         # Arrange
-        user = user_factory.build()
-        quest = MagicMock(users=[user], max_completion_count=max_completion_count)
-        mock_quest_repository = AsyncMock(
-            get_first=AsyncMock(return_value=quest), session=AsyncMock(commit=AsyncMock())
-        )
-        user_quest = MagicMock(user=user, quest=quest)
-        mock_user_quest_repository = AsyncMock(
-            get_count=AsyncMock(return_value=1), get_first=AsyncMock(return_value=user_quest)
-        )
-        mock_repository_factory = MagicMock(side_effect=[mock_quest_repository, mock_user_quest_repository])
+        quest = MagicMock(max_completion_count=None)
+        mock_user_quest_repository = AsyncMock(execute=AsyncMock(return_value=[(quest, 1, 3, 1)]))
+        mock_repository_factory = MagicMock(side_effect=[AsyncMock(), mock_user_quest_repository])
         quest_service = QuestService(
             repository_factory=mock_repository_factory, quest_model=MagicMock(), user_quest_model=MagicMock()
         )
         # Act
-        res = await quest_service.complete_quest_if_available(user, "Quest title")
+        res = await quest_service.complete_quest_if_available(user_factory.build(), "Quest title")
         # Assert
         assert res == quest
 
-    async def test_cannot_complete_nonexistent_quest(self, user_factory: type[UserFactory]):
+    @pytest.mark.parametrize(
+        ("rows", "expected_error"),
+        [
+            ([], QuestDNE),
+            ([(MagicMock(max_completion_count=None), None, 0, None)], QuestNotAccepted),
+            ([(MagicMock(max_completion_count=1), 1, 1, None)], MaxQuestCompletionReached),
+        ],
+    )
+    async def test_cannot_complete_quest(self, user_factory: type[UserFactory], rows, expected_error):
         # Arrange
-        user = user_factory.build()
-        mock_quest_repository = AsyncMock(get_first=AsyncMock(return_value=None))
-        mock_repository_factory = MagicMock(side_effect=[mock_quest_repository, AsyncMock()])
+        mock_user_quest_repository = AsyncMock(execute=AsyncMock(return_value=rows))
+        mock_repository_factory = MagicMock(side_effect=[AsyncMock(), mock_user_quest_repository])
         quest_service = QuestService(
             repository_factory=mock_repository_factory, quest_model=MagicMock(), user_quest_model=MagicMock()
         )
         # Act & Assert
-        with pytest.raises(QuestDNE):
-            await quest_service.complete_quest_if_available(user, "Quest Title")
+        with pytest.raises(expected_error):
+            await quest_service.complete_quest_if_available(user_factory.build(), "Quest title")
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("mock_container")
+class TestQuestListing:
+    @pytest.fixture
+    def quest_repository(self):
+        async def iter_pages():
+            yield [Quest(name="Test Quest", experience=50)]
+
+        return AsyncMock(
+            get_all_with_entities=AsyncMock(return_value=[(10, 50, 50)]), iter_pages=MagicMock(side_effect=iter_pages)
+        )
+
+    @pytest.fixture
+    def quest_service(self, quest_repository):
+        return QuestService(
+            repository_factory=MagicMock(side_effect=[quest_repository, AsyncMock()]),
+            quest_model=Quest,
+            user_quest_model=UserQuest,
+            board_cache=LRUCache(max_size=4),
+            name_index=PrefixIndex(),
+        )
+
+    async def test_pages_are_cached(self, quest_service, quest_repository):
+        # Act
+        first_pages = await quest_service.get_quest_board_pages()
+        second_pages = await quest_service.get_quest_board_pages()
+        # Assert
+        assert first_pages is second_pages
+        assert "Test Quest" in first_pages[0]
+        quest_repository.iter_pages.assert_called_once()
 
-    async def test_cannot_complete_unaccepted_quest(self, user_factory: type[UserFactory]):
+    async def test_quest_names_are_searched_in_memory(self, quest_service, quest_repository):
         # Arrange
-        user = user_factory.build()
-        mock_quest_repository = AsyncMock(
-            get_first=AsyncMock(return_value=MagicMock()), session=AsyncMock(commit=AsyncMock())
+        quest_repository.get_all_with_entities = AsyncMock(return_value=["Test Quest", "Other quest"])
+        # Act
+        first_names = await quest_service.search_quest_names("te", 25)
+        second_names = await quest_service.search_quest_names("o", 25)
+        # Assert
+        assert (first_names, second_names) == (["Test Quest"], ["Other quest"])
+        quest_repository.get_all_with_entities.assert_called_once()
+
+    async def test_writing_quests_invalidates_names(self, quest_service, quest_repository):
+        # Arrange
+        quest_repository.get_all_with_entities = AsyncMock(side_effect=[["Test Quest"], ["Test Quest", "New Quest"]])
+        await quest_service.search_quest_names("", 25)
+        # Act
+        await quest_service.add_all([Quest(name="New Quest", experience=10)])
+        names = await quest_service.search_quest_names("", 25)
+        # Assert
+        assert names == ["New Quest", "Test Quest"]
+
+    async def test_writing_quests_invalidates_pages(self, quest_service, quest_repository):
+        # Arrange
+        await quest_service.get_quest_board_pages()
+        # Act
+        await quest_service.add_all([Quest(name="New Quest", experience=10)])
+        await quest_service.get_quest_board_pages()
+        # Assert
+        assert quest_repository.iter_pages.call_count == 2
+
+
+@pytest.fixture
+def loaded_rows():
+    loaded: Counter[type] = Counter()
+
+    def count_load(target, _context):
+        loaded[type(target)] += 1
+
+    for model in (Quest, UserQuest):
+        event.listen(model, "load", count_load)
+    yield loaded
+    for model in (Quest, UserQuest):
+        event.remove(model, "load", count_load)
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio(loop_scope="session")
+class TestQuestServiceIntegration:
+    @pytest.fixture
+    def quest_service(self, db_session):
+        return QuestService(
+            repository_factory=lambda model, **_: AsyncRepository(MagicMock(return_value=db_session), model),
+            quest_model=Quest,
+            user_quest_model=UserQuest,
         )
-        mock_user_quest_repo = AsyncMock(get_first=AsyncMock(return_value=None))
-        mock_repository_factory = MagicMock(side_effect=[mock_quest_repository, mock_user_quest_repo])
-        quest_service = QuestService(
-            repository_factory=mock_repository_factory, quest_model=MagicMock(), user_quest_model=MagicMock()
+
+    async def test_quest_lookup_only_loads_quest(self, db_session, quest_service, loaded_rows):
+        # Arrange
+        quest = Quest(name="Popular quest", experience=10)
+        users = [User(discord_id=discord_id) for discord_id in range(1, 7)]
+        db_session.add_all([UserQuest(user=other_user, quest=quest) for other_user in users[1:]])
+        db_session.add(users[0])
+        await db_session.flush()
+        db_session.expunge_all()
+        db_session.add(users[0])
+        # Act
+        await quest_service.accept_quest_if_available(users[0], "popular quest")
+        # Assert
+        assert loaded_rows == {Quest: 1}
+
+    @pytest.fixture
+    async def accepted_quest(self, db_session):
+        user = User(discord_id=1)
+        quest = Quest(name="Limited quest", experience=10, max_completion_count=1)
+        db_session.add(UserQuest(user=user, quest=quest))
+        await db_session.flush()
+        return user, quest
+
+    async def test_complete_quest_in_one_statement(self, db_session, sqla_engine, quest_service, accepted_quest):
+        # Arrange
+        user, quest = accepted_quest
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(sqla_engine.sync_engine, "before_cursor_execute", listener)
+        # Act
+        try:
+            res = await quest_service.complete_quest(user, "limited QUEST")
+        finally:
+            event.remove(sqla_engine.sync_engine, "before_cursor_execute", listener)
+        # Assert
+        assert res.completed
+        assert res.quest == quest
+        assert len(statements) == 1
+        user_quest = await db_session.get(UserQuest, res.completed_user_quest_id)
+        await db_session.refresh(user_quest)
+        assert user_quest.completed
+
+    async def test_max_completion_reached(self, db_session, quest_service, accepted_quest):
+        # Arrange
+        user, quest = accepted_quest
+        await quest_service.complete_quest(user, quest.name)
+        db_session.add(UserQuest(user=user, quest=quest))
+        await db_session.flush()
+        # Act
+        res = await quest_service.complete_quest(user, quest.name)
+        # Assert
+        assert isinstance(res.error, MaxQuestCompletionReached)
+
+    async def test_completions_under_cap(self, db_session, quest_service, accepted_quest):
+        # Arrange
+        user, quest = accepted_quest
+        quest.max_completion_count = 3
+        for _ in range(2):
+            await quest_service.complete_quest(user, quest.name)
+            db_session.add(UserQuest(user=user, quest=quest))
+            await db_session.flush()
+        # Act
+        res = await quest_service.complete_quest(user, quest.name)
+        # Assert
+        assert res.completed
+        assert not res.max_completion_reached
+
+    async def test_not_accepted(self, quest_service, accepted_quest):
+        # Arrange
+        user, quest = accepted_quest
+        await quest_service.complete_quest(user, quest.name)
+        # Act
+        res = await quest_service.complete_quest(user, quest.name)
+        # Assert
+        assert isinstance(res.error, QuestNotAccepted)
+
+    async def test_quest_board_read_a_page_at_a_time(self, db_session, quest_service):
+        # Arrange
+        quests = [Quest(name=f"Quest {index}" * (index % 3 + 1), experience=10**index) for index in range(6)]
+        db_session.add_all(quests)
+        await db_session.flush()
+        # Act
+        pages = await quest_service.get_quest_board_pages(page_length=300)
+        # Assert
+        assert len(pages) > 1
+        assert all(len(page) <= 300 for page in pages)
+        # Each page is the code block, border and header, its quests, then the border and code block
+        quest_lines = [line for page in pages for line in page.split("\n")[3:-2]]
+        assert len({len(line) for line in quest_lines}) == 1
+        assert [line.strip("| ").rsplit(maxsplit=1) for line in quest_lines] == [
+            [quest.name, str(quest.experience)] for quest in quests
+        ]
+
+    async def test_empty_quest_board(self, quest_service):
+        # Act & Assert
+        assert await quest_service.get_quest_board_pages() == [NO_AVAILABLE_QUESTS]
+
+    async def test_quest_dne(self, quest_service, accepted_quest):
+        # Arrange
+        user, _ = accepted_quest
+        # Act
+        res = await quest_service.complete_quest(user, "missing quest")
+        # Assert
+        assert isinstance(res.error, QuestDNE)
+
+    async def test_accept_quest_in_one_statement(self, db_session, sqla_engine, quest_service):
+        # Arrange
+        user = User(discord_id=1)
+        quest = Quest(name="New quest", experience=10)
+        db_session.add_all([user, quest])
+        await db_session.flush()
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(sqla_engine.sync_engine, "before_cursor_execute", listener)
+        # Act
+        try:
+            await quest_service.accept_quest_if_available(user, "new QUEST")
+        finally:
+            event.remove(sqla_engine.sync_engine, "before_cursor_execute", listener)
+        # Assert
+        assert len(statements) == 1
+        with pytest.raises(QuestAlreadyAccepted):
+            await quest_service.accept_quest_if_available(user, "new quest")
+
+    async def test_completed_quest_can_be_accepted_again(self, quest_service, accepted_quest):
+        # Arrange
+        user, quest = accepted_quest
+        await quest_service.complete_quest(user, quest.name)
+        # Act
+        res = await quest_service.accept_quest_if_available(user, quest.name)
+        # Assert
+        assert res == GOOD_LUCK_ADVENTURER.format(quest.name)
+
+    async def test_concurrent_accepts_do_not_duplicate(self, sqla_engine):
+        # Arrange
+        async with AsyncSession(sqla_engine, expire_on_commit=False) as setup_session:
+            user = User(discord_id=1)
+            quest = Quest(name="Contested quest", experience=10)
+            setup_session.add_all([user, quest])
+            await setup_session.commit()
+        sessions = [AsyncSession(sqla_engine, expire_on_commit=False) for _ in range(5)]
+        quest_services = [
+            QuestService(
+                repository_factory=lambda model, session=session, **_: AsyncRepository(
+                    MagicMock(return_value=session), model
+                ),
+                quest_model=Quest,
+                user_quest_model=UserQuest,
+            )
+            for session in sessions
+        ]
+        # Act
+        try:
+            results = await asyncio.gather(
+                *(service.accept_quest_if_available(user, quest.name) for service in quest_services),
+                return_exceptions=True,
+            )
+            async with AsyncSession(sqla_engine) as check_session:
+                user_quest_count = await check_session.scalar(
+                    select(func.count()).where(col(UserQuest.user_id) == user.id)
+                )
+        finally:
+            for session in sessions:
+                await session.close()
+            async with AsyncSession(sqla_engine) as cleanup_session:
+                await cleanup_session.execute(delete(UserQuest).where(col(UserQuest.user_id) == user.id))
+                await cleanup_session.execute(delete(Quest).where(col(Quest.id) == quest.id))
+                await cleanup_session.execute(delete(User).where(col(User.id) == user.id))
+                await cleanup_session.commit()
+        # Assert
+        assert user_quest_count == 1
+        assert results.count(GOOD_LUCK_ADVENTURER.format(quest.name)) == 1
+        assert all(isinstance(res, QuestAlreadyAccepted) for res in results if isinstance(res, Exception))
+
+    async def test_quest_lookup_uses_index(self, explain_plan):
+        # Act
+        plan = await explain_plan(select(Quest).where(_QUEST_NAME_FILTER), {"quest_name": "popular quest"})
+        # Assert
+        assert "ix_quest_lower_name" in plan
+
+
+@pytest.mark.asyncio
+class TestExperienceTransactionService:
+    @pytest.fixture
+    def session(self):
+        return AsyncMock(info={})
+
+    @pytest.fixture
+    def write_queue(self):
+        write_queue = MagicMock(spec=WriteBehindQueue)
+        write_queue.put = AsyncMock()
+        return write_queue
+
+    @pytest.fixture
+    def xp_service(self, session, write_queue):
+        return ExperienceTransactionService(
+            repository_factory=lambda model, **_: AsyncRepository(MagicMock(return_value=session), model),
+            experience_transaction_model=ExperienceTransaction,
+            user_experience_model=UserExperience,
+            write_behind=write_queue,
         )
+
+    async def test_xp_is_queued_once_unit_of_work_commits(self, session, write_queue, xp_service):
+        # Arrange
+        user = User(id=1, discord_id=1)
+        quest = Quest(id=2, name="Rewarding quest", experience=25)
+        # Act
+        async with UnitOfWork(MagicMock(return_value=session)):
+            xp_transaction = await xp_service.earn_xp_for_quest(user, quest, 10)
+            # Assert
+            write_queue.put.assert_not_called()
+        write_queue.put.assert_awaited_once()
+        record = write_queue.put.call_args.args[0]
+        assert (record["user_id"], record["experience"]) == (1, 25)
+        assert record["write_key"] == str(xp_transaction.write_key)
+
+    async def test_xp_is_not_queued_if_unit_of_work_rolls_back(self, session, write_queue, xp_service):
+        # Arrange
+        user = User(id=1, discord_id=1)
+        quest = Quest(id=2, name="Rewarding quest", experience=25)
+
+        async def failing_work():
+            async with UnitOfWork(MagicMock(return_value=session)):
+                await xp_service.earn_xp_for_quest(user, quest, 10)
+                raise ValueError("failed")
+
+        # Act
+        with pytest.raises(ValueError, match="failed"):
+            await failing_work()
+        # Assert
+        write_queue.put.assert_not_called()
+
+    async def test_unsaved_user_is_not_queued(self, write_queue, xp_service):
+        # Arrange
+        quest = Quest(id=2, name="Rewarding quest", experience=25)
         # Act & Assert
-        with pytest.raises(QuestNotAccepted):
-            await quest_service.complete_quest_if_available(user, "Quest Title")
+        with pytest.raises(ValueError, match="saved user and quest"):
+            await xp_service.earn_xp_for_quest(User(discord_id=1), quest, 10)
+        write_queue.put.assert_not_called()
+
 
-    async def test_max_completion_count_reached(self, user_factory: type[UserFactory]):
+@pytest.mark.integration
+@pytest.mark.asyncio(loop_scope="session")
+class TestExperienceTransactionServiceIntegration:
+    @pytest.fixture
+    def xp_service(self, db_session):
+        return ExperienceTransactionService(
+            repository_factory=lambda model, **_: AsyncRepository(MagicMock(return_value=db_session), model),
+            experience_transaction_model=ExperienceTransaction,
+            user_experience_model=UserExperience,
+            rankings=LRUCache(max_size=10),
+        )
+
+    @pytest.fixture
+    async def user_and_quest(self, db_session):
+        user = User(discord_id=1)
+        quest = Quest(name="Rewarding quest", experience=25)
+        db_session.add_all([user, quest])
+        await db_session.flush()
+        return user, quest
+
+    async def test_earn_xp_updates_total(self, xp_service, user_and_quest):
         # Arrange
-        user = user_factory.build()
-        quest = MagicMock(users=[user], max_completion_count=1, completed_users=[user])
-        mock_quest_repository = AsyncMock(
-            get_first=AsyncMock(return_value=quest), session=AsyncMock(commit=AsyncMock())
+        user, quest = user_and_quest
+        # Act
+        xp_transaction = await xp_service.earn_xp_for_quest(user, quest, 10)
+        await xp_service.earn_xp_for_quest(user, quest, 10)
+        await xp_service.earn_xp_for_quest(user, quest, 20)
+        # Assert
+        assert xp_transaction.experience == quest.experience
+        assert await xp_service.get_experience(user, 10) == 50
+        assert await xp_service.get_experience(user, 20) == 25
+        assert await xp_service.get_experience(user, 30) == 0
+
+    async def test_xp_earned_outside_a_server(self, xp_service, user_and_quest):
+        # Arrange
+        user, quest = user_and_quest
+        # Act
+        await xp_service.earn_xp_for_quest(user, quest)
+        # Assert
+        assert await xp_service.get_experience(user, None) == quest.experience
+
+    async def test_rebuild_corrects_totals(self, db_session, xp_service, user_and_quest):
+        # Arrange
+        user, quest = user_and_quest
+        await xp_service.earn_xp_for_quest(user, quest, 10)
+        await xp_service.earn_xp_for_quest(user, quest, 20)
+        await db_session.execute(
+            update(UserExperience).where(col(UserExperience.server_id) == 10).values(experience=1000)
         )
-        mock_user_quest_repository = AsyncMock(get_count=AsyncMock(return_value=1), get_first=AsyncMock())
-        mock_repository_factory = MagicMock(side_effect=[mock_quest_repository, mock_user_quest_repository])
-        quest_service = QuestService(
-            repository_factory=mock_repository_factory, quest_model=MagicMock(), user_quest_model=MagicMock()
+        db_session.add(UserExperience(user_id=user.id, server_id=30, experience=5))
+        await db_session.flush()
+        # Act
+        corrected_count = await xp_service.rebuild_experience_totals()
+        # Assert
+        assert corrected_count == 2
+        assert await xp_service.get_experience(user, 10) == quest.experience
+        assert await xp_service.get_experience(user, 20) == quest.experience
+        assert await xp_service.get_experience(user, 30) == 0
+
+    async def test_ranking_is_loaded_then_kept_in_step(self, db_session, xp_service, user_and_quest):
+        # Arrange
+        user, quest = user_and_quest
+        other_user = User(discord_id=2)
+        db_session.add(other_user)
+        await db_session.flush()
+        await xp_service.earn_xp_for_quest(other_user, quest, 10)
+        await xp_service.earn_xp_for_quest(other_user, quest, 20)
+        ranking = await xp_service.get_ranking(10)
+        # Act
+        await xp_service.earn_xp_for_quest(user, quest, 10)
+        await xp_service.earn_xp_for_quest(user, quest, 10)
+        # Assert
+        assert ranking.top(5) == [(user.discord_id, 50), (other_user.discord_id, 25)]
+        assert await xp_service.get_ranking(10) is ranking
+        assert (await xp_service.get_ranking(20)).top(5) == [(other_user.discord_id, 25)]
+
+    async def test_queued_xp_is_written_in_a_batch(self, db_session, xp_service, user_and_quest, tmp_path):
+        # Arrange
+        user, quest = user_and_quest
+        write_queue = WriteBehindQueue(xp_service.write_queued_xp, tmp_path / "experience.jsonl")
+        queued_xp_service = ExperienceTransactionService(
+            repository_factory=lambda model, **_: AsyncRepository(MagicMock(return_value=db_session), model),
+            experience_transaction_model=ExperienceTransaction,
+            user_experience_model=UserExperience,
+            rankings=LRUCache(max_size=10),
+            write_behind=write_queue,
         )
-        # Act & Assert
-        with pytest.raises(MaxQuestCompletionReached):
-            await quest_service.complete_quest_if_available(user, "Quest title")
+        ranking = await queued_xp_service.get_ranking(10)
+        await write_queue.start()
+        # Act
+        xp_transaction = await queued_xp_service.earn_xp_for_quest(user, quest, 10)
+        await queued_xp_service.earn_xp_for_quest(user, quest, 10)
+        await queued_xp_service.earn_xp_for_quest(user, quest, 20)
+        experience_before_flush = await xp_service.get_experience(user, 10)
+        await write_queue.close()
+        # Assert
+        assert (xp_transaction.id, xp_transaction.experience) == (None, quest.experience)
+        assert ranking.top(5) == [(user.discord_id, 50)]
+        assert experience_before_flush == 0
+        assert await xp_service.get_experience(user, 10) == 50
+        assert await xp_service.get_experience(user, 20) == 25
+        transaction_count = await db_session.scalar(
+            select(func.count()).where(col(ExperienceTransaction.user_id) == user.id)
+        )
+        assert transaction_count == 3
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio(loop_scope="session")
+class TestWriteQueuedXpIntegration:
+    @pytest.fixture
+    async def session(self, scoped_sqla_engine):
+        # Writes commit and failed batches roll back, so they need a database of their own rather than db_session
+        async with AsyncSession(scoped_sqla_engine, expire_on_commit=False) as session:
+            yield session
+
+    @pytest.fixture
+    def xp_service(self, session):
+        return ExperienceTransactionService(
+            repository_factory=lambda model, **_: AsyncRepository(MagicMock(return_value=session), model),
+            experience_transaction_model=ExperienceTransaction,
+            user_experience_model=UserExperience,
+        )
+
+    @pytest.fixture
+    async def user_and_quest(self, session):
+        user = User(discord_id=1)
+        quest = Quest(name="Rewarding quest", experience=25)
+        session.add_all([user, quest])
+        await session.commit()
+        # Detached, so a failed batch rolling back the session doesn't expire them
+        session.expunge_all()
+        return user, quest
+
+    @staticmethod
+    def queued_record(user_id, quest_id):
+        return {
+            "earned_at": "2024-01-01T12:00:00",
+            "user_id": user_id,
+            "quest_id": quest_id,
+            "experience": 25,
+            "server_id": 10,
+            "write_key": str(uuid4()),
+        }
+
+    async def count_transactions(self, session):
+        return await session.scalar(select(func.count()).select_from(ExperienceTransaction))
+
+    async def test_recovers_after_failed_batch(self, session, xp_service, user_and_quest, tmp_path):
+        # Arrange
+        user, quest = user_and_quest
+        write_queue = WriteBehindQueue(xp_service.write_queued_xp, tmp_path / "experience.jsonl", max_attempts=1)
+        await write_queue.start()
+        write_queue.put(self.queued_record(user.id + 1, quest.id))
+        write_queue.put(self.queued_record(user.id, quest.id))
+        # Act
+        await write_queue.flush()
+        await write_queue.close()
+        # Assert
+        stats = write_queue.get_stats()
+        assert (stats.written, stats.dead_lettered, stats.failed_flushes) == (1, 1, 1)
+        assert await xp_service.get_experience(user, 10) == quest.experience
+        assert await self.count_transactions(session) == 1
+
+    async def test_record_written_twice_is_recorded_once(self, session, xp_service, user_and_quest):
+        # Arrange
+        user, quest = user_and_quest
+        record = self.queued_record(user.id, quest.id)
+        await xp_service.write_queued_xp([record])
+        # Act
+        await xp_service.write_queued_xp([record, record])
+        # Assert
+        assert await xp_service.get_experience(user, 10) == quest.experience
+        assert await self.count_transactions(session) == 1
@@ -0,0 +1,40 @@
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.bot.views import PaginatedView
+
+
+@pytest.mark.asyncio
+class TestPaginatedView:
+    async def test_starts_on_first_page(self):
+        # Act
+        view = PaginatedView(["first", "second", "third"])
+        # Assert
+        assert view.previous_page.disabled
+        assert not view.next_page.disabled
+        assert view.page_counter.label == "1/3"
+
+    async def test_next_page_edits_message(self):
+        # Arrange
+        view = PaginatedView(["first", "second"])
+        interaction = MagicMock(response=AsyncMock())
+        # Act
+        await view.next_page.callback(interaction)
+        # Assert
+        interaction.response.edit_message.assert_called_once_with(content="second", view=view)
+        assert view.next_page.disabled
+        assert not view.previous_page.disabled
+        assert view.page_counter.label == "2/2"
+
+    async def test_previous_page_edits_message(self):
+        # Arrange
+        view = PaginatedView(["first", "second"])
+        view.page_index = 1
+        interaction = MagicMock(response=AsyncMock())
+        # Act
+        await view.previous_page.callback(interaction)
+        # Assert
+        interaction.response.edit_message.assert_called_once_with(content="first", view=view)
+        assert view.page_index == 0
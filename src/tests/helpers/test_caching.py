@@ -0,0 +1,65 @@
+from unittest.mock import patch
+
+from src.helpers.caching import CacheMiss
+from src.helpers.caching import LRUCache
+
+
+class TestLRUCache:
+    def test_miss_then_hit(self):
+        # Arrange
+        cache: LRUCache[str, int] = LRUCache(max_size=2)
+        # Act
+        first = cache.get("a")
+        cache.set("a", 1)
+        second = cache.get("a")
+        # Assert
+        assert (first, second) == (None, 1)
+        assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+        assert cache.stats.hit_rate == 0.5
+
+    def test_evicts_least_recently_used(self):
+        # Arrange
+        cache: LRUCache[str, int] = LRUCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        # Act
+        cache.set("c", 3)
+        # Assert
+        assert "a" in cache
+        assert "b" not in cache
+        assert len(cache) == 2
+
+    def test_invalidate(self):
+        # Arrange
+        cache: LRUCache[str, int] = LRUCache(max_size=2)
+        cache.set("a", 1)
+        # Act
+        cache.invalidate("a")
+        cache.invalidate("missing")
+        # Assert
+        assert cache.get("a") is None
+
+    def test_cached_none_is_not_a_miss(self):
+        # Arrange
+        cache: LRUCache[str, int | None] = LRUCache(max_size=2)
+        cache.set("a", None)
+        # Act
+        cached = cache.get("a", CacheMiss.MISS)
+        missing = cache.get("b", CacheMiss.MISS)
+        # Assert
+        assert (cached, missing) == (None, CacheMiss.MISS)
+        assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+
+    def test_entries_expire_after_ttl(self):
+        # Arrange
+        cache: LRUCache[str, int] = LRUCache(max_size=2, ttl=10)
+        with patch("src.helpers.caching.monotonic", return_value=100):
+            cache.set("a", 1)
+            cache.set("b", 2, ttl=1)
+        # Act
+        with patch("src.helpers.caching.monotonic", return_value=105):
+            values = (cache.get("a"), cache.get("b"))
+        # Assert
+        assert values == (1, None)
+        assert len(cache) == 1
@@ -0,0 +1,142 @@
+import logging
+
+import pytest
+
+from sqlalchemy import create_engine
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from src.helpers.instrumentation import _QUERY_START_KEY
+from src.helpers.instrumentation import OTHER_STATEMENTS_KEY
+from src.helpers.instrumentation import InstrumentedQueuePool
+from src.helpers.instrumentation import LatencyHistogram
+from src.helpers.instrumentation import PoolMetrics
+from src.helpers.instrumentation import QueryInstrumentation
+
+
+class TestLatencyHistogram:
+    @pytest.mark.parametrize(
+        ("latency_ms", "bucket"),
+        [(0.5, 0), (1.0, 0), (1.5, 1), (2500.0, 10), (3000.0, 11)],
+    )
+    def test_observe_counts_bucket(self, latency_ms, bucket):
+        # Arrange
+        histogram = LatencyHistogram()
+        # Act
+        histogram.observe(latency_ms)
+        # Assert
+        assert histogram.counts[bucket] == 1
+        assert histogram.count == 1
+
+    def test_summary(self):
+        # Arrange
+        histogram = LatencyHistogram()
+        # Act
+        for latency_ms in (2.0, 4.0, 12.0):
+            histogram.observe(latency_ms)
+        # Assert
+        assert histogram.mean_ms == 6.0
+        assert histogram.max_ms == 12.0
+
+
+class TestQueryInstrumentation:
+    def test_only_slow_queries_are_logged(self, caplog):
+        # Arrange
+        instrumentation = QueryInstrumentation(slow_query_threshold_ms=100)
+        # Act
+        with caplog.at_level(logging.DEBUG):
+            instrumentation.record("SELECT 1", 5)
+            instrumentation.record("SELECT 1", 150)
+        # Assert
+        assert len(caplog.records) == 1
+        assert caplog.records[0].levelno == logging.WARNING
+        assert instrumentation.histograms["SELECT 1"].count == 2
+
+    def test_sampled_queries_are_logged(self, caplog):
+        # Arrange
+        instrumentation = QueryInstrumentation(slow_query_threshold_ms=100, sample_rate=1)
+        # Act
+        with caplog.at_level(logging.DEBUG):
+            instrumentation.record("SELECT 1", 5)
+        # Assert
+        assert [record.levelno for record in caplog.records] == [logging.DEBUG]
+
+    def test_statements_beyond_max_share_histogram(self):
+        # Arrange
+        instrumentation = QueryInstrumentation(slow_query_threshold_ms=100, max_statements=1)
+        # Act
+        instrumentation.record("SELECT 1", 5)
+        instrumentation.record("SELECT 2", 5)
+        instrumentation.record("SELECT 3", 5)
+        # Assert
+        assert set(instrumentation.histograms) == {"SELECT 1", OTHER_STATEMENTS_KEY}
+        assert instrumentation.histograms[OTHER_STATEMENTS_KEY].count == 2
+
+    def test_attach_records_executed_statements(self):
+        # Arrange
+        instrumentation = QueryInstrumentation(slow_query_threshold_ms=100)
+        engine = create_engine("sqlite://")
+        instrumentation.attach(engine)
+        # Act
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        # Assert
+        assert instrumentation.histograms["SELECT 1"].count == 1
+
+    def test_attach_records_failed_statements(self, caplog):
+        # Arrange
+        instrumentation = QueryInstrumentation(slow_query_threshold_ms=0)
+        engine = create_engine("sqlite://")
+        instrumentation.attach(engine)
+        # Act
+        with engine.connect() as conn, caplog.at_level(logging.WARNING):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing_table"))
+            start_times = conn.info[_QUERY_START_KEY]
+        # Assert
+        assert instrumentation.histograms["SELECT * FROM missing_table"].count == 1
+        assert start_times == {}
+        assert caplog.records[0].getMessage().startswith("Failed query took")
+
+
+class TestInstrumentedQueuePool:
+    @pytest.fixture
+    def engine(self):
+        engine = create_engine(
+            "sqlite://",
+            poolclass=InstrumentedQueuePool,
+            pool_metrics=PoolMetrics(),
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=0.01,
+        )
+        yield engine
+        engine.dispose()
+
+    def test_stats_track_checked_out_connections(self, engine):
+        # Act
+        with engine.connect():
+            in_use_stats = engine.pool.get_stats()
+        idle_stats = engine.pool.get_stats()
+        # Assert
+        assert (in_use_stats.in_use, in_use_stats.idle) == (1, 0)
+        assert (idle_stats.in_use, idle_stats.idle) == (0, 1)
+        assert idle_stats.checkout_wait.count == 1
+
+    def test_timeouts_are_counted(self, engine):
+        # Act
+        with engine.connect(), pytest.raises(PoolTimeoutError):
+            engine.connect()
+        # Assert
+        stats = engine.pool.get_stats()
+        assert stats.timeouts == 1
+        assert stats.checkout_wait.count == 2
+
+    def test_metrics_survive_recreate(self, engine):
+        # Arrange
+        metrics = engine.pool.pool_metrics
+        # Act
+        engine.dispose()
+        # Assert
+        assert engine.pool.pool_metrics is metrics
@@ -1,38 +1,184 @@
+from datetime import date
+
 import pytest
 
-from src.helpers.message_helpers import format_quest_board
+from src.constants import DayOfWeek
+from src.helpers.constants import NO_MATCHING_TALES
+from src.helpers.constants import NO_RANKED_ADVENTURERS
+from src.helpers.message_helpers import format_leaderboard
+from src.helpers.message_helpers import format_menu
+from src.helpers.message_helpers import format_quest_board_lines
+from src.helpers.message_helpers import get_board_line_length
+from src.helpers.message_helpers import paginate_quest_board_lines
+from src.helpers.message_helpers import paginate_tales
 from src.quests.models import Quest
+from src.tavern.models import BardTale
+from src.tavern.models import Menu
+from src.tavern.models import MenuItem
 
 
-class TestFormatQuestBoard:
-    def test_base_case(self):
-        # Act
-        board = format_quest_board([])
-        # Assert
-        assert board == "No available quests"
+def get_quest_board_pages(quests, page_length):
+    line_length = get_board_line_length(
+        max(len(quest.name) for quest in quests), max(len(str(quest.experience)) for quest in quests), page_length
+    )
+    return paginate_quest_board_lines(format_quest_board_lines(quests, line_length), line_length, page_length)
+
 
-    def test_single_case(self):
+class TestFormatQuestBoardLines:
+    def test_single_quest(self):
         # Arrange
         quest = Quest(name="Test Quest", experience=50)
         # Act
-        board = format_quest_board([quest])
+        lines = format_quest_board_lines([quest], 22)
         # Assert
-        assert (
-            board == "```\n"
-            "======================\n"
-            "||  Quests      XP  ||\n"
-            "||  Test Quest  50  ||\n"
-            "======================\n"
-            "```"
-        )
+        assert lines == ["||  Test Quest  50  ||"]
 
     @pytest.mark.parametrize(
         ("name", "experience", "line_length"),
         [("", 0, 18), ("abcde", 50000, 21), ("abcdefg", 1, 19), ("abcdefg", 123, 20)],
     )
-    def test_multi_case(self, name, experience, line_length):
-        quests = [Quest(name=name, experience=experience)]
-        board = format_quest_board(quests)
-        lines = board.split("\n")
-        test_lines = [line for line in lines if line != "```"]
-        assert all(len(line) == line_length for line in test_lines), test_lines
+    def test_line_length(self, name, experience, line_length):
+        # Act
+        board_line_length = get_board_line_length(len(name), len(str(experience)))
+        lines = format_quest_board_lines([Quest(name=name, experience=experience)], board_line_length)
+        # Assert
+        assert board_line_length == line_length
+        assert [len(line) for line in lines] == [line_length]
+
+    def test_over_long_quest_name_is_truncated(self):
+        # Act
+        lines = format_quest_board_lines([Quest(name="Slay the dragon " * 10, experience=500)], 30)
+        # Assert
+        assert lines == ["||  Slay the drago...  500  ||"]
+
+
+class TestPaginateQuestBoardLines:
+    def test_base_case(self):
+        # Act & Assert
+        assert paginate_quest_board_lines([], 18) == ["No available quests"]
+
+    def test_single_page(self):
+        # Act
+        pages = paginate_quest_board_lines(["||  Test Quest  50  ||"], 22)
+        # Assert
+        assert pages == [
+            "\n".join(
+                [
+                    "```",
+                    "======================",
+                    "||  Quests      XP  ||",
+                    "||  Test Quest  50  ||",
+                    "======================",
+                    "```",
+                ]
+            )
+        ]
+
+    @pytest.mark.parametrize("page_length", [200, 2000])
+    def test_pages_fit_and_share_alignment(self, page_length):
+        # Arrange
+        quests = [Quest(name=f"Quest {i}", experience=i) for i in range(300)]
+        # Act
+        pages = get_quest_board_pages(quests, page_length)
+        # Assert
+        assert len(pages) > 1
+        assert all(len(page) <= page_length for page in pages)
+        assert len({len(line) for page in pages for line in page.split("\n") if line != "```"}) == 1
+        assert sum(page.count("Quest ") for page in pages) == len(quests)
+
+    @pytest.mark.parametrize("page_length", [200, 2000])
+    def test_over_long_quest_name_fits_a_page(self, page_length):
+        # Arrange
+        quests = [Quest(name="Slay the dragon " * 200, experience=500), Quest(name="Find the cat", experience=5)]
+        # Act
+        pages = get_quest_board_pages(quests, page_length)
+        # Assert
+        assert all(len(page) <= page_length for page in pages)
+        assert len({len(line) for page in pages for line in page.split("\n") if line != "```"}) == 1
+        assert "Slay the dragon" in pages[0]
+        assert "...  500" in pages[0]
+        assert "Find the cat" in pages[-1]
+
+
+class TestFormatLeaderboard:
+    def test_no_ranked_users(self):
+        # Act & Assert
+        assert format_leaderboard([], 1, None, None) == NO_RANKED_ADVENTURERS
+
+    def test_ties_share_rank(self):
+        # Act
+        board = format_leaderboard([(1, 50), (2, 50), (3, 10)], 1, 1, 50)
+        # Assert
+        assert board.split("\n")[1:] == ["1. <@1> - 50 XP", "1. <@2> - 50 XP", "3. <@3> - 10 XP"]
+
+    @pytest.mark.parametrize(
+        ("caller_rank", "caller_experience", "last_line"),
+        [
+            (None, None, "You are not ranked yet, complete a quest to earn experience"),
+            (7, 5, "You are ranked 7 with 5 XP"),
+        ],
+    )
+    def test_caller_outside_top(self, caller_rank, caller_experience, last_line):
+        # Act
+        board = format_leaderboard([(1, 50)], 9, caller_rank, caller_experience)
+        # Assert
+        assert board.split("\n")[-1] == last_line
+
+
+class TestFormatMenu:
+    def test_format_menu(self):
+        # Arrange
+        menu = Menu(
+            server_id=1, start_date=date(2024, 6, 6), items=[MenuItem(food="test", day_of_the_week=DayOfWeek.MONDAY)]
+        )
+        # Act
+        menu_text = format_menu(menu)
+        # Assert
+        assert menu_text == (
+            "Menu for the week of Jun 06, 2024\n"
+            "**Sunday**:\n"
+            "  No items available.\n"
+            "**Monday**:\n"
+            "  - Test\n"
+            "**Tuesday**:\n"
+            "  No items available.\n"
+            "**Wednesday**:\n"
+            "  No items available.\n"
+            "**Thursday**:\n"
+            "  No items available.\n"
+            "**Friday**:\n"
+            "  No items available.\n"
+            "**Saturday**:\n"
+            "  No items available."
+        )
+
+
+class TestPaginateTales:
+    def test_base_case(self):
+        # Act & Assert
+        assert paginate_tales([]) == [NO_MATCHING_TALES]
+
+    def test_tales_kept_in_order(self):
+        # Arrange
+        tales = [BardTale(name=f"tale {i}", story="once upon a time " * 20, theme_id=1) for i in range(30)]
+        # Act
+        pages = paginate_tales(tales, 500)
+        # Assert
+        assert len(pages) > 1
+        assert all(len(page) <= 500 for page in pages)
+        assert [line for page in pages for line in page.split("\n") if line.startswith("**")] == [
+            f"**Tale {i}**" for i in range(30)
+        ]
+
+    def test_long_story_cut_short(self):
+        # Arrange
+        tales = [
+            BardTale(name="epic", story="and then " * 100, theme_id=1),
+            BardTale(name="short", story="the end", theme_id=1),
+        ]
+        # Act
+        pages = paginate_tales(tales, 200)
+        # Assert
+        assert len(pages[0]) == 200
+        assert pages[0].endswith("...")
+        assert pages[1] == "**Short**\nthe end"
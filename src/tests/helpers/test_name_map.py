@@ -0,0 +1,57 @@
+from unittest.mock import patch
+
+import pytest
+
+from src.helpers.name_map import NameMap
+
+
+class TestNameMap:
+    @pytest.fixture
+    def name_map(self):
+        name_map: NameMap[int] = NameMap()
+        name_map.build([("Mystery", 1), ("Romance", 2), ("ROMANCE", 3)])
+        return name_map
+
+    @pytest.mark.parametrize(
+        ("name", "expected"),
+        [("mystery", [1]), ("MYSTERY", [1]), ("romance", [2, 3]), ("Horror", [])],
+    )
+    def test_get(self, name_map, name, expected):
+        # Act & Assert
+        assert name_map.get(name) == expected
+
+    def test_rebuild_replaces_values(self, name_map):
+        # Act
+        name_map.build([("Horror", 4)])
+        # Assert
+        assert (name_map.get("mystery"), name_map.get("horror")) == ([], [4])
+        assert len(name_map) == 1
+
+    def test_freshness(self):
+        # Arrange
+        name_map: NameMap[int] = NameMap(max_age=10)
+        # Act
+        with patch("src.helpers.name_map.monotonic", side_effect=[100.0, 105.0, 111.0]):
+            name_map.build([("Mystery", 1)])
+            fresh_results = [name_map.is_fresh, name_map.is_fresh]
+        # Assert
+        assert fresh_results == [True, False]
+
+    def test_can_rebuild_after_min_age(self):
+        # Arrange
+        name_map: NameMap[int] = NameMap(min_age=10)
+        can_rebuild_before_build = name_map.can_rebuild
+        # Act
+        with patch("src.helpers.name_map.monotonic", side_effect=[100.0, 105.0, 110.0]):
+            name_map.build([("Mystery", 1)])
+            can_rebuild_results = [name_map.can_rebuild, name_map.can_rebuild]
+        # Assert
+        assert can_rebuild_before_build
+        assert can_rebuild_results == [False, True]
+
+    def test_cleared_map_is_not_fresh(self, name_map):
+        # Act
+        name_map.clear()
+        # Assert
+        assert not name_map.is_fresh
+        assert len(name_map) == 0
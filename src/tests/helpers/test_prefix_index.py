@@ -0,0 +1,48 @@
+from unittest.mock import patch
+
+import pytest
+
+from src.helpers.prefix_index import PrefixIndex
+
+
+class TestPrefixIndex:
+    @pytest.fixture
+    def prefix_index(self):
+        prefix_index = PrefixIndex()
+        prefix_index.build(["Slay the dragon", "slay a goblin", "Save the village", "Sleep", "Slay the dragon"])
+        return prefix_index
+
+    @pytest.mark.parametrize(
+        ("prefix", "expected"),
+        [
+            ("sla", ["slay a goblin", "Slay the dragon"]),
+            ("SLAY THE", ["Slay the dragon"]),
+            ("s", ["Save the village", "slay a goblin", "Slay the dragon", "Sleep"]),
+            ("", ["Save the village", "slay a goblin", "Slay the dragon", "Sleep"]),
+            ("x", []),
+        ],
+    )
+    def test_search(self, prefix_index, prefix, expected):
+        # Act & Assert
+        assert prefix_index.search(prefix, 25) == expected
+
+    def test_search_limit(self, prefix_index):
+        # Act & Assert
+        assert prefix_index.search("s", 2) == ["Save the village", "slay a goblin"]
+
+    def test_freshness(self):
+        # Arrange
+        prefix_index = PrefixIndex(max_age=10)
+        # Act
+        with patch("src.helpers.prefix_index.monotonic", side_effect=[100.0, 105.0, 111.0]):
+            prefix_index.build(["Quest"])
+            fresh_results = [prefix_index.is_fresh, prefix_index.is_fresh]
+        # Assert
+        assert fresh_results == [True, False]
+
+    def test_cleared_index_is_not_fresh(self, prefix_index):
+        # Act
+        prefix_index.clear()
+        # Assert
+        assert not prefix_index.is_fresh
+        assert len(prefix_index) == 0
@@ -0,0 +1,36 @@
+import pytest
+
+from src.helpers.ranking import Ranking
+
+
+class TestRanking:
+    @pytest.fixture
+    def ranking(self):
+        return Ranking([(1, 50), (2, 120), (3, 50), (4, 10)])
+
+    def test_top(self, ranking):
+        # Act
+        top = ranking.top(3)
+        # Assert
+        assert top == [(2, 120), (1, 50), (3, 50)]
+
+    @pytest.mark.parametrize(("member_id", "rank"), [(2, 1), (1, 2), (3, 2), (4, 4), (5, None)])
+    def test_get_rank(self, ranking, member_id, rank):
+        # Act & Assert
+        assert ranking.get_rank(member_id) == rank
+
+    def test_set_score_moves_member(self, ranking):
+        # Act
+        ranking.set_score(4, 200)
+        # Assert
+        assert ranking.top(2) == [(4, 200), (2, 120)]
+        assert ranking.get_rank(2) == 2
+        assert len(ranking) == 4
+
+    def test_set_score_adds_member(self, ranking):
+        # Act
+        ranking.set_score(5, 60)
+        # Assert
+        assert ranking.get_rank(5) == 2
+        assert ranking.get_score(5) == 60
+        assert 5 in ranking
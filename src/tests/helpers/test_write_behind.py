@@ -0,0 +1,210 @@
+import asyncio
+import json
+
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.helpers.write_behind import WriteBehindQueue
+
+
+def read_spool(write_queue):
+    return [json.loads(line) for line in write_queue.spool_path.read_text(encoding="utf-8").splitlines()]
+
+
+class TestWriteBehindQueue:
+    @pytest.fixture
+    def write_batch(self):
+        return AsyncMock()
+
+    @pytest.fixture
+    async def write_queue(self, write_batch, tmp_path):
+        write_queue = WriteBehindQueue(write_batch, tmp_path / "spool" / "records.jsonl", max_batch_size=2)
+        await write_queue.start()
+        yield write_queue
+        await write_queue.close()
+
+    async def test_put_resolves_once_spooled(self, write_queue, write_batch):
+        # Act
+        spooled = write_queue.put({"id": 1})
+        # Assert
+        assert not spooled.done()
+        await spooled
+        assert len(write_queue) == 1
+        assert read_spool(write_queue) == [{"id": 1}]
+        write_batch.assert_not_awaited()
+
+    async def test_records_put_together_are_spooled_together(self, write_queue, monkeypatch):
+        # Arrange
+        synced_batches = []
+        monkeypatch.setattr(
+            "src.helpers.write_behind._write_and_sync", lambda _spool, lines: synced_batches.append(len(lines))
+        )
+        # Act
+        await asyncio.gather(*(write_queue.put({"id": record_id}) for record_id in range(3)))
+        # Assert
+        assert synced_batches == [3]
+
+    async def test_put_raises_if_spooling_fails(self, write_queue, monkeypatch):
+        # Arrange
+        def fail_to_sync(_spool, _lines):
+            raise OSError("disk full")
+
+        monkeypatch.setattr("src.helpers.write_behind._write_and_sync", fail_to_sync)
+        # Act & Assert
+        with pytest.raises(OSError, match="disk full"):
+            await write_queue.put({"id": 1})
+        assert len(write_queue) == 1
+
+    async def test_flush_spools_then_writes_batches(self, write_queue, write_batch):
+        # Arrange
+        for record_id in range(3):
+            write_queue.put({"id": record_id})
+        write_batch.side_effect = lambda _: spooled.append(read_spool(write_queue))
+        spooled = []
+        # Act
+        await write_queue.flush()
+        # Assert
+        assert [call.args[0] for call in write_batch.await_args_list] == [[{"id": 0}, {"id": 1}], [{"id": 2}]]
+        assert spooled[0] == [{"id": 0}, {"id": 1}, {"id": 2}]
+        stats = write_queue.get_stats()
+        assert (stats.queue_depth, stats.written, stats.flush_latency.count) == (0, 3, 2)
+
+    async def test_spool_compacted_once_written_records_build_up(self, write_batch, tmp_path):
+        # Arrange
+        write_queue = WriteBehindQueue(
+            write_batch, tmp_path / "records.jsonl", flush_interval_ms=60_000, compact_after=3
+        )
+        await write_queue.start()
+        write_queue.put({"id": 1})
+        write_queue.put({"id": 2})
+        await write_queue.flush()
+        spool_before_compaction = read_spool(write_queue)
+        write_queue.put({"id": 3})
+        # Act
+        await write_queue.flush()
+        # Assert
+        assert spool_before_compaction == [{"id": 1}, {"id": 2}]
+        assert read_spool(write_queue) == []
+        await write_queue.close()
+
+    async def test_failed_write_keeps_records(self, write_queue, write_batch):
+        # Arrange
+        write_batch.side_effect = ConnectionError
+        write_queue.put({"id": 1})
+        # Act
+        with pytest.raises(ConnectionError):
+            await write_queue.flush()
+        # Assert
+        assert len(write_queue) == 1
+        assert read_spool(write_queue) == [{"id": 1}]
+        assert write_queue.get_stats().failed_flushes == 1
+
+    async def test_failed_batch_is_written_a_record_at_a_time(self, write_queue, write_batch):
+        # Arrange
+        async def reject_bad_records(batch):
+            if any(record.get("bad") for record in batch):
+                raise ValueError("bad record")
+
+        write_batch.side_effect = reject_bad_records
+        write_queue.put({"id": 1, "bad": True})
+        write_queue.put({"id": 2})
+        # Act
+        with pytest.raises(ValueError, match="bad record"):
+            await write_queue.flush()
+        # Assert
+        assert [call.args[0] for call in write_batch.await_args_list][-1] == [{"id": 2}]
+        stats = write_queue.get_stats()
+        assert (stats.queue_depth, stats.written, stats.failed_flushes) == (1, 1, 1)
+
+    async def test_record_is_dead_lettered_after_max_attempts(self, write_batch, tmp_path):
+        # Arrange
+        write_batch.side_effect = ValueError("bad record")
+        write_queue = WriteBehindQueue(
+            write_batch, tmp_path / "records.jsonl", flush_interval_ms=60_000, max_attempts=2
+        )
+        await write_queue.start()
+        write_queue.put({"id": 1})
+        with pytest.raises(ValueError, match="bad record"):
+            await write_queue.flush()
+        # Act
+        await write_queue.flush()
+        # Assert
+        assert write_queue.dead_letter_path == tmp_path / "records.dead.jsonl"
+        assert write_queue.dead_letter_path.read_text(encoding="utf-8") == '{"id": 1}\n'
+        stats = write_queue.get_stats()
+        assert (stats.queue_depth, stats.dead_lettered, stats.failed_flushes) == (0, 1, 2)
+        await write_queue.close()
+        assert read_spool(write_queue) == []
+
+    async def test_full_batch_is_flushed_in_background(self, write_batch, tmp_path):
+        # Arrange
+        write_queue = WriteBehindQueue(
+            write_batch, tmp_path / "records.jsonl", max_batch_size=2, flush_interval_ms=60_000
+        )
+        await write_queue.start()
+        # Act
+        write_queue.put({"id": 1})
+        write_queue.put({"id": 2})
+        await asyncio.sleep(0.01)
+        # Assert
+        write_batch.assert_awaited_once_with([{"id": 1}, {"id": 2}])
+        await write_queue.close()
+
+    async def test_close_writes_queued_records(self, write_batch, tmp_path):
+        # Arrange
+        write_queue = WriteBehindQueue(write_batch, tmp_path / "records.jsonl", flush_interval_ms=60_000)
+        await write_queue.start()
+        write_queue.put({"id": 1})
+        # Act
+        await write_queue.close()
+        # Assert
+        write_batch.assert_awaited_once_with([{"id": 1}])
+        assert not write_queue.is_running
+        assert read_spool(write_queue) == []
+
+    async def test_records_are_spooled_while_backing_off(self, write_batch, tmp_path):
+        # Arrange
+        write_batch.side_effect = ConnectionError
+        write_queue = WriteBehindQueue(write_batch, tmp_path / "records.jsonl", flush_interval_ms=100)
+        await write_queue.start()
+        write_queue.put({"id": 1})
+        with pytest.raises(ConnectionError):
+            await write_queue.flush()
+        # Act
+        write_queue.put({"id": 2})
+        await asyncio.sleep(0.13)
+        # Assert
+        write_batch.assert_awaited_once()
+        assert read_spool(write_queue) == [{"id": 1}, {"id": 2}]
+        await write_queue.close()
+
+    async def test_close_leaves_unwritten_records_in_spool(self, write_batch, tmp_path):
+        # Arrange
+        write_batch.side_effect = ConnectionError
+        write_queue = WriteBehindQueue(write_batch, tmp_path / "records.jsonl", flush_interval_ms=60_000)
+        await write_queue.start()
+        write_queue.put({"id": 1})
+        # Act
+        await write_queue.close()
+        # Assert
+        assert read_spool(write_queue) == [{"id": 1}]
+
+    async def test_start_queues_spooled_records(self, write_batch, tmp_path):
+        # Arrange
+        spool_path = tmp_path / "records.jsonl"
+        spool_path.write_text('{"id": 1}\n{"id": 2}\n', encoding="utf-8")
+        write_queue = WriteBehindQueue(write_batch, spool_path, flush_interval_ms=60_000)
+        # Act
+        await write_queue.start()
+        await write_queue.close()
+        # Assert
+        write_batch.assert_awaited_once_with([{"id": 1}, {"id": 2}])
+        assert spool_path.read_text(encoding="utf-8") == ""
+
+    def test_put_before_start(self, write_batch, tmp_path):
+        # Arrange
+        write_queue = WriteBehindQueue(write_batch, tmp_path / "records.jsonl")
+        # Act & Assert
+        with pytest.raises(RuntimeError):
+            write_queue.put({"id": 1})
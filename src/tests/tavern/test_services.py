@@ -1,16 +1,28 @@
+from datetime import date
+from datetime import timedelta
 from unittest.mock import AsyncMock
 from unittest.mock import MagicMock
 
 import pytest
 
+from sqlalchemy import bindparam
+from sqlmodel import col
+from sqlmodel import desc
+from sqlmodel import select
+
 from src.constants import DayOfWeek
 from src.factories import ThemeFactory
+from src.helpers.caching import LRUCache
 from src.repositories import AsyncRepository
+from src.repositories import UnitOfWork
 from src.tavern import BardTale
 from src.tavern import Menu
 from src.tavern import TavernService
 from src.tavern.exceptions import NoMenuItemFoundError
 from src.tavern.models import MenuItem
+from src.tavern.services import _TALE_SEARCH_FILTER
+from src.tavern.services import _THIS_WEEK_FILTER
+from src.tavern.services import _seconds_until_menu_changes
 
 
 class TestDeleteMenuItem:
@@ -51,6 +63,86 @@ class TestDeleteMenuItem:
         menu_item_repository.delete.assert_called_with(menu_item)
 
 
+class TestRenderedMenu:
+    @pytest.fixture
+    def menu(self):
+        return Menu(
+            server_id=1, start_date=date.today(), items=[MenuItem(food="stew", day_of_the_week=DayOfWeek.MONDAY)]
+        )
+
+    @pytest.fixture
+    def menu_repository(self, menu):
+        # Outside a unit of work the write has committed by the time after_commit is called
+        return AsyncMock(
+            get_first=AsyncMock(return_value=menu), after_commit=MagicMock(side_effect=lambda callback: callback())
+        )
+
+    @pytest.fixture
+    def tavern_service(self, menu_repository):
+        return TavernService(
+            repository_factory=MagicMock(return_value=menu_repository),
+            menu_model=Menu,
+            menu_item_model=MenuItem,
+            menu_cache=LRUCache(max_size=10),
+        )
+
+    async def test_menu_is_rendered_once(self, tavern_service, menu_repository):
+        # Act
+        first_menu = await tavern_service.get_this_weeks_rendered_menu(1)
+        second_menu = await tavern_service.get_this_weeks_rendered_menu(1)
+        # Assert
+        assert first_menu is second_menu
+        assert first_menu.foods_by_day[DayOfWeek.MONDAY] == ["stew"]
+        assert first_menu.text.startswith("Menu for the week of")
+        menu_repository.get_first.assert_called_once()
+        assert menu_repository.get_first.call_args.args[0].use_primary
+
+    async def test_missing_menu_is_cached(self, tavern_service, menu_repository):
+        # Arrange
+        menu_repository.get_first.return_value = None
+        # Act
+        menus = [await tavern_service.get_this_weeks_rendered_menu(1) for _ in range(2)]
+        # Assert
+        assert menus == [None, None]
+        menu_repository.get_first.assert_called_once()
+
+    async def test_writing_menu_invalidates_it(self, tavern_service, menu_repository, menu):
+        # Arrange
+        await tavern_service.get_this_weeks_rendered_menu(1)
+        menu_repository.get_first.return_value = Menu(server_id=1, start_date=date.today(), items=[])
+        # Act
+        await tavern_service.delete_menu_item(menu, "stew", DayOfWeek.MONDAY)
+        rendered_menu = await tavern_service.get_this_weeks_rendered_menu(1)
+        # Assert
+        assert rendered_menu.foods_by_day[DayOfWeek.MONDAY] == []
+        assert menu_repository.get_first.call_count == 2
+
+    async def test_menu_is_invalidated_once_write_commits(self, tavern_service, menu_repository, menu):
+        # Arrange
+        after_commit = []
+        menu_repository.after_commit.side_effect = after_commit.append
+        first_menu = await tavern_service.get_this_weeks_rendered_menu(1)
+        # Act
+        await tavern_service.delete_menu_item(menu, "stew", DayOfWeek.MONDAY)
+        menu_before_commit = await tavern_service.get_this_weeks_rendered_menu(1)
+        for callback in after_commit:
+            callback()
+        menu_after_commit = await tavern_service.get_this_weeks_rendered_menu(1)
+        # Assert
+        assert menu_before_commit is first_menu
+        assert menu_after_commit is not first_menu
+        assert menu_repository.get_first.call_count == 2
+
+    @pytest.mark.parametrize(("days_ago", "max_days_left"), [(0, 8), (7, 1)])
+    def test_menu_expires_after_its_week(self, days_ago, max_days_left):
+        # Arrange
+        menu = Menu(server_id=1, start_date=date.today() - timedelta(days=days_ago))
+        # Act
+        seconds_left = _seconds_until_menu_changes(menu)
+        # Assert
+        assert (max_days_left - 1) * 86400 < seconds_left <= max_days_left * 86400
+
+
 class TestGetRandomTaleByTheme:
     @pytest.fixture
     def mocked_tavern_service(self, db_session):
@@ -66,3 +158,201 @@ class TestGetRandomTaleByTheme:
         db_session.commit()
         # Act && Assert
         assert not await mocked_tavern_service.get_random_tale_by_theme(theme)
+
+    @pytest.fixture
+    def cached_tavern_service(self, db_session):
+        return TavernService(
+            repository_factory=lambda model, **_: AsyncRepository(MagicMock(return_value=db_session), model),
+            tale_ids_cache=LRUCache(max_size=10),
+            bard_tale_model=BardTale,
+        )
+
+    @pytest.fixture
+    async def told_tales(self, db_session, theme_factory: type[ThemeFactory]):
+        theme = theme_factory.build()
+        other_theme = theme_factory.build()
+        tales = [BardTale(name=f"Tale {index}", story=f"Story {index}", theme=theme) for index in range(3)]
+        db_session.add_all([*tales, BardTale(name="Other tale", story="Other story", theme=other_theme)])
+        await db_session.flush()
+        return theme, tales
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_tale_picked_from_theme(self, cached_tavern_service, told_tales):
+        # Arrange
+        theme, tales = told_tales
+        # Act
+        picked_tales = {(await cached_tavern_service.get_random_tale_by_theme(theme)).id for _ in range(20)}
+        # Assert
+        assert picked_tales <= {tale.id for tale in tales}
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_tales_by_theme_read_a_page_at_a_time(self, cached_tavern_service, told_tales):
+        # Arrange
+        theme, tales = told_tales
+        # Act
+        first_page = await cached_tavern_service.get_tales_by_theme(theme, page_size=2)
+        last_page = await cached_tavern_service.get_tales_by_theme(theme, after_id=first_page[-1].id, page_size=2)
+        # Assert
+        assert [*first_page, *last_page] == tales
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_tale_ids_cached(self, cached_tavern_service, told_tales, mocker):
+        # Arrange
+        theme, _ = told_tales
+        get_ids = mocker.spy(cached_tavern_service._repositories.bard_tale, "get_all_with_entities")
+        # Act
+        await cached_tavern_service.get_random_tale_by_theme(theme)
+        await cached_tavern_service.get_random_tale_by_theme(theme)
+        # Assert
+        get_ids.assert_awaited_once()
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_told_tale_drops_cached_ids(self, cached_tavern_service, told_tales, mocker):
+        # Arrange
+        theme, _ = told_tales
+        await cached_tavern_service.get_random_tale_by_theme(theme)
+        mocker.patch("src.tavern.services.random.choice", side_effect=lambda tale_ids: max(tale_ids))
+        # Act
+        new_tale = await cached_tavern_service.create_bard_tale("New tale", "New story", theme)
+        tale = await cached_tavern_service.get_random_tale_by_theme(theme)
+        # Assert
+        assert tale == new_tale
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_told_tale_drops_cached_ids_once_committed(self, cached_tavern_service, told_tales, db_session):
+        # Arrange
+        theme, tales = told_tales
+        await cached_tavern_service.get_random_tale_by_theme(theme)
+        tale_ids_cache = cached_tavern_service._tale_ids_cache
+        # Act
+        async with UnitOfWork(MagicMock(return_value=db_session)):
+            await cached_tavern_service.create_bard_tale("New tale", "New story", theme)
+            cached_before_commit = tale_ids_cache.get(theme.id)
+        # Assert
+        assert cached_before_commit == [tale.id for tale in tales]
+        assert tale_ids_cache.get(theme.id) is None
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_deleted_tale_picked_again(self, cached_tavern_service, told_tales, db_session, mocker):
+        # Arrange
+        theme, tales = told_tales
+        await cached_tavern_service.get_random_tale_by_theme(theme)
+        await db_session.delete(tales[-1])
+        await db_session.flush()
+        mocker.patch("src.tavern.services.random.choice", side_effect=lambda tale_ids: max(tale_ids))
+        # Act
+        tale = await cached_tavern_service.get_random_tale_by_theme(theme)
+        # Assert
+        assert tale == tales[-2]
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio(loop_scope="session")
+class TestGetThisWeeksMenu:
+    @pytest.fixture
+    def tavern_service(self, db_session):
+        return TavernService(
+            repository_factory=lambda model, **_: AsyncRepository(MagicMock(return_value=db_session), model),
+            menu_model=Menu,
+        )
+
+    @pytest.mark.parametrize(("start_days_ago", "expected_days_ago"), [([8, 7, 2], 2), ([30, 8], None), ([-1], None)])
+    async def test_latest_menu_started_within_a_week(
+        self, db_session, tavern_service, start_days_ago, expected_days_ago
+    ):
+        # Arrange
+        db_session.add_all(
+            [Menu(server_id=1, start_date=date.today() - timedelta(days=days_ago)) for days_ago in start_days_ago]
+        )
+        db_session.add(Menu(server_id=2, start_date=date.today()))
+        await db_session.flush()
+        # Act
+        menu = await tavern_service.get_this_weeks_menu(1)
+        # Assert
+        if expected_days_ago is None:
+            assert menu is None
+        else:
+            assert (menu.server_id, menu.start_date) == (1, date.today() - timedelta(days=expected_days_ago))
+
+    async def test_lookup_uses_index(self, explain_plan):
+        # Arrange
+        statement = (
+            select(Menu)
+            .where(col(Menu.server_id) == bindparam("menu_server_id"), _THIS_WEEK_FILTER)
+            .order_by(desc(Menu.start_date))
+            .limit(1)
+        )
+        today = date.today()
+        # Act
+        plan = await explain_plan(
+            statement, {"menu_server_id": 1, "earliest_start_date": today - timedelta(days=7), "today": today}
+        )
+        # Assert
+        assert "ix_menu_server_id_start_date" in plan
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio(loop_scope="session")
+class TestSearchTales:
+    @pytest.fixture
+    def tavern_service(self, db_session):
+        return TavernService(
+            repository_factory=lambda model, **_: AsyncRepository(MagicMock(return_value=db_session), model),
+            bard_tale_model=BardTale,
+        )
+
+    @pytest.fixture
+    async def told_tales(self, db_session, theme_factory: type[ThemeFactory]):
+        theme = theme_factory.build()
+        tales = [
+            BardTale(name="The sleeping dragon", story="A dragon slept beneath the mountain", theme=theme),
+            BardTale(name="The lost ring", story="A ring was found in a dragon's hoard", theme=theme),
+            BardTale(name="The drowned king", story="A king sank beneath the waves", theme=theme),
+        ]
+        db_session.add_all(tales)
+        await db_session.flush()
+        return tales
+
+    async def test_matches_ranked_by_name_then_story(self, tavern_service, told_tales):
+        # Act
+        tales = await tavern_service.search_tales("dragons", limit=10)
+        # Assert
+        assert tales == told_tales[:2]
+
+    async def test_search_terms_limited(self, tavern_service, told_tales):
+        # Act
+        tales = await tavern_service.search_tales('beneath -"dragon"', limit=1)
+        # Assert
+        assert tales == [told_tales[2]]
+
+    async def test_upserted_tales_are_searchable(self, db_session, tavern_service, told_tales):
+        # Arrange
+        repository = AsyncRepository(MagicMock(return_value=db_session), BardTale)
+        drowned_king = told_tales[2]
+        retold_tale = BardTale(
+            id=drowned_king.id,
+            name=drowned_king.name,
+            story="A king sailed past the edge",
+            theme_id=drowned_king.theme_id,
+        )
+        new_tale = BardTale(name="The sailing bard", story="A bard sang to the sea", theme_id=drowned_king.theme_id)
+        # Act
+        await repository.upsert([retold_tale], index_elements=["id"])
+        await repository.upsert([new_tale], index_elements=["id"])
+        tales = await tavern_service.search_tales("sail", limit=10)
+        # Assert
+        assert {tale.name for tale in tales} == {"The drowned king", "The sailing bard"}
+
+    async def test_search_uses_index(self, explain_plan):
+        # Arrange
+        statement = select(BardTale).where(_TALE_SEARCH_FILTER)
+        # Act
+        plan = await explain_plan(statement, {"tale_search_terms": "dragon"})
+        # Assert
+        assert "ix_bard_tale_search_vector" in plan
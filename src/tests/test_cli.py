@@ -0,0 +1,88 @@
+import json
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from sqlmodel import col
+from sqlmodel import select
+
+from src.cli import _parse_args
+from src.cli import export_quests
+from src.cli import import_quests
+from src.constants import DataFileFormat
+from src.quests import Quest
+from src.quests import UserQuest
+from src.quests.services import QuestService
+from src.repositories import AsyncRepository
+
+
+class TestParseArgs:
+    @pytest.mark.parametrize(
+        ("args", "file_format"),
+        [
+            (["import", "quests.csv"], DataFileFormat.CSV),
+            (["export", "quests.txt", "--format", "jsonl"], DataFileFormat.JSONL),
+        ],
+    )
+    def test_file_format(self, args, file_format):
+        # Act & Assert
+        assert _parse_args(args).file_format is file_format
+
+    def test_unknown_extension_is_a_usage_error(self, capsys):
+        # Act
+        with pytest.raises(SystemExit):
+            _parse_args(["import", "quests.txt"])
+        # Assert
+        assert "jsonl, csv" in capsys.readouterr().err
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio(loop_scope="session")
+class TestQuestImportExport:
+    @pytest.fixture
+    def quest_service(self, db_session):
+        return QuestService(
+            repository_factory=lambda model, **_: AsyncRepository(MagicMock(return_value=db_session), model),
+            quest_model=Quest,
+            user_quest_model=UserQuest,
+        )
+
+    @staticmethod
+    async def get_quests(db_session):
+        quests = await db_session.exec(select(Quest).order_by(col(Quest.name)))
+        return [(quest.name, quest.experience, quest.max_completion_count) for quest in quests]
+
+    async def test_import_upserts_on_name(self, db_session, quest_service, tmp_path):
+        # Arrange
+        db_session.add(Quest(name="slay the dragon", experience=10))
+        await db_session.flush()
+        quest_path = tmp_path / "quests.jsonl"
+        rows = [
+            {"name": "Slay the Dragon", "experience": 100, "max_completion_count": 1},
+            {"name": "Save the village", "experience": 20, "max_completion_count": None},
+            {"name": "save the village", "experience": 30, "max_completion_count": None},
+        ]
+        quest_path.write_text("".join(f"{json.dumps(row)}\n" for row in rows), encoding="utf-8")
+        # Act
+        row_count = await import_quests(quest_path, DataFileFormat.JSONL, batch_size=2, quest_service=quest_service)
+        # Assert
+        assert row_count == 3
+        assert await self.get_quests(db_session) == [("save the village", 30, None), ("slay the dragon", 100, 1)]
+
+    async def test_csv_round_trip(self, db_session, quest_service, tmp_path):
+        # Arrange
+        db_session.add_all(
+            [Quest(name="capped", experience=10, max_completion_count=2), Quest(name="uncapped", experience=5)]
+        )
+        await db_session.flush()
+        quest_path = tmp_path / "quests.csv"
+        # Act
+        exported_count = await export_quests(quest_path, DataFileFormat.CSV, quest_service=quest_service)
+        imported_count = await import_quests(quest_path, DataFileFormat.CSV, quest_service=quest_service)
+        # Assert
+        assert (exported_count, imported_count) == (2, 2)
+        header, *lines = quest_path.read_text(encoding="utf-8").splitlines()
+        assert header == "name,experience,max_completion_count"
+        assert sorted(lines) == ["capped,10,2", "uncapped,5,"]
+        assert await self.get_quests(db_session) == [("capped", 10, 2), ("uncapped", 5, None)]
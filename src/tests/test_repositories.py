@@ -1,10 +1,18 @@
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+
 import pytest
 
+from sqlalchemy import bindparam
 from sqlalchemy import inspect
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.helpers.sqlalchemy_helpers import QueryArgs
+from src.helpers.sqlalchemy_helpers import StatementCache
 from src.models import User
 from src.quests import ExperienceTransaction
+from src.repositories import AsyncRepository
+from src.repositories import UnitOfWork
 
 
 class TestUserRepository:
@@ -67,6 +75,264 @@ class TestUserRepository:
             QueryArgs(having=[User.id == 1])
 
 
+class TestStatementCache:
+    @pytest.fixture
+    def statement_cache(self, mock_user_repository):
+        mock_user_repository.statement_cache = StatementCache(max_size=10)
+        return mock_user_repository.statement_cache
+
+    def test_same_shape_shares_statement(self, mock_user_repository, statement_cache):
+        # Act
+        first, first_params = mock_user_repository._statement(QueryArgs(filter_dict={"discord_id": 1}))
+        second, second_params = mock_user_repository._statement(QueryArgs(filter_dict={"discord_id": 2}))
+        # Assert
+        assert first is second
+        assert first_params == {"filter_dict_discord_id": 1}
+        assert second_params == {"filter_dict_discord_id": 2}
+        assert (statement_cache.stats.hits, statement_cache.stats.misses) == (1, 1)
+
+    @pytest.mark.parametrize(
+        "other_args",
+        [
+            QueryArgs(filter_dict={"id": 1}),
+            QueryArgs(filter_dict={"discord_id": 1}, limit=1),
+            QueryArgs(filter_dict={"discord_id": None}),
+            QueryArgs(filter_dict={"discord_id": 1}, order_by=[User.id]),
+        ],
+    )
+    def test_different_shape_builds_new_statement(self, mock_user_repository, statement_cache, other_args):
+        # Act
+        first, _ = mock_user_repository._statement(QueryArgs(filter_dict={"discord_id": 1}))
+        second, _ = mock_user_repository._statement(other_args)
+        # Assert
+        assert first is not second
+        assert statement_cache.stats.misses == 2
+
+    def test_bind_placeholders_are_cached(self, mock_user_repository, statement_cache):
+        # Arrange
+        user_filter = User.discord_id > bindparam("minimum_id")
+        # Act
+        first, first_params = mock_user_repository._statement(
+            QueryArgs(filter_list=[user_filter], params={"minimum_id": 1})
+        )
+        second, second_params = mock_user_repository._statement(
+            QueryArgs(filter_list=[User.discord_id > bindparam("minimum_id")], params={"minimum_id": 2})
+        )
+        # Assert
+        assert first is second
+        assert (first_params, second_params) == ({"minimum_id": 1}, {"minimum_id": 2})
+        assert statement_cache.stats.hits == 1
+
+    def test_literal_values_bypass_cache(self, mock_user_repository, statement_cache):
+        # Act
+        first, _ = mock_user_repository._statement(QueryArgs(filter_list=[User.discord_id == 1]))
+        second, _ = mock_user_repository._statement(QueryArgs(filter_list=[User.discord_id == 2]))
+        # Assert
+        assert first is not second
+        assert statement_cache.bypasses == 2
+        assert statement_cache.stats.size == 0
+
+    def test_keyset_pages_share_statement(self, mock_user_repository, statement_cache):
+        # Act
+        first, first_params = mock_user_repository._statement(QueryArgs(after_id=1, page_size=10))
+        second, second_params = mock_user_repository._statement(QueryArgs(after_id=11, page_size=10))
+        # Assert
+        assert first is second
+        assert (first_params, second_params) == ({"keyset_after_id": 1}, {"keyset_after_id": 11})
+        assert statement_cache.stats.hits == 1
+
+
+class TestKeysetPagination:
+    def test_after_id_filters_and_orders_by_id(self, mock_user_repository):
+        # Act
+        query = str(mock_user_repository._query(QueryArgs(after_id=1, page_size=10)))
+        # Assert
+        assert '"user".id > :keyset_after_id' in query
+        assert 'ORDER BY "user".id' in query
+        assert "LIMIT" in query
+
+    def test_first_page_has_no_id_filter(self, mock_user_repository):
+        # Act
+        query = str(mock_user_repository._query(QueryArgs(page_size=10)))
+        # Assert
+        assert "keyset_after_id" not in query
+        assert 'ORDER BY "user".id' in query
+
+    def test_params_include_after_id(self):
+        # Arrange
+        query_args = QueryArgs(after_id=5, params={"other": 1})
+        # Act & Assert
+        assert query_args.get_params() == {"other": 1, "keyset_after_id": 5}
+
+    @pytest.mark.parametrize(
+        "query_args",
+        [
+            {"after_id": 1, "order_by": [User.discord_id]},
+            {"page_size": 10, "order_by": [User.discord_id]},
+            {"page_size": 10, "limit": 5},
+        ],
+    )
+    def test_keyset_with_other_ordering_raises(self, query_args):
+        # Act & Assert
+        with pytest.raises(ValueError, match="Keyset pagination"):
+            QueryArgs(**query_args)
+
+
+class TestExists:
+    def test_exists_statement(self, mock_user_repository):
+        # Act
+        query, params = mock_user_repository._exists_statement(QueryArgs(filter_dict={"discord_id": 1}))
+        # Assert
+        assert str(query).startswith("SELECT EXISTS (SELECT")
+        assert "count" not in str(query)
+        assert params == {}
+
+
+@pytest.mark.asyncio
+class TestReadRouting:
+    @pytest.fixture
+    def primary_session(self):
+        return AsyncMock(info={}, exec=AsyncMock(return_value=MagicMock()))
+
+    @pytest.fixture
+    def read_session(self):
+        return AsyncMock(info={}, exec=AsyncMock(return_value=MagicMock()))
+
+    @pytest.fixture
+    def repository(self, primary_session, read_session):
+        return AsyncRepository(
+            MagicMock(return_value=primary_session), User, read_session_factory=MagicMock(return_value=read_session)
+        )
+
+    async def test_reads_use_read_session(self, repository, primary_session, read_session):
+        # Act
+        await repository.get_all()
+        await repository.get_count()
+        await repository.get_by_id(1)
+        # Assert
+        assert read_session.exec.await_count == 2
+        read_session.get.assert_awaited_once()
+        primary_session.exec.assert_not_awaited()
+        primary_session.get.assert_not_awaited()
+
+    async def test_use_primary_per_call(self, repository, primary_session, read_session):
+        # Act
+        await repository.get_first(QueryArgs(use_primary=True))
+        await repository.get_by_id(1, use_primary=True)
+        # Assert
+        primary_session.exec.assert_awaited_once()
+        primary_session.get.assert_awaited_once()
+        read_session.exec.assert_not_awaited()
+
+    async def test_read_from_primary_per_repository(self, repository, primary_session, read_session):
+        # Arrange
+        repository.read_from_primary = True
+        # Act
+        await repository.get_all()
+        # Assert
+        primary_session.exec.assert_awaited_once()
+        read_session.exec.assert_not_awaited()
+
+    async def test_reads_in_unit_of_work_use_primary(self, repository, primary_session, read_session):
+        # Act
+        async with UnitOfWork(MagicMock(return_value=primary_session)):
+            await repository.get_all()
+        # Assert
+        primary_session.exec.assert_awaited_once()
+        read_session.exec.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+class TestUnitOfWork:
+    @pytest.fixture
+    def session(self):
+        return AsyncMock(info={}, add=MagicMock())
+
+    @pytest.fixture
+    def repository(self, session):
+        return AsyncRepository(MagicMock(return_value=session), User)
+
+    async def test_repository_commits_outside_unit_of_work(self, repository, session):
+        # Act
+        await repository.add(User(discord_id=1))
+        # Assert
+        session.commit.assert_awaited_once()
+        session.flush.assert_not_awaited()
+
+    async def test_repository_flushes_inside_unit_of_work(self, repository, session):
+        # Act
+        async with UnitOfWork(MagicMock(return_value=session)):
+            await repository.add(User(discord_id=1))
+            await repository.update()
+            # Assert
+            session.commit.assert_not_awaited()
+            assert session.flush.await_count == 2
+        session.commit.assert_awaited_once()
+        assert session.info == {}
+
+    async def test_rolls_back_on_exception(self, repository, session):
+        # Arrange
+        async def failing_work():
+            async with UnitOfWork(MagicMock(return_value=session)):
+                await repository.add(User(discord_id=1))
+                raise ValueError("failed")
+
+        # Act
+        with pytest.raises(ValueError, match="failed"):
+            await failing_work()
+        # Assert
+        session.rollback.assert_awaited_once()
+        session.commit.assert_not_awaited()
+
+    async def test_only_outermost_unit_of_work_commits(self, session):
+        # Arrange
+        session_factory = MagicMock(return_value=session)
+        # Act
+        async with UnitOfWork(session_factory):
+            async with UnitOfWork(session_factory):
+                pass
+            # Assert
+            session.commit.assert_not_awaited()
+        session.commit.assert_awaited_once()
+
+    async def test_after_commit_runs_straight_away_outside_unit_of_work(self, repository):
+        # Arrange
+        callback = MagicMock()
+        # Act
+        repository.after_commit(callback)
+        # Assert
+        callback.assert_called_once_with()
+
+    async def test_after_commit_runs_once_outermost_unit_of_work_commits(self, repository, session):
+        # Arrange
+        session_factory = MagicMock(return_value=session)
+        callback = MagicMock(side_effect=lambda: session.commit.assert_awaited_once())
+        # Act
+        async with UnitOfWork(session_factory):
+            async with UnitOfWork(session_factory):
+                repository.after_commit(callback)
+            # Assert
+            callback.assert_not_called()
+        callback.assert_called_once_with()
+        assert session.info == {}
+
+    async def test_after_commit_is_dropped_on_rollback(self, repository, session):
+        # Arrange
+        callback = MagicMock()
+
+        async def failing_work():
+            async with UnitOfWork(MagicMock(return_value=session)):
+                repository.after_commit(callback)
+                raise ValueError("failed")
+
+        # Act
+        with pytest.raises(ValueError, match="failed"):
+            await failing_work()
+        # Assert
+        callback.assert_not_called()
+        assert session.info == {}
+
+
 def get_user_data_for_query(usr):
     return QueryArgs(filter_dict={"discord_id": usr.discord_id})
 
@@ -130,6 +396,15 @@ class TestBaseRepositoryIntegration:
         # Assert
         assert count == 1
 
+    @pytest.mark.parametrize(("discord_id_offset", "expected"), [(0, True), (1, False)])
+    async def test_exists(self, db_user, mock_user_with_db_repository, discord_id_offset, expected):
+        # Act
+        exists = await mock_user_with_db_repository.exists(
+            QueryArgs(filter_dict={"discord_id": db_user.discord_id + discord_id_offset})
+        )
+        # Assert
+        assert exists is expected
+
     async def test_update(self, db_user, mock_user_with_db_repository, faker):
         # Arrange
         new_id = faker.random_number(digits=18, fix_len=True)
@@ -140,3 +415,116 @@ class TestBaseRepositoryIntegration:
         # Assert
         user = await mock_user_with_db_repository.get_first()
         assert user.discord_id == new_id
+
+    async def test_cached_statement_uses_new_values(self, db_user, mock_user_with_db_repository, faker):
+        # Arrange
+        mock_user_with_db_repository.statement_cache = StatementCache(max_size=10)
+        other_user = User(discord_id=faker.unique.random_number(digits=18, fix_len=True))
+        await mock_user_with_db_repository.add(other_user)
+        # Act
+        first = await mock_user_with_db_repository.get_first(get_user_data_for_query(db_user))
+        second = await mock_user_with_db_repository.get_first(get_user_data_for_query(other_user))
+        # Assert
+        assert (first, second) == (db_user, other_user)
+        assert mock_user_with_db_repository.statement_cache.stats.hits == 1
+
+    async def test_add_all(self, mock_user_with_db_repository, faker):
+        # Arrange
+        users = [User(discord_id=faker.unique.random_number(digits=18, fix_len=True)) for _ in range(3)]
+        # Act
+        await mock_user_with_db_repository.add_all(users)
+        # Assert
+        assert all(user.id for user in users)
+
+    async def test_bulk_insert(self, mock_user_with_db_repository, faker):
+        # Arrange
+        users = [User(discord_id=faker.unique.random_number(digits=18, fix_len=True)) for _ in range(3)]
+        # Act
+        inserted = await mock_user_with_db_repository.bulk_insert(users)
+        # Assert
+        assert [user.discord_id for user in inserted] == [user.discord_id for user in users]
+        assert all(user.id for user in inserted)
+        assert await mock_user_with_db_repository.get_count() == 3
+
+    async def test_upsert_updates_conflicting_rows(self, db_user, mock_user_with_db_repository, faker):
+        # Arrange
+        new_user = User(discord_id=faker.unique.random_number(digits=18, fix_len=True))
+        existing_user = User(discord_id=db_user.discord_id, datetime_edited=faker.date_time())
+        # Act
+        upserted = await mock_user_with_db_repository.upsert([existing_user, new_user], index_elements=["discord_id"])
+        # Assert
+        assert {user.discord_id for user in upserted} == {db_user.discord_id, new_user.discord_id}
+        assert db_user.id in {user.id for user in upserted}
+        assert db_user.datetime_edited == existing_user.datetime_edited
+        assert await mock_user_with_db_repository.get_count() == 2
+
+    async def test_upsert_can_ignore_conflicting_rows(self, db_user, mock_user_with_db_repository):
+        # Act
+        upserted = await mock_user_with_db_repository.upsert(
+            [User(discord_id=db_user.discord_id)], index_elements=["discord_id"], update_fields=[]
+        )
+        # Assert
+        assert upserted == []
+
+    @pytest.mark.parametrize(
+        ("method", "kwargs"), [("bulk_insert", {}), ("upsert", {"index_elements": ["discord_id"]})]
+    )
+    async def test_bulk_writes_with_no_rows(self, mock_user_with_db_repository, method, kwargs):
+        # Act
+        res = await getattr(mock_user_with_db_repository, method)([], **kwargs)
+        # Assert
+        assert res == []
+
+    async def test_unit_of_work_writes_share_transaction(self, mock_user_with_db_repository, db_session, faker):
+        # Arrange
+        users = [User(discord_id=faker.unique.random_number(digits=18, fix_len=True)) for _ in range(2)]
+        # Act
+        async with UnitOfWork(MagicMock(return_value=db_session)):
+            for user in users:
+                await mock_user_with_db_repository.add(user)
+            # Assert
+            assert all(user.id for user in users)
+            assert await mock_user_with_db_repository.get_count() == 2
+
+    async def test_stream(self, mock_user_with_db_repository, faker):
+        # Arrange
+        users = [User(discord_id=faker.unique.random_number(digits=18, fix_len=True)) for _ in range(5)]
+        await mock_user_with_db_repository.add_all(users)
+        # Act
+        streamed = [user async for user in mock_user_with_db_repository.stream(batch_size=2)]
+        # Assert
+        assert {user.id for user in streamed} == {user.id for user in users}
+
+    async def test_iter_pages(self, mock_user_with_db_repository, faker):
+        # Arrange
+        users = [User(discord_id=faker.unique.random_number(digits=18, fix_len=True)) for _ in range(5)]
+        await mock_user_with_db_repository.add_all(users)
+        # Act
+        pages = [page async for page in mock_user_with_db_repository.iter_pages(page_size=2)]
+        # Assert
+        assert [len(page) for page in pages] == [2, 2, 1]
+        assert [user.id for page in pages for user in page] == sorted(user.id for user in users)
+
+    async def test_reads_route_to_read_session(self, sqla_engine, mock_user_with_db_repository, faker):
+        # Arrange
+        user = User(discord_id=faker.unique.random_number(digits=18, fix_len=True))
+        await mock_user_with_db_repository.add(user)
+        async with AsyncSession(sqla_engine) as read_session:
+            mock_user_with_db_repository.read_session_factory = MagicMock(return_value=read_session)
+            # Act
+            from_read_session = await mock_user_with_db_repository.get_by_id(user.id)
+            from_primary = await mock_user_with_db_repository.get_by_id(user.id, use_primary=True)
+        # Assert
+        assert from_read_session is None
+        assert from_primary == user
+
+    async def test_merge_without_load(self, sqla_engine, db_user, mock_user_repository):
+        # Arrange
+        async with AsyncSession(sqla_engine) as other_session:
+            mock_user_repository.session_factory.return_value = other_session
+            # Act
+            merged = await mock_user_repository.merge(db_user, load=False)
+            # Assert
+            assert merged is not db_user
+            assert merged.discord_id == db_user.discord_id
+            assert inspect(merged).persistent
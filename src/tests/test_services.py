@@ -0,0 +1,282 @@
+import asyncio
+
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+
+import pytest
+
+from sqlalchemy.exc import MultipleResultsFound
+from sqlalchemy.exc import NoResultFound
+from sqlmodel import select
+
+from src.helpers.caching import LRUCache
+from src.helpers.name_map import NameMap
+from src.models import Theme
+from src.models import User
+from src.repositories import AsyncRepository
+from src.services import _THEME_NAME_FILTER
+from src.services import MultiRepoService
+from src.services import SingleRepoService
+from src.services import ThemeService
+from src.services import UserService
+
+
+@pytest.mark.asyncio
+class TestBulkWriteService:
+    async def test_single_repo_service_uses_its_repository(self):
+        # Arrange
+        repository = AsyncMock()
+        service = SingleRepoService(repository_factory=MagicMock(return_value=repository), model=User)
+        users = [User(discord_id=1), User(discord_id=2)]
+        # Act
+        await service.bulk_insert(users)
+        # Assert
+        repository.bulk_insert.assert_called_once_with(users)
+
+    async def test_multi_repo_service_picks_repository_by_model(self):
+        # Arrange
+        repositories = {User: AsyncMock(), Theme: AsyncMock()}
+        service = MultiRepoService(
+            repository_factory=lambda model, **_: repositories[model], user_model=User, theme_model=Theme
+        )
+        themes = [Theme(name="mystery")]
+        # Act
+        await service.upsert(themes, index_elements=["name"])
+        # Assert
+        repositories[Theme].upsert.assert_called_once_with(themes, ["name"], None, None)
+        repositories[User].upsert.assert_not_called()
+
+    @pytest.mark.parametrize("method", ["add_all", "bulk_insert"])
+    async def test_no_objects_skips_repository(self, method):
+        # Arrange
+        repository = AsyncMock()
+        service = SingleRepoService(repository_factory=MagicMock(return_value=repository), model=User)
+        # Act
+        await getattr(service, method)([])
+        # Assert
+        getattr(repository, method).assert_not_called()
+
+
+@pytest.mark.asyncio
+class TestUserService:
+    @pytest.fixture
+    def repository(self):
+        # Outside a unit of work the insert has committed by the time after_commit is called
+        return AsyncMock(after_commit=MagicMock(side_effect=lambda callback: callback()))
+
+    @pytest.fixture
+    def user_cache(self):
+        return LRUCache(max_size=10)
+
+    @pytest.fixture
+    def user_service(self, repository, user_cache):
+        return UserService(repository_factory=MagicMock(return_value=repository), model=User, user_cache=user_cache)
+
+    async def test_cached_user_is_merged_into_session(self, user_service, repository):
+        # Arrange
+        user = User(id=1, discord_id=1)
+        repository.get_first.return_value = user
+        # Act
+        await user_service.get_user_by_discord_id(1)
+        cached_user = await user_service.get_user_by_discord_id(1)
+        # Assert
+        repository.get_first.assert_awaited_once()
+        repository.merge.assert_awaited_once_with(user, load=False)
+        assert cached_user == repository.merge.return_value
+        assert user_service.cache_stats.hit_rate == 0.5
+
+    async def test_unregistered_user_is_cached(self, user_service, repository):
+        # Arrange
+        repository.get_first.return_value = None
+        # Act
+        first = await user_service.get_user_by_discord_id(1)
+        second = await user_service.get_user_by_discord_id(1)
+        # Assert
+        assert first is second is None
+        repository.get_first.assert_awaited_once()
+        repository.merge.assert_not_awaited()
+
+    async def test_create_user_invalidates_cache(self, user_service, repository, user_cache):
+        # Arrange
+        repository.get_first.return_value = None
+        await user_service.get_user_by_discord_id(1)
+        # Act
+        await user_service.create_user(1)
+        # Assert
+        assert 1 not in user_cache
+
+    async def test_created_user_is_invalidated_once_insert_commits(self, user_service, repository, user_cache):
+        # Arrange
+        after_commit = []
+        repository.after_commit.side_effect = after_commit.append
+        repository.get_first.return_value = None
+        repository.execute.return_value = [(User(id=1, discord_id=1), True)]
+        await user_service.get_user_by_discord_id(1)
+        # Act
+        await user_service.get_or_create_by_discord_id(1)
+        user_before_commit = await user_service.get_user_by_discord_id(1)
+        for callback in after_commit:
+            callback()
+        # Assert
+        assert user_before_commit is None
+        repository.get_first.assert_awaited_once()
+        assert 1 not in user_cache
+
+    async def test_get_or_create_creates_new_user(self, user_service, repository):
+        # Arrange
+        user = User(id=1, discord_id=1)
+        repository.execute.return_value = [(user, True)]
+        # Act
+        res = await user_service.get_or_create_by_discord_id(1)
+        # Assert
+        assert res == (user, True)
+        repository.execute.assert_awaited_once()
+
+    async def test_get_or_create_returns_existing_user(self, user_service, repository, user_cache):
+        # Arrange
+        user = User(id=1, discord_id=1)
+        repository.execute.return_value = [(user, False)]
+        # Act
+        res = await user_service.get_or_create_by_discord_id(1)
+        # Assert
+        assert res == (user, False)
+        assert user_cache.get(1) == user
+        repository.execute.assert_awaited_once()
+
+    async def test_get_or_create_uses_cached_user(self, user_service, repository, user_cache):
+        # Arrange
+        user_cache.set(1, User(id=1, discord_id=1))
+        # Act
+        res = await user_service.get_or_create_by_discord_id(1)
+        # Assert
+        assert res == (repository.merge.return_value, False)
+        repository.execute.assert_not_awaited()
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio(loop_scope="session")
+class TestUserServiceIntegration:
+    async def test_get_or_create(self, db_session):
+        # Arrange
+        repository = AsyncRepository(MagicMock(return_value=db_session), User)
+        user_service = UserService(repository_factory=MagicMock(return_value=repository), model=User)
+        # Act
+        created_user, created = await user_service.get_or_create_by_discord_id(1234)
+        existing_user, existing_created = await user_service.get_or_create_by_discord_id(1234)
+        # Assert
+        assert (created, existing_created) == (True, False)
+        assert existing_user.id == created_user.id
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio(loop_scope="session")
+class TestThemeServiceIntegration:
+    @pytest.fixture
+    async def theme_service(self, db_session):
+        db_session.add(Theme(name="mystery"))
+        await db_session.flush()
+        repository = AsyncRepository(MagicMock(return_value=db_session), Theme)
+        return ThemeService(repository_factory=MagicMock(return_value=repository), model=Theme)
+
+    async def test_get_theme_by_name_ignores_case(self, theme_service):
+        # Act
+        theme = await theme_service.get_theme_by_name("MyStery")
+        # Assert
+        assert theme.name == "mystery"
+
+    async def test_get_theme_by_name_uses_index(self, explain_plan):
+        # Act
+        plan = await explain_plan(select(Theme).where(_THEME_NAME_FILTER), {"theme_name": "mystery"})
+        # Assert
+        assert "ix_theme_lower_name" in plan
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio(loop_scope="session")
+class TestThemeServiceWithNameMapIntegration:
+    @pytest.fixture
+    async def repository(self, db_session):
+        db_session.add_all([Theme(name="mystery"), Theme(name="romance"), Theme(name="Romance")])
+        await db_session.flush()
+        return AsyncRepository(MagicMock(return_value=db_session), Theme)
+
+    @pytest.fixture
+    def theme_service(self, repository):
+        return ThemeService(repository_factory=MagicMock(return_value=repository), model=Theme, theme_names=NameMap())
+
+    async def test_themes_looked_up_from_map(self, theme_service, repository, mocker):
+        # Arrange
+        get_all = mocker.spy(repository, "get_all")
+        # Act
+        themes = [await theme_service.get_theme_by_name(name) for name in ("MyStery", "mystery")]
+        # Assert
+        assert [theme.name for theme in themes] == ["mystery", "mystery"]
+        get_all.assert_awaited_once()
+
+    async def test_missing_theme_reloads_map(self, theme_service, db_session):
+        # Arrange
+        await theme_service.load_themes()
+        db_session.add(Theme(name="horror"))
+        await db_session.flush()
+        # Act
+        theme = await theme_service.get_theme_by_name("Horror")
+        # Assert
+        assert theme.name == "horror"
+
+    async def test_missing_themes_reload_map_at_most_once_per_min_age(self, repository, mocker):
+        # Arrange
+        theme_service = ThemeService(
+            repository_factory=MagicMock(return_value=repository), model=Theme, theme_names=NameMap(min_age=60)
+        )
+        await theme_service.load_themes()
+        get_all = mocker.spy(repository, "get_all")
+
+        async def get_missing_theme(theme_name):
+            with pytest.raises(NoResultFound):
+                await theme_service.get_theme_by_name(theme_name)
+
+        # Act
+        await asyncio.gather(*(get_missing_theme(f"comedy {number}") for number in range(5)))
+        await get_missing_theme("tragedy")
+        # Assert
+        get_all.assert_not_awaited()
+
+    async def test_concurrent_misses_share_one_reload(self, repository, mocker):
+        # Arrange
+        theme_service = ThemeService(
+            repository_factory=MagicMock(return_value=repository), model=Theme, theme_names=NameMap(min_age=60)
+        )
+        get_all = mocker.spy(repository, "get_all")
+
+        async def get_missing_theme(theme_name):
+            with pytest.raises(NoResultFound):
+                await theme_service.get_theme_by_name(theme_name)
+
+        # Act
+        await asyncio.gather(*(get_missing_theme(f"comedy {number}") for number in range(5)))
+        # Assert
+        get_all.assert_awaited_once()
+
+    async def test_concurrent_misses_of_services_sharing_a_map_share_one_reload(self, repository, mocker):
+        # Arrange
+        theme_names = NameMap(min_age=60)
+        theme_services = [
+            ThemeService(repository_factory=MagicMock(return_value=repository), model=Theme, theme_names=theme_names)
+            for _ in range(2)
+        ]
+        get_all = mocker.spy(repository, "get_all")
+
+        async def get_missing_theme(theme_service, theme_name):
+            with pytest.raises(NoResultFound):
+                await theme_service.get_theme_by_name(theme_name)
+
+        # Act
+        await asyncio.gather(*(get_missing_theme(service, "comedy") for service in theme_services))
+        # Assert
+        get_all.assert_awaited_once()
+
+    @pytest.mark.parametrize(("theme_name", "error"), [("comedy", NoResultFound), ("ROMANCE", MultipleResultsFound)])
+    async def test_lookup_errors_match_query(self, theme_service, theme_name, error):
+        # Act & Assert
+        with pytest.raises(error):
+            await theme_service.get_theme_by_name(theme_name)
@@ -1,10 +1,10 @@
-from collections.abc import Callable
 from collections.abc import Sequence
 from dataclasses import dataclass
 from dataclasses import field
 from typing import TYPE_CHECKING
 from typing import Annotated
 from typing import Literal
+from typing import Protocol
 from typing import TypeVar
 
 from pydantic import BaseModel
@@ -25,7 +25,7 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 
 if TYPE_CHECKING:
     from src.models import CoreModelMixin
-    from src.repositories import BaseRepository
+    from src.repositories import AsyncRepository
 
 
 NonEmptyString = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
@@ -69,11 +69,25 @@ class MixinData(BaseModel):
     index: bool = False
 
 
+class RepositoryFactory(Protocol):
+    def __call__(
+        self, *, model: type[BaseModelType], read_from_primary: bool = ...
+    ) -> "AsyncRepository[BaseModelType]": ...
+
+
 class RepositoryHandler:
     def __init__(
         self,
-        repository_factory: Callable[[type[BaseModelType]], "BaseRepository[SessionType, BaseModelType]"],
+        repository_factory: RepositoryFactory,
+        *,
+        read_from_primary: bool = False,
         **models: type[BaseModelType],
     ) -> None:
+        self._by_model: dict[type, AsyncRepository] = {}
         for key, model in models.items():
-            setattr(self, key.removesuffix("_model"), repository_factory(model))
+            repository = repository_factory(model=model, read_from_primary=read_from_primary)
+            setattr(self, key.removesuffix("_model"), repository)
+            self._by_model[model] = repository
+
+    def get_repository_for(self, model: type[BaseModelType]) -> "AsyncRepository[BaseModelType]":
+        return self._by_model[model]